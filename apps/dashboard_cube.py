@@ -0,0 +1,170 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import data_access
+
+# --------------------------------------------------------------------------
+# Khối tổng hợp (Aggregate Cube) cho các chỉ số và biểu đồ của dashboard
+# --------------------------------------------------------------------------
+# Mỗi ô của khối là một (mã CK, loại báo cáo, năm, quý); sàn và ngành là thuộc tính của mã CK.
+# Mỗi ô lưu số bản ghi, số bản ghi thiếu account/value và một bitset các account xuất hiện,
+# nên số công ty và số account (nunique) vẫn tính chính xác sau khi gộp nhiều ô bằng phép OR.
+# Với vài chục nghìn ô, mỗi lần lọc/gộp chỉ mất vài mili giây thay vì quét toàn bộ dữ liệu.
+
+CUBE_DIMENSIONS = ['company_code', 'exchange', 'industry', 'report_type', 'report_date', 'quarter']
+COUNT_COLUMNS = ['records', 'null_accounts', 'null_values']
+CUBE_FILENAME = 'dashboard_cube.parquet'
+
+
+class DashboardCube:
+    """Các ô của khối tổng hợp cùng ma trận bitset account (mỗi hàng ứng với một ô)."""
+
+    def __init__(self, cells, accounts, account_bits):
+        self.cells = cells.reset_index(drop=True)
+        self.accounts = accounts
+        self.account_bits = account_bits  # uint8, shape (số ô, ceil(số account / 8))
+
+    def filter(self, exchanges=None, report_types=None, year_range=None, industries=None, companies=None):
+        """Lọc các ô theo cùng quy ước với data_access.build_filter (danh sách rỗng = không lọc)."""
+        mask = np.ones(len(self.cells), dtype=bool)
+        for column, values in [('exchange', exchanges), ('report_type', report_types),
+                               ('industry', industries), ('company_code', companies)]:
+            if values:
+                mask &= self.cells[column].isin(values).to_numpy()
+        if year_range is not None:
+            mask &= self.cells['report_date'].between(year_range[0], year_range[1]).to_numpy()
+        return DashboardCube(self.cells[mask], self.accounts, self.account_bits[mask])
+
+    @property
+    def empty(self):
+        return self.cells.empty
+
+    def _count_accounts(self, rows):
+        """Số account khác nhau trong các ô được chọn: OR các bitset rồi đếm bit 1."""
+        if len(rows) == 0:
+            return 0
+        return int(np.unpackbits(np.bitwise_or.reduce(self.account_bits[rows], axis=0)).sum())
+
+    def totals(self):
+        """Các chỉ số tổng của phần II: số bản ghi, công ty, account và số bản ghi thiếu."""
+        return {
+            'records': int(self.cells['records'].sum()),
+            'companies': int(self.cells['company_code'].nunique()),
+            'accounts': self._count_accounts(np.arange(len(self.cells))),
+            'null_accounts': int(self.cells['null_accounts'].sum()),
+            'null_values': int(self.cells['null_values'].sum()),
+        }
+
+    def by_year(self):
+        """Số công ty và số account khác nhau theo từng năm báo cáo."""
+        rows = [
+            {'report_date': year,
+             'company_count': group['company_code'].nunique(),
+             'record_count': self._count_accounts(group.index.to_numpy())}
+            for year, group in self.cells.groupby('report_date')
+        ]
+        return pd.DataFrame(rows, columns=['report_date', 'company_count', 'record_count'])
+
+    def records_by(self, column):
+        """Số bản ghi theo một chiều (vd: industry, report_type), giảm dần."""
+        counts = self.cells.groupby(column)['records'].sum()
+        return counts[counts > 0].sort_values(ascending=False)
+
+    def years_per_company(self):
+        """Số năm có báo cáo của mỗi công ty (dùng cho kiểm tra thiếu báo cáo)."""
+        return self.cells.groupby('company_code')['report_date'].nunique()
+
+
+# --------------------------------------------------------------------------
+# Xây dựng, lưu và tải khối
+# --------------------------------------------------------------------------
+def build_cube(source):
+    """Quét nguồn dữ liệu từng batch một (chỉ các cột cần thiết) và tổng hợp thành DashboardCube."""
+    count_tables, pair_tables = [], []
+    for batch in data_access.open_statements(source).to_batches(columns=CUBE_DIMENSIONS + ['account', 'value']):
+        table = pa.Table.from_batches([batch])
+        table = table.cast(pa.schema([
+            pa.field(field.name, field.type.value_type) if pa.types.is_dictionary(field.type) else field
+            for field in table.schema
+        ]))
+        count_tables.append(table.group_by(CUBE_DIMENSIONS).aggregate([
+            ([], 'count_all'),
+            ('account', 'count', pc.CountOptions(mode='only_null')),
+            ('value', 'count', pc.CountOptions(mode='only_null')),
+        ]))
+        pair_tables.append(table.group_by(CUBE_DIMENSIONS + ['account']).aggregate([]))
+
+    counts = pa.concat_tables(count_tables).group_by(CUBE_DIMENSIONS).aggregate([
+        ('count_all', 'sum'), ('account_count', 'sum'), ('value_count', 'sum'),
+    ]).to_pandas()
+    counts.columns = CUBE_DIMENSIONS + COUNT_COLUMNS
+    cells = counts.sort_values(by=CUBE_DIMENSIONS).reset_index(drop=True)
+
+    pairs = pa.concat_tables(pair_tables).group_by(CUBE_DIMENSIONS + ['account']).aggregate([]).to_pandas()
+    pairs = pairs.dropna(subset=['account'])
+    accounts = sorted(pairs['account'].unique())
+    cell_rows = pairs.merge(cells[CUBE_DIMENSIONS].assign(_row=np.arange(len(cells))), on=CUBE_DIMENSIONS)['_row']
+    account_codes = pd.Categorical(pairs['account'], categories=accounts).codes
+    present = np.zeros((len(cells), len(accounts)), dtype=bool)
+    present[cell_rows.to_numpy(), account_codes] = True
+    return DashboardCube(cells, accounts, np.packbits(present, axis=1))
+
+def save_cube(cube, path, signature):
+    """Lưu khối ra parquet; danh sách account và dấu vết nguồn nằm trong metadata."""
+    n_bytes = cube.account_bits.shape[1]
+    table = pa.Table.from_pandas(cube.cells, preserve_index=False)
+    bits = pa.FixedSizeBinaryArray.from_buffers(pa.binary(n_bytes), len(cube.cells),
+                                                [None, pa.py_buffer(np.ascontiguousarray(cube.account_bits))])
+    table = table.append_column('account_bits', bits)
+    metadata = {b'dashboard_cube': json.dumps({'accounts': cube.accounts, 'signature': signature}).encode('utf-8')}
+    pq.write_table(table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata}), path)
+
+def load_cube(path, signature=None):
+    """Tải khối đã lưu; trả về None nếu không có hoặc đã cũ so với signature."""
+    if not os.path.exists(path):
+        return None
+    table = pq.read_table(path)
+    info = json.loads(table.schema.metadata[b'dashboard_cube'])
+    if signature is not None and info['signature'] != signature:
+        return None
+    bits_column = table.column('account_bits').combine_chunks()
+    n_bytes = bits_column.type.byte_width
+    account_bits = np.frombuffer(bits_column.buffers()[1], dtype=np.uint8)[
+        bits_column.offset * n_bytes:(bits_column.offset + len(bits_column)) * n_bytes
+    ].reshape(len(bits_column), n_bytes)
+    cells = table.drop_columns(['account_bits']).to_pandas()
+    return DashboardCube(cells, info['accounts'], account_bits)
+
+def get_cube(source, cube_path):
+    """Dùng khối đã lưu nếu còn khớp nội dung nguồn, nếu không thì xây lại từ nguồn và lưu (nếu ghi được)."""
+    signature = data_access.source_signature(source)
+    cube = load_cube(cube_path, signature)
+    if cube is None:
+        cube = build_cube(source)
+        try:
+            save_cube(cube, cube_path, signature)
+        except OSError:
+            pass  # Thư mục chỉ đọc (vd: khi deploy): vẫn dùng khối trong bộ nhớ
+    return cube
+
+
+def main():
+    """Bước build: tạo trước khối tổng hợp cho dashboard."""
+    parser = argparse.ArgumentParser(description="Xây dựng khối tổng hợp (aggregate cube) cho dashboard BCTC.")
+    parser.add_argument('--source', type=str, default=os.path.join('data', 'financial_statements'),
+                        help="Bộ dữ liệu phân vùng hoặc file parquet BCTC.")
+    parser.add_argument('--output', type=str, default=os.path.join('data', CUBE_FILENAME),
+                        help="Đường dẫn file khối tổng hợp.")
+    args = parser.parse_args()
+
+    cube = build_cube(args.source)
+    save_cube(cube, args.output, data_access.source_signature(args.source))
+    print(f"Đã lưu khối {len(cube.cells):,} ô, {len(cube.accounts)} account vào '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import os
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pandas as pd
+
+# Bố cục thư mục và bộ lọc dùng chung với pipeline (model/statement_dataset.py) thay vì một bản sao riêng
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model'))
+import statement_dataset
+
+# --------------------------------------------------------------------------
+# Đọc dữ liệu BCTC với bộ lọc đẩy xuống tầng Parquet (Predicate Pushdown)
+# --------------------------------------------------------------------------
+# Nguồn dữ liệu là thư mục phân vùng kiểu Hive do model/statement_dataset.py ghi ra
+# (report_type=.../report_date=.../[exchange=...]) hoặc một file parquet đơn lẻ.
+# Bộ lọc theo loại báo cáo/năm/sàn bỏ qua cả thư mục, bộ lọc theo mã CK/ngành bỏ qua
+# các row group không khớp, nên chỉ phần dữ liệu cần thiết được đọc từ đĩa.
+# Ô tìm kiếm cũng là biểu thức pyarrow compute chạy trên từng batch, và phần xem trước chỉ giữ
+# PREVIEW_ROWS dòng trong bộ nhớ thay vì tải rồi sao chép toàn bộ dữ liệu đã lọc.
+
+OPTION_COLUMNS = ['exchange', 'report_type', 'report_date', 'industry', 'company_code']
+PREVIEW_ROWS = 5000
+
+# Băm nội dung theo từng file, ghi nhớ theo đường dẫn cùng (mtime, kích thước): chỉ băm lại khi file đổi.
+# Mỗi đường dẫn giữ một mục (phiên bản cũ bị thay thế) và chỉ giữ MAX_FILE_DIGESTS đường dẫn dùng gần nhất,
+# nên bộ nhớ không tăng theo thời gian chạy của server.
+MAX_FILE_DIGESTS = 1024
+_file_digests = OrderedDict()
+_file_digests_lock = threading.Lock()
+
+
+def _file_digest(path):
+    """Mã băm nội dung của một file; chỉ tính lại khi mtime hoặc kích thước thay đổi."""
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _file_digests_lock:
+        cached = _file_digests.get(path)
+        if cached is not None and cached[0] == version:
+            _file_digests.move_to_end(path)
+            return cached[1]
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    with _file_digests_lock:
+        _file_digests[path] = (version, digest.hexdigest())
+        _file_digests.move_to_end(path)
+        while len(_file_digests) > MAX_FILE_DIGESTS:
+            _file_digests.popitem(last=False)
+    return digest.hexdigest()
+
+def source_signature(source):
+    """
+    Dấu vết nội dung của một file hoặc thư mục dữ liệu (các file parquet bên trong).
+    Thay đổi khi pipeline ghi dữ liệu mới, nhưng giữ nguyên khi chỉ mtime thay đổi
+    (vd: sau khi clone/checkout), nên dùng được làm khóa cache.
+    """
+    if not os.path.isdir(source):
+        return _file_digest(source)
+    digest = hashlib.sha1()
+    for root, dirs, names in sorted(os.walk(source)):
+        dirs.sort()
+        for name in sorted(names):
+            if name.endswith('.parquet'):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, source).encode('utf-8'))
+                digest.update(_file_digest(path).encode('ascii'))
+    return digest.hexdigest()
+
+def open_statements(source):
+    """Mở bộ dữ liệu phân vùng hoặc một file parquet dưới dạng pyarrow Dataset."""
+    if os.path.isdir(source):
+        columns = statement_dataset.detect_partition_columns(source)
+        return ds.dataset(source, format='parquet', partitioning=statement_dataset.dataset_partitioning(columns))
+    # File đơn lẻ lưu cột chuỗi dạng dictionary; đọc ra dạng string để các hàm tìm kiếm chuỗi áp dụng được
+    schema = ds.dataset(source, format='parquet').schema
+    schema = pa.schema([pa.field(field.name, field.type.value_type, nullable=field.nullable)
+                        if pa.types.is_dictionary(field.type) else field for field in schema])
+    return ds.dataset(source, format='parquet', schema=schema)
+
+def build_filter(company_search=None, account_search=None, **filters):
+    """
+    Tạo biểu thức lọc: bộ lọc theo cột của statement_dataset.build_filter (tham số rỗng hoặc None
+    nghĩa là không lọc theo trường đó) cùng hai ô tìm kiếm. company_search/account_search tìm theo
+    biểu thức chính quy, không phân biệt hoa thường (giống str.contains của pandas); dòng có giá trị
+    trống không khớp.
+    """
+    expression = statement_dataset.build_filter(**filters)
+    for column, pattern in [('company_code', company_search), ('account', account_search)]:
+        if pattern:
+            condition = pc.match_substring_regex(pc.field(column), pattern=pattern, ignore_case=True)
+            expression = condition if expression is None else expression & condition
+    return expression
+
+def load_filter_options(source):
+    """Trả về danh sách giá trị (đã sắp xếp) của các cột dùng làm bộ lọc, không tải toàn bộ dữ liệu."""
+    values = {column: set() for column in OPTION_COLUMNS}
+    for batch in open_statements(source).to_batches(columns=OPTION_COLUMNS):
+        for column in OPTION_COLUMNS:
+            array = batch.column(column)
+            if pa.types.is_dictionary(array.type):
+                array = array.dictionary_decode()
+            values[column].update(pc.unique(array).drop_null().to_pylist())
+    return {column: sorted(column_values) for column, column_values in values.items()}
+
+def load_statements(source, columns=None, **filters):
+    """Đọc các dòng khớp bộ lọc (tham số của build_filter); cột chuỗi trả về dạng category."""
+    table = open_statements(source).to_table(columns=columns, filter=build_filter(**filters))
+    return _to_pandas(table)
+
+def preview_statements(source, limit=PREVIEW_ROWS, **filters):
+    """
+    Trả về (tối đa limit dòng khớp bộ lọc, năm báo cáo mới nhất trước; tổng số dòng khớp).
+    Dữ liệu được quét từng batch và chỉ giữ lại limit dòng đứng đầu (top-k), nên bộ nhớ
+    không phụ thuộc vào số dòng khớp.
+    """
+    top, total = None, 0
+    for batch in open_statements(source).to_batches(filter=build_filter(**filters)):
+        if batch.num_rows == 0:
+            continue
+        total += batch.num_rows
+        if top is not None and top.num_rows >= limit and \
+                pc.max(batch.column('report_date')).as_py() <= top.column('report_date')[-1].as_py():
+            continue  # Batch không có dòng nào chen được vào top-k (sắp xếp ổn định giữ dòng đến trước)
+        table = pa.Table.from_batches([batch])
+        table = table if top is None else pa.concat_tables([top, table])
+        top = table.sort_by([('report_date', 'descending')]).slice(0, limit)
+    if top is None:
+        top = open_statements(source).schema.empty_table()
+    return _to_pandas(top), total
+
+def _to_pandas(table):
+    """Chuyển sang pandas, các cột chuỗi dạng category để tiết kiệm bộ nhớ."""
+    df = table.to_pandas()
+    for column in df.columns:
+        if pd.api.types.is_string_dtype(df[column]) and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
@@ -0,0 +1,129 @@
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+import threading
+import pandas as pd
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+import xlsxwriter
+import data_access
+
+# --------------------------------------------------------------------------
+# Xuất dữ liệu theo luồng cho các nút tải về (Streaming Export)
+# --------------------------------------------------------------------------
+# File tải về chỉ được tạo khi người dùng bấm nút "Chuẩn bị" (streamlit 1.48 chỉ nhận bytes cho
+# st.download_button); nội dung file được đọc vào bộ nhớ một lần sau lần bấm đó.
+# Dữ liệu được quét và ghi từng batch ra file tạm trên đĩa, không dựng toàn bộ DataFrame hay
+# chuỗi CSV trong bộ nhớ. Tên file là mã băm của (nội dung nguồn, bộ lọc, định dạng), nên tải lại
+# cùng bộ lọc chỉ đọc lại file đã có.
+
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'valux_exports')
+EXPORT_CACHE_FILES = 32  # Số file xuất giữ lại trên đĩa, file cũ nhất bị xóa trước
+EXCEL_MAX_ROWS = 500000
+# Mức nén gzip của CSV: mức mặc định của pyarrow (9) chậm gấp ~3 lần mức 6 mà file chỉ nhỏ hơn chút ít
+CSV_GZIP_LEVEL = 6
+FORMATS = {
+    'xlsx': ('xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'csv': ('csv.gz', "application/gzip"),
+    'parquet': ('parquet', "application/vnd.apache.parquet"),
+}
+
+
+def _export_path(fmt, *key):
+    """Đường dẫn file xuất ứng với khóa (băm), theo đuôi của định dạng."""
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return os.path.join(EXPORT_DIR, f"{digest}.{FORMATS[fmt][0]}")
+
+def _prune():
+    """Giữ lại EXPORT_CACHE_FILES file xuất mới dùng nhất."""
+    paths = sorted((os.path.join(EXPORT_DIR, name) for name in os.listdir(EXPORT_DIR) if not name.endswith('.tmp')),
+                   key=os.path.getmtime)
+    for path in paths[:-EXPORT_CACHE_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Phiên khác đang xóa/đọc cùng file
+
+def _iter_batches(source, filters):
+    """Quét các dòng khớp bộ lọc theo từng batch, năm báo cáo mới nhất trước (như phần xem trước)."""
+    dataset = data_access.open_statements(source)
+    year_range = filters.get('year_range')
+    if year_range is None:
+        yield from dataset.to_batches(filter=data_access.build_filter(**filters))
+        return
+    for year in range(year_range[1], year_range[0] - 1, -1):
+        year_filters = dict(filters, year_range=(year, year))
+        yield from dataset.to_batches(filter=data_access.build_filter(**year_filters))
+
+def _excel_rows(batch):
+    """Các dòng của batch dưới dạng list giá trị Python mà xlsxwriter ghi được (NaN/NaT -> ô trống)."""
+    df = batch.to_pandas()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.DatetimeTZDtype):
+            df[column] = df[column].dt.tz_localize(None)  # Excel không hỗ trợ múi giờ; giữ giờ UTC
+    df = df.astype(object).where(df.notna(), None)
+    return df.itertuples(index=False, name=None)
+
+def _write(batches, schema, path, fmt, sheet_name='FilteredData'):
+    """Ghi các batch ra file theo định dạng; ghi vào file tạm rồi đổi tên để phiên khác không đọc file dở."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if fmt == 'parquet':
+        with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    elif fmt == 'csv':
+        with gzip.open(tmp_path, 'wb', compresslevel=CSV_GZIP_LEVEL) as stream, pv.CSVWriter(stream, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    else:
+        # constant_memory: xlsxwriter ghi từng dòng ra đĩa thay vì giữ cả bảng tính trong bộ nhớ
+        workbook = xlsxwriter.Workbook(tmp_path, {'constant_memory': True})
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, schema.names)
+        row_number = 1
+        for batch in batches:
+            for row in _excel_rows(batch):
+                worksheet.write_row(row_number, 0, row)
+                row_number += 1
+        workbook.close()
+    os.replace(tmp_path, path)
+
+def statements_export_path(source, signature, fmt, **filters):
+    """Đường dẫn file xuất của các dòng BCTC khớp bộ lọc (file có thể chưa được tạo)."""
+    return _export_path(fmt, 'statements', source, signature, filters)
+
+def export_statements(source, signature, fmt, **filters):
+    """
+    Xuất các dòng BCTC khớp bộ lọc (tham số của data_access.build_filter) ra file và trả về
+    đường dẫn. File được tạo lại chỉ khi nội dung nguồn (signature) hoặc bộ lọc thay đổi.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = statements_export_path(source, signature, fmt, **filters)
+    if not os.path.exists(path):
+        schema = data_access.open_statements(source).schema
+        _write(_iter_batches(source, filters), schema, path, fmt)
+        _prune()
+    os.utime(path)
+    return path
+
+def file_export_path(source_path, fmt, sheet_name='Sheet1'):
+    """Đường dẫn file xuất của một file parquet nhỏ theo nội dung hiện tại của nó (file có thể chưa được tạo)."""
+    return _export_path(fmt, 'file', source_path, data_access.source_signature(source_path), sheet_name)
+
+def export_file(source_path, fmt, sheet_name='Sheet1'):
+    """Xuất một file parquet nhỏ (vd: danh sách mã CK) sang định dạng khác, có cache theo nội dung file."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = file_export_path(source_path, fmt, sheet_name)
+    if not os.path.exists(path):
+        parquet_file = pq.ParquetFile(source_path)
+        _write(parquet_file.iter_batches(), parquet_file.schema_arrow, path, fmt, sheet_name=sheet_name)
+        _prune()
+    os.utime(path)
+    return path
+
+def read_export(path):
+    """Nội dung file xuất để trả cho st.download_button."""
+    with open(path, 'rb') as f:
+        return f.read()
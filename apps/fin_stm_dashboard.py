@@ -3,8 +3,11 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from io import BytesIO
 import os
+import data_access
+import dashboard_cube
+import shared_cache
+import exports
 
 # --------------------------------------------------------------------------
 # Cấu hình trang (Page Configuration)
@@ -17,6 +20,8 @@ st.set_page_config(
 )
 st.sidebar.page_link("fin_stm_dashboard.py", label="📃 Financial Statement Data")
 st.sidebar.page_link("pages/1_Financial_Term_Adjustment.py", label="➡️ Financial Term Format")
+st.sidebar.page_link("pages/2_Stock_Screener.py", label="🔎 Stock Screener")
+st.sidebar.page_link("pages/3_Peer_Benchmark.py", label="🏭 Peer Benchmark")
 
 # --------------------------------------------------------------------------
 # CSS Tùy chỉnh (Custom CSS Injection)
@@ -51,24 +56,52 @@ st.markdown("""
 # Hàm tiện ích (Utility Functions)
 # --------------------------------------------------------------------------
 
-@st.cache_data # Sử dụng cache để tăng tốc độ tải lại ứng dụng
 def load_parquet_data(file_path):
-    """Tải dữ liệu từ file Parquet."""
+    """Tải dữ liệu từ file Parquet (bản chỉ đọc, dùng chung giữa các phiên và các trang)."""
     if not os.path.exists(file_path):
         st.error(f"Lỗi: Không tìm thấy tệp tại đường dẫn '{file_path}'. Vui lòng kiểm tra lại.")
         return pd.DataFrame()
     try:
-        return pd.read_parquet(file_path)
+        return shared_cache.load_frame(file_path)
     except Exception as e:
         st.error(f"Lỗi khi đọc file Parquet: {e}")
         return pd.DataFrame()
 
-def to_excel(df):
-    """Chuyển đổi DataFrame sang định dạng file Excel trong bộ nhớ."""
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='FilteredData')
-    return output.getvalue()
+# Các hàm cache dưới đây nhận signature (dấu vết nội dung nguồn dữ liệu) làm khóa,
+# nên tự làm mới khi pipeline ghi dữ liệu mới.
+@st.cache_data
+def load_filter_options(source, signature):
+    """Tải danh sách giá trị cho các bộ lọc (chỉ đọc các cột cần thiết)."""
+    return data_access.load_filter_options(source)
+
+@st.cache_resource
+def load_cube(source, cube_path, signature):
+    """Tải khối tổng hợp (dựng lại nếu đã cũ); signature thay đổi khi dữ liệu nguồn thay đổi."""
+    return dashboard_cube.get_cube(source, cube_path)
+
+@st.cache_data
+def load_preview(source, signature, **filters):
+    """Tải tối đa data_access.PREVIEW_ROWS dòng để xem trước và tổng số dòng khớp bộ lọc."""
+    return data_access.preview_statements(source, **filters)
+
+def prepared_download(key, export_path, prepare, prepare_label, disabled=False, spinner_text=None, **button_args):
+    """
+    Nút "Chuẩn bị" rồi nút tải về cho một file xuất (streamlit 1.48 chỉ nhận str/bytes/file).
+    File chỉ được xuất và đọc vào bộ nhớ khi bấm "Chuẩn bị". Mỗi phiên giữ tối đa một file đã chuẩn bị
+    trong session_state: chuẩn bị file khác thay thế nó, và nó bị bỏ ngay khi bộ lọc đổi (export_path khác).
+    """
+    prepared = st.session_state.get('prepared_export')
+    if prepared is not None and prepared[0] == key and prepared[1] != export_path:
+        del st.session_state['prepared_export']
+        prepared = None
+    if prepared is None or prepared[0] != key:
+        if not st.button(prepare_label, key=f"prepare_{key}", disabled=disabled, use_container_width=True):
+            return
+        st.session_state.pop('prepared_export', None)  # Bỏ bản cũ trước khi đọc file mới vào bộ nhớ
+        with st.spinner(spinner_text or "Đang chuẩn bị file..."):
+            prepared = (key, export_path, exports.read_export(prepare()))
+        st.session_state['prepared_export'] = prepared
+    st.download_button(data=prepared[2], on_click='ignore', disabled=disabled, use_container_width=True, **button_args)
 
 # --------------------------------------------------------------------------
 # Tải dữ liệu chính (Data Loading)
@@ -78,20 +111,26 @@ current_dir = os.path.dirname(os.path.abspath(__file__)) if '__file__' in locals
 data_dir = os.path.join(current_dir, 'data')
 
 # Đường dẫn đến các tệp dữ liệu
+dataset_path = os.path.join(data_dir, 'financial_statements')  # Bộ dữ liệu phân vùng (ưu tiên)
 file_path = os.path.join(data_dir, 'Financial_Statement__Full_Company_L10Y.parquet')
+cube_path = os.path.join(data_dir, dashboard_cube.CUBE_FILENAME)  # Khối tổng hợp cho phần II, III
 file_format_path = os.path.join(data_dir, 'account_mapping.parquet')
 file_company_path = os.path.join(data_dir, 'Vietcap__Company_List.parquet')
 
-# Tải dữ liệu chính
-df = load_parquet_data(file_path)
-if df.empty:
-    # Fallback to root directory if 'data' folder not found
-    file_path = os.path.join(current_dir, 'Financial_Statement__Full_Company_L10Y.parquet')
-    df = load_parquet_data(file_path)
-    if df.empty:
-        st.stop()
-
-df['report_date'] = df['report_date'].astype(int)
+# Chọn nguồn dữ liệu chính: bộ dữ liệu phân vùng, file parquet trong 'data', hoặc file ở thư mục gốc.
+# Chỉ danh sách giá trị bộ lọc được tải lúc khởi động; dữ liệu được đọc theo bộ lọc ở bên dưới.
+candidate_sources = [dataset_path, file_path, os.path.join(current_dir, 'Financial_Statement__Full_Company_L10Y.parquet')]
+data_source = next((path for path in candidate_sources if os.path.exists(path)), None)
+if data_source is None:
+    st.error(f"Lỗi: Không tìm thấy dữ liệu tại '{dataset_path}' hoặc '{file_path}'. Vui lòng kiểm tra lại.")
+    st.stop()
+try:
+    data_signature = data_access.source_signature(data_source)
+    filter_options = load_filter_options(data_source, data_signature)
+    cube = load_cube(data_source, cube_path, data_signature)
+except Exception as e:
+    st.error(f"Lỗi khi đọc dữ liệu Parquet: {e}")
+    st.stop()
 
 # --------------------------------------------------------------------------
 # Giao diện thanh bên (Sidebar Interface)
@@ -100,7 +139,7 @@ with st.sidebar:
     st.header("Bộ lọc Dữ liệu ⚙️")
 
     # --- Filter 1: Sàn giao dịch (Exchange) ---
-    sorted_exchanges = sorted(df['exchange'].unique())
+    sorted_exchanges = filter_options['exchange']
     selected_exchanges = st.multiselect(
         'Sàn giao dịch (Exchange)',
         options=sorted_exchanges,
@@ -108,14 +147,14 @@ with st.sidebar:
     )
 
     # --- Filter 2: Loại báo cáo (Report Type) ---
-    report_types = ['Tất cả'] + sorted(df['report_type'].unique())
+    report_types = ['Tất cả'] + filter_options['report_type']
     selected_report_type = st.selectbox(
         'Loại báo cáo (Report Type)',
         options=report_types
     )
 
     # --- Filter 3: Năm báo cáo (Report Date) ---
-    min_year, max_year = int(df['report_date'].min()), int(df['report_date'].max() - 1)
+    min_year, max_year = int(min(filter_options['report_date'])), int(max(filter_options['report_date']) - 1)
     selected_year_range = st.slider(
         'Năm báo cáo (Report Year)',
         min_value=min_year,
@@ -124,14 +163,14 @@ with st.sidebar:
     )
 
     # --- Filter 4: Ngành (Industry) ---
-    sorted_industries = sorted(df['industry'].unique())
+    sorted_industries = filter_options['industry']
     selected_industries = st.multiselect(
         'Ngành (Industry)',
         options=sorted_industries,
         default=sorted_industries
     )
     # --- Filter 5: Stock (Company_code) ---
-    sorted_company = sorted(df['company_code'].unique())
+    sorted_company = filter_options['company_code']
     selected_company = st.multiselect(
         'Mã Chứng Khoán (Company Code) ',
         options=sorted_company,
@@ -153,21 +192,16 @@ with st.sidebar:
 # --------------------------------------------------------------------------
 # Lọc dữ liệu (Data Filtering)
 # --------------------------------------------------------------------------
-# Sử dụng .query() để lọc dữ liệu một cách gọn gàng
-query_parts = []
-if selected_exchanges:
-    query_parts.append('exchange in @selected_exchanges')
-if selected_report_type != 'Tất cả':
-    query_parts.append('report_type == @selected_report_type')
-if selected_industries:
-    query_parts.append('industry in @selected_industries')
-if selected_company:
-    query_parts.append('company_code in @selected_company')
-
-query_parts.append('report_date >= @selected_year_range[0]')
-query_parts.append('report_date <= @selected_year_range[1]')
-
-df_filtered = df.query(' and '.join(query_parts))
+# Danh sách rỗng nghĩa là không lọc theo trường đó.
+selected_filters = dict(
+    exchanges=selected_exchanges,
+    report_types=None if selected_report_type == 'Tất cả' else [selected_report_type],
+    year_range=tuple(selected_year_range),
+    industries=selected_industries,
+    companies=selected_company,
+)
+# Phần II, III được tính từ khối tổng hợp (vài chục nghìn ô) thay vì toàn bộ dữ liệu đã lọc.
+cube_filtered = cube.filter(**selected_filters)
 
 # --------------------------------------------------------------------------
 # Giao diện chính (Main Interface)
@@ -181,48 +215,55 @@ with st.container(border=True):
     col1, col2 = st.columns(2)
     with col1:
         # Tải file mapping trong thư mục data hoặc thư mục gốc
-        df_account = load_parquet_data(file_format_path)
-        if df_account.empty:
-            df_account = load_parquet_data(os.path.join(current_dir, 'account_mapping.parquet'))
+        account_path = file_format_path
+        if not os.path.exists(account_path):
+            account_path = os.path.join(current_dir, 'account_mapping.parquet')
+        df_account = load_parquet_data(account_path)
         
         if not df_account.empty:
-            st.download_button(
+            prepared_download(
+                'account_xlsx',
+                exports.file_export_path(account_path, 'xlsx', sheet_name='FilteredData'),
+                lambda: exports.export_file(account_path, 'xlsx', sheet_name='FilteredData'),
+                prepare_label="⚙️ Chuẩn bị file Format trường account",
                 label="📥 Tải file Format trường account",
-                data=to_excel(df_account),
                 file_name="ValuX_account_formatting.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
+                mime=exports.FORMATS['xlsx'][1],
             )
     with col2:
-        df_company = load_parquet_data(file_company_path)
-        if df_company.empty:
-             df_company = load_parquet_data(os.path.join(current_dir, 'Vietcap__Company_List.parquet'))
+        company_path = file_company_path
+        if not os.path.exists(company_path):
+            company_path = os.path.join(current_dir, 'Vietcap__Company_List.parquet')
+        df_company = load_parquet_data(company_path)
 
         if not df_company.empty:
-            st.download_button(
+            prepared_download(
+                'company_xlsx',
+                exports.file_export_path(company_path, 'xlsx', sheet_name='FilteredData'),
+                lambda: exports.export_file(company_path, 'xlsx', sheet_name='FilteredData'),
+                prepare_label="⚙️ Chuẩn bị file thông tin mã CK",
                 label="📥 Tải file thông tin mã CK",
-                data=to_excel(df_company),
                 file_name="ValuX_company_list.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
+                mime=exports.FORMATS['xlsx'][1],
             )
 
 st.subheader("II. Chỉ số về Dữ liệu 📇")
-if not df_filtered.empty:
+if not cube_filtered.empty:
     with st.container(border=True):
         col_metrics, col_missing_data = st.columns([1, 1])
 
         with col_metrics:
             # Tính toán các chỉ số
-            num_records = len(df_filtered)
-            num_companies = df_filtered['company_code'].nunique()
-            num_accounts = df_filtered['account'].nunique()
+            totals = cube_filtered.totals()
+            num_records = totals['records']
+            num_companies = totals['companies']
+            num_accounts = totals['accounts']
             
             # Số liệu null cho 'account'
-            null_accounts = df_filtered[df_filtered['account'].isna()].shape[0]
+            null_accounts = totals['null_accounts']
             null_account_ratio = (null_accounts / num_records) * 100 if num_records > 0 else 0
             # Số liệu null cho 'value'
-            null_values = df_filtered[df_filtered['value'].isna()].shape[0]
+            null_values = totals['null_values']
             null_value_ratio = (null_values / num_records) * 100 if num_records > 0 else 0
             
             col_metrics_1, col_metrics_2 = st.columns([1, 1])
@@ -245,7 +286,7 @@ if not df_filtered.empty:
 
             if total_years_in_range > 1:
                 # Đếm số năm có báo cáo cho mỗi công ty
-                reported_years_per_company = df_filtered.groupby('company_code')['report_date'].nunique()
+                reported_years_per_company = cube_filtered.years_per_company()
                 
                 # Sửa logic: Lọc ra các công ty có số năm báo cáo ÍT HƠN tổng số năm
                 missing_data_companies = reported_years_per_company[reported_years_per_company < total_years_in_range].reset_index()
@@ -290,10 +331,7 @@ st.subheader("III. Trực quan hóa Dữ liệu 📈")
 with st.container(border=True):
     st.markdown("#### **Số lượng Công ty & Chỉ số BCTC theo Thời gian**")
     # Chuẩn bị dữ liệu cho biểu đồ time series
-    df_time_series = df_filtered.groupby('report_date').agg(
-        company_count=('company_code', 'nunique'),
-        record_count=('account','nunique') 
-    ).reset_index()
+    df_time_series = cube_filtered.by_year()
 
     # Tạo biểu đồ với trục y thứ hai
     fig_time_series = make_subplots(specs=[[{"secondary_y": True}]])
@@ -345,7 +383,7 @@ col_chart1, col_chart2 = st.columns(2)
 with col_chart1:
     with st.container(border=True):
         st.markdown("#### **Phân bổ bản ghi theo Ngành**")
-        industry_counts = df_filtered['industry'].value_counts().nlargest(15)
+        industry_counts = cube_filtered.records_by('industry').nlargest(15)
         fig_industry = px.bar(
             industry_counts,
             x=industry_counts.index, y=industry_counts.values,
@@ -365,7 +403,7 @@ with col_chart1:
 with col_chart2:
     with st.container(border=True):
         st.markdown("#### **Tỉ lệ phân bổ các Loại báo cáo**")
-        report_type_counts = df_filtered['report_type'].value_counts()
+        report_type_counts = cube_filtered.records_by('report_type')
         fig_report_type = px.pie(
             report_type_counts, names=report_type_counts.index, values=report_type_counts.values,
             color_discrete_sequence=px.colors.qualitative.Pastel
@@ -382,10 +420,6 @@ with col_chart2:
 
 st.subheader("IV. Preview và Tải về Data 🗃️")
 with st.container(border=True):
-    
-    # Sắp xếp dữ liệu
-    df_to_display = df_filtered.copy().sort_values(by=['report_date'], ascending=False)
-
     # Thêm ô tìm kiếm
     col_search1, col_search2 = st.columns(2)
     with col_search1:
@@ -393,28 +427,33 @@ with st.container(border=True):
     with col_search2:
         search_account = st.text_input('Tìm kiếm theo Tên Chỉ tiêu (Account)', placeholder='Nhập từ khóa, ví dụ: net_profit_to_parent_shareholders, net_operating_profit...')
 
-    # Lọc dữ liệu dựa trên ô tìm kiếm (nếu có nhập)
-    if search_company:
-        df_to_display = df_to_display[df_to_display['company_code'].str.contains(search_company, case=False, na=False)]
-    if search_account:
-        df_to_display = df_to_display[df_to_display['account'].str.contains(search_account, case=False, na=False)]
+    # Bộ lọc và ô tìm kiếm được đẩy xuống tầng Parquet/pyarrow compute; chỉ phần xem trước
+    # (các năm mới nhất trước) được tải lên bộ nhớ cùng với tổng số dòng khớp.
+    search_filters = dict(selected_filters, company_search=search_company or None, account_search=search_account or None)
+    df_preview, num_matches = load_preview(data_source, data_signature, **search_filters)
 
     # Hiển thị dataframe
-    st.dataframe(df_to_display.head(5000))
+    st.dataframe(df_preview)
     st.markdown("---")
-    st.markdown(f"Tải về **{len(df_to_display):,}** dòng dữ liệu đã được lọc. Nếu dữ liệu lớn (>500,000 dòng), tệp sẽ được tải về dưới dạng CSV để tối ưu hiệu suất.")
-    
-    if df_to_display.shape[0] <= 500000:
-        st.download_button(
-            label="📥 Tải xuống file Excel",
-            data=to_excel(df_to_display),
-            file_name="ValuX_financial_statement_filtered.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-    else:
-        st.download_button(
-            label="📥 Tải xuống file CSV (Dữ liệu lớn)",
-            data=df_to_display.to_csv(index=False).encode('utf-8'),
-            file_name="ValuX_financial_statement_data_filtered.csv",
-            mime="text/csv"
-        )
+    st.markdown(f"Tải về **{num_matches:,}** dòng dữ liệu đã được lọc. File Excel chỉ hỗ trợ tối đa {exports.EXCEL_MAX_ROWS:,} dòng; với dữ liệu lớn hãy chọn CSV (nén gzip) hoặc Parquet.")
+
+    # File chỉ được tạo khi bấm nút "Chuẩn bị", dữ liệu được quét và ghi theo từng batch; khi file đã có
+    # trong cache trên đĩa (cùng nguồn và bộ lọc), lần bấm chỉ đọc lại file mà không xuất lại.
+    col_xlsx, col_csv, col_parquet = st.columns(3)
+    for column, fmt, label in [(col_xlsx, 'xlsx', "Excel"),
+                               (col_csv, 'csv', "CSV (gzip)"),
+                               (col_parquet, 'parquet', "Parquet")]:
+        extension, mime = exports.FORMATS[fmt]
+        disabled = num_matches == 0 or (fmt == 'xlsx' and num_matches > exports.EXCEL_MAX_ROWS)
+        with column:
+            prepared_download(
+                fmt,
+                exports.statements_export_path(data_source, data_signature, fmt, **search_filters),
+                lambda fmt=fmt: exports.export_statements(data_source, data_signature, fmt, **search_filters),
+                prepare_label=f"⚙️ Chuẩn bị file {label}",
+                disabled=disabled,
+                spinner_text=f"Đang xuất {num_matches:,} dòng ra file {label}...",
+                label=f"📥 Tải xuống file {label}",
+                file_name=f"ValuX_financial_statement_filtered.{extension}",
+                mime=mime,
+            )
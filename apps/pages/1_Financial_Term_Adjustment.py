@@ -2,9 +2,13 @@ import streamlit as st
 import pandas as pd
 import io
 import os
+import sys
 import shutil
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import shared_cache
+
 # --------------------------------------------------------------------------
 # Page Configuration
 # --------------------------------------------------------------------------
@@ -27,17 +31,17 @@ CONFIG = {
 # --------------------------------------------------------------------------
 # Utility Functions
 # --------------------------------------------------------------------------
-@st.cache_data
 def load_parquet_data(file_path):
     """
     Tải dữ liệu từ tệp Parquet được chỉ định.
-    Sử dụng cache của Streamlit để tránh tải lại dữ liệu sau mỗi tương tác.
+    File chỉ được đọc một lần cho mọi phiên (shared_cache); mỗi phiên nhận một bản sao
+    riêng để chỉnh sửa trong session state.
     """
     if not os.path.exists(file_path):
         st.error(f"Lỗi: Không tìm thấy tệp '{file_path}'.")
         return None
     try:
-        df = pd.read_parquet(file_path)
+        df = shared_cache.load_table(file_path).to_pandas()
         st.write(file_path)
         return df
     except Exception as e:
@@ -159,8 +163,7 @@ def main():
                     # 2. Ghi đè file gốc bằng dữ liệu đã chỉnh sửa từ session_state
                     st.session_state.df.to_parquet(source_path, index=False)
                     
-                    # 3. Xóa cache và thông báo thành công
-                    st.cache_data.clear()
+                    # 3. Thông báo thành công (cache dùng chung tự làm mới vì nội dung file đã thay đổi)
                     st.success(f"Đã lưu thành công! Bản sao lưu đã được tạo: '{backup_filename}'")
                 
                 except Exception as e:
@@ -0,0 +1,150 @@
+import streamlit as st
+import pandas as pd
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'model'))
+import data_access
+import screener
+import financial_ratios
+
+# --------------------------------------------------------------------------
+# Page Configuration
+# --------------------------------------------------------------------------
+st.set_page_config(
+    page_title="ValuX Team | Stock Screener",
+    page_icon="🔎",
+    layout="wide",
+    initial_sidebar_state="expanded",
+)
+
+# --------------------------------------------------------------------------
+# App Configuration
+# --------------------------------------------------------------------------
+current_dir = os.path.dirname(os.path.abspath(__file__)) if '__file__' in locals() else '.'
+data_dir = os.path.join(current_dir, 'data').replace('\\pages', '').replace('/pages', '')
+CONFIG = {
+    "ratios_filename": "financial_ratios.parquet",  # Do model/financial_ratios.py ghi ra
+    "default_conditions": [
+        screener.Condition('roe', '>', 15.0, 3),
+        screener.Condition('debt_to_equity', '<', 1.0, 1),
+    ],
+    "default_rank_by": "roe",
+    "default_limit": 50,
+}
+
+# --------------------------------------------------------------------------
+# Utility Functions
+# --------------------------------------------------------------------------
+# Chỉ mục được xây một lần cho mỗi phiên bản nội dung file và dùng chung cho mọi phiên;
+# mỗi lần lọc chỉ chạy trên chỉ mục trong bộ nhớ.
+@st.cache_resource(max_entries=2, show_spinner="Đang xây chỉ mục chỉ số...")
+def load_index(path, signature):
+    """Xây ScreenerIndex từ file chỉ số (chỉ các kỳ báo cáo năm)."""
+    return screener.load_index(path)
+
+@st.cache_data
+def load_metadata(path, signature):
+    """Đơn vị và mô tả của các chỉ số."""
+    return financial_ratios.read_ratio_metadata(path)
+
+def is_percent(metric, metadata):
+    """Chỉ số dạng % được lưu dưới dạng tỷ lệ; người dùng nhập và xem theo %."""
+    return metadata.get(metric, {}).get('unit') == '%'
+
+def to_conditions(edited, metadata):
+    """Chuyển các dòng hợp lệ của bảng điều kiện thành screener.Condition (ngưỡng % đổi về tỷ lệ)."""
+    conditions = []
+    for row in edited.dropna(subset=['metric', 'operator', 'threshold']).itertuples(index=False):
+        threshold = float(row.threshold) / 100 if is_percent(row.metric, metadata) else float(row.threshold)
+        years = 1 if pd.isna(row.years) else max(int(row.years), 1)
+        conditions.append(screener.Condition(row.metric, row.operator, threshold, years))
+    return conditions
+
+# --------------------------------------------------------------------------
+# Main Application Logic
+# --------------------------------------------------------------------------
+def main():
+    st.title("🔎 Bộ lọc Cổ phiếu theo Chỉ số Tài chính")
+
+    ratios_path = os.path.join(data_dir, CONFIG["ratios_filename"])
+    if not os.path.exists(ratios_path):
+        st.error(f"Lỗi: Không tìm thấy tệp '{ratios_path}'. Chạy model/financial_ratios.py để tạo file chỉ số.")
+        st.stop()
+    signature = data_access.source_signature(ratios_path)
+    index = load_index(ratios_path, signature)
+    metadata = load_metadata(ratios_path, signature)
+    if len(index.years) == 0:
+        st.warning("File chỉ số không có dữ liệu báo cáo năm.")
+        st.stop()
+
+    # --- Sidebar Filters ---
+    with st.sidebar:
+        st.header("Phạm vi Lọc ⚙️")
+        years = [int(year) for year in index.years]
+        selected_year = st.selectbox('Năm lọc (Screen Year)', options=years[::-1])
+        exchanges = sorted(index.companies['exchange'].unique())
+        selected_exchanges = st.multiselect('Sàn giao dịch (Exchange)', options=exchanges, default=exchanges)
+        industries = sorted(index.companies['industry'].unique())
+        selected_industries = st.multiselect('Ngành (Industry)', options=industries, default=[],
+                                             help="Để trống để lọc toàn thị trường.")
+
+    # --- Conditions ---
+    st.subheader("I. Điều kiện Lọc", divider="rainbow")
+    st.info("💡 Mỗi dòng là một điều kiện, phải đúng trong **Số năm** liên tiếp tính đến năm lọc. "
+            "Chỉ số dạng % nhập theo % (vd: ROE > 15).")
+    edited = st.data_editor(
+        pd.DataFrame(CONFIG["default_conditions"], columns=screener.Condition._fields),
+        column_config={
+            "metric": st.column_config.SelectboxColumn("Chỉ số", options=index.metrics, required=True),
+            "operator": st.column_config.SelectboxColumn("Toán tử", options=screener.OPERATORS, required=True),
+            "threshold": st.column_config.NumberColumn("Ngưỡng", required=True),
+            "years": st.column_config.NumberColumn("Số năm", min_value=1, max_value=len(years), step=1, default=1),
+        },
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+    )
+    with st.expander("📖 Danh sách chỉ số"):
+        st.dataframe(pd.DataFrame([{'Chỉ số': metric, 'Đơn vị': metadata.get(metric, {}).get('unit'),
+                                    'Mô tả': metadata.get(metric, {}).get('description')}
+                                   for metric in index.metrics]),
+                     use_container_width=True, hide_index=True)
+
+    col_rank, col_order, col_limit = st.columns([2, 1, 1])
+    with col_rank:
+        default_rank = index.metrics.index(CONFIG["default_rank_by"]) if CONFIG["default_rank_by"] in index.metrics else 0
+        rank_by = st.selectbox('Xếp hạng theo', options=index.metrics, index=default_rank)
+    with col_order:
+        ascending = st.radio('Thứ tự', options=['Giảm dần', 'Tăng dần'], horizontal=True) == 'Tăng dần'
+    with col_limit:
+        limit = st.number_input('Số mã tối đa', min_value=1, value=CONFIG["default_limit"], step=10)
+
+    # --- Results ---
+    st.subheader("II. Kết quả", divider="rainbow")
+    start = time.perf_counter()
+    result = index.screen(to_conditions(edited, metadata), selected_year, rank_by=rank_by, ascending=ascending,
+                          exchanges=selected_exchanges, industries=selected_industries, limit=int(limit))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    st.caption(f"{len(result):,} mã thỏa điều kiện (năm {selected_year}) · lọc trong {elapsed_ms:.1f} ms")
+
+    column_config = {
+        metric: st.column_config.NumberColumn(metric, format="%.2f%%" if is_percent(metric, metadata) else "%.2f")
+        for metric in result.columns if metric in index.metrics
+    }
+    display = result.copy()
+    for metric in column_config:
+        if is_percent(metric, metadata):
+            display[metric] = display[metric] * 100
+    st.dataframe(display, column_config=column_config, use_container_width=True, hide_index=True)
+    st.download_button(
+        label="📥 Tải kết quả (CSV)",
+        data=result.to_csv(index=False).encode('utf-8-sig'),
+        file_name=f"screener_{selected_year}.csv",
+        mime="text/csv",
+    )
+
+if __name__ == "__main__":
+    main()
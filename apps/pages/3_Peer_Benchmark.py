@@ -0,0 +1,125 @@
+import streamlit as st
+import pandas as pd
+import plotly.graph_objects as go
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'model'))
+import data_access
+import peer_benchmark
+import financial_ratios
+
+# --------------------------------------------------------------------------
+# Page Configuration
+# --------------------------------------------------------------------------
+st.set_page_config(
+    page_title="ValuX Team | Peer Benchmark",
+    page_icon="🏭",
+    layout="wide",
+    initial_sidebar_state="expanded",
+)
+
+# --------------------------------------------------------------------------
+# App Configuration
+# --------------------------------------------------------------------------
+current_dir = os.path.dirname(os.path.abspath(__file__)) if '__file__' in locals() else '.'
+data_dir = os.path.join(current_dir, 'data').replace('\\pages', '').replace('/pages', '')
+CONFIG = {
+    "ratios_filename": "financial_ratios.parquet",  # Do model/financial_ratios.py ghi ra
+    "benchmark_filename": peer_benchmark.BENCHMARK_FILENAME,
+    "min_peers": 5,  # Ít hơn số công ty này thì phân phối ngành kém tin cậy
+    "default_metric": "roe",
+}
+
+# --------------------------------------------------------------------------
+# Utility Functions
+# --------------------------------------------------------------------------
+# Bảng chỉ số và bảng phân vị được tải một lần cho mỗi phiên bản nội dung file chỉ số, dùng chung
+# cho mọi phiên; khi file chỉ số thay đổi, chỉ các nhóm ngành x năm thay đổi được tính lại.
+@st.cache_resource(max_entries=2, show_spinner="Đang cập nhật phân vị ngành...")
+def load_data(ratios_path, benchmark_path, signature):
+    """Trả về (bảng chỉ số báo cáo năm, bảng phân vị ngành)."""
+    ratios = pd.read_parquet(ratios_path)
+    benchmarks = peer_benchmark.get_benchmarks(ratios_path, benchmark_path)
+    return ratios[ratios['quarter'] == 0], benchmarks[benchmarks['quarter'] == 0]
+
+def format_value(value, percent):
+    if pd.isna(value):
+        return '—'
+    return f"{value * 100:.2f}%" if percent else f"{value:,.2f}"
+
+# --------------------------------------------------------------------------
+# Main Application Logic
+# --------------------------------------------------------------------------
+def main():
+    st.title("🏭 So sánh với Doanh nghiệp cùng Ngành")
+
+    ratios_path = os.path.join(data_dir, CONFIG["ratios_filename"])
+    if not os.path.exists(ratios_path):
+        st.error(f"Lỗi: Không tìm thấy tệp '{ratios_path}'. Chạy model/financial_ratios.py để tạo file chỉ số.")
+        st.stop()
+    signature = data_access.source_signature(ratios_path)
+    ratios, benchmarks = load_data(ratios_path, os.path.join(data_dir, CONFIG["benchmark_filename"]), signature)
+    metadata = financial_ratios.read_ratio_metadata(ratios_path)
+    metrics = peer_benchmark.metric_columns(ratios)
+
+    # --- Sidebar Filters ---
+    with st.sidebar:
+        st.header("Chọn Doanh nghiệp ⚙️")
+        companies = sorted(ratios['company_code'].astype(str).unique())
+        selected_company = st.selectbox('Mã Chứng Khoán (Company Code)', options=companies,
+                                        index=companies.index('VNM') if 'VNM' in companies else 0)
+        company_rows = ratios[ratios['company_code'] == selected_company]
+        years = sorted(company_rows['report_date'].astype(int).unique(), reverse=True)
+        selected_year = st.selectbox('Năm báo cáo (Report Year)', options=years)
+
+    industry = company_rows['industry'].iloc[0]
+    st.markdown(f"**{selected_company}** – {company_rows['company_name'].iloc[0]} · Ngành: **{industry}**")
+
+    # --- Placement Table ---
+    st.subheader(f"I. Vị trí trong Phân phối Ngành năm {selected_year}", divider="rainbow")
+    placed = peer_benchmark.place_company(benchmarks, ratios, selected_company, selected_year)
+    display = pd.DataFrame({
+        'Chỉ số': placed['metric'],
+        'Giá trị': [format_value(v, metadata.get(m, {}).get('unit') == '%') for m, v in zip(placed['metric'], placed['value'])],
+        **{column: [format_value(v, metadata.get(m, {}).get('unit') == '%') for m, v in zip(placed['metric'], placed[column])]
+           for column in peer_benchmark.PERCENTILE_COLUMNS},
+        'Số DN cùng ngành': placed['peer_count'].fillna(0).astype(int),
+        'Khoảng': placed['band'],
+        'Phân vị ước lượng': placed['percentile'],
+    })
+    st.dataframe(display, column_config={
+        'Phân vị ước lượng': st.column_config.ProgressColumn('Phân vị ước lượng', min_value=0, max_value=100, format="%.0f"),
+    }, use_container_width=True, hide_index=True)
+    thin = placed['peer_count'].fillna(0) < CONFIG["min_peers"]
+    if thin.any():
+        st.caption(f"⚠️ {int(thin.sum())} chỉ số có ít hơn {CONFIG['min_peers']} doanh nghiệp cùng ngành có số liệu.")
+
+    # --- History Chart ---
+    st.subheader("II. Diễn biến so với Ngành", divider="rainbow")
+    default_metric = metrics.index(CONFIG["default_metric"]) if CONFIG["default_metric"] in metrics else 0
+    metric = st.selectbox('Chỉ số', options=metrics, index=default_metric)
+    scale = 100 if metadata.get(metric, {}).get('unit') == '%' else 1
+    history = benchmarks[(benchmarks['industry'] == industry) & (benchmarks['metric'] == metric)].sort_values('report_date')
+    company_history = company_rows.sort_values('report_date')
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=history['report_date'], y=history['p90'] * scale, line=dict(width=0),
+                             showlegend=False, hoverinfo='skip'))
+    fig.add_trace(go.Scatter(x=history['report_date'], y=history['p10'] * scale, fill='tonexty', line=dict(width=0),
+                             fillcolor='rgba(102,197,204,0.2)', name='p10–p90'))
+    fig.add_trace(go.Scatter(x=history['report_date'], y=history['p75'] * scale, line=dict(width=0),
+                             showlegend=False, hoverinfo='skip'))
+    fig.add_trace(go.Scatter(x=history['report_date'], y=history['p25'] * scale, fill='tonexty', line=dict(width=0),
+                             fillcolor='rgba(102,197,204,0.45)', name='p25–p75'))
+    fig.add_trace(go.Scatter(x=history['report_date'], y=history['p50'] * scale, name='Trung vị ngành',
+                             line=dict(color='#66c5cc', dash='dash')))
+    fig.add_trace(go.Scatter(x=company_history['report_date'], y=company_history[metric] * scale,
+                             name=selected_company, mode='lines+markers', line=dict(color='#f68e66', width=3)))
+    fig.update_layout(yaxis_title=f"{metric} ({metadata.get(metric, {}).get('unit', '')})", xaxis_title="Năm",
+                      hovermode='x unified', height=450)
+    st.plotly_chart(fig, use_container_width=True)
+
+if __name__ == "__main__":
+    main()
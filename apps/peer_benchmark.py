@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import data_access
+
+# Cột định danh của file chỉ số dùng chung với model/financial_ratios.py thay vì một bản sao riêng
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model'))
+from financial_ratios import ID_COLUMNS
+
+# --------------------------------------------------------------------------
+# Phân phối chỉ số theo ngành (Industry Peer Benchmarks)
+# --------------------------------------------------------------------------
+# Với mỗi (ngành, năm, quý) và mỗi chỉ số trong apps/data/financial_ratios.parquet, lưu các phân vị
+# p10/p25/p50/p75/p90 và số công ty có số liệu. Ngành là cột 'industry' (icb_name2 trong danh sách công ty).
+# Toàn bộ phân vị được tính trong một lần groupby().quantile() trên mọi cột chỉ số cùng lúc.
+# Mỗi nhóm (ngành, năm, quý) có một dấu vết (tổng mã băm các dòng của nhóm); khi file chỉ số thay đổi,
+# chỉ các nhóm có dấu vết khác (dữ liệu mới hoặc sửa lại) được tính lại, các nhóm khác giữ nguyên.
+# Vị trí của một công ty trong phân phối ngành được nội suy từ các phân vị đã lưu, không cần đọc lại dữ liệu.
+
+GROUP_COLUMNS = ['industry', 'report_date', 'quarter']
+PERCENTILES = [10, 25, 50, 75, 90]
+PERCENTILE_COLUMNS = [f'p{p}' for p in PERCENTILES]
+BENCHMARK_COLUMNS = GROUP_COLUMNS + ['metric', 'peer_count'] + PERCENTILE_COLUMNS + ['fingerprint']
+BENCHMARK_FILENAME = 'peer_benchmarks.parquet'
+METADATA_KEY = b'peer_benchmarks'
+
+
+def metric_columns(ratios):
+    return [column for column in ratios.columns if column not in ID_COLUMNS]
+
+def group_fingerprints(ratios):
+    """Dấu vết của từng nhóm (ngành, năm, quý): tổng (uint64, không phụ thuộc thứ tự dòng) mã băm các dòng."""
+    hashes = pd.util.hash_pandas_object(ratios[['company_code'] + metric_columns(ratios)].astype(
+        {'company_code': str}), index=False)
+    return hashes.groupby([ratios[column] for column in GROUP_COLUMNS], observed=True).sum().rename('fingerprint')
+
+def compute_benchmarks(ratios, fingerprints=None):
+    """
+    Phân vị và số công ty của mọi chỉ số cho mọi nhóm (ngành, năm, quý) trong một lần groupby.
+    Trả về một dòng cho mỗi (nhóm, chỉ số); chỉ số không có số liệu trong nhóm có peer_count 0 và phân vị NaN.
+    """
+    metrics = metric_columns(ratios)
+    ratios = ratios.dropna(subset=['industry'])
+    if ratios.empty:
+        return pd.DataFrame(columns=BENCHMARK_COLUMNS)
+    grouped = ratios.groupby(GROUP_COLUMNS, observed=True)[metrics]
+    quantiles = grouped.quantile([p / 100 for p in PERCENTILES])  # index: nhóm + phân vị, cột: chỉ số
+    quantiles.index = quantiles.index.set_names(GROUP_COLUMNS + ['percentile'])
+    table = quantiles.stack(future_stack=True).rename_axis(GROUP_COLUMNS + ['percentile', 'metric']) \
+        .unstack('percentile')
+    table.columns = PERCENTILE_COLUMNS
+    counts = grouped.count().stack(future_stack=True).rename_axis(GROUP_COLUMNS + ['metric']).rename('peer_count')
+    table = table.join(counts).reset_index()
+    if fingerprints is None:
+        fingerprints = group_fingerprints(ratios)
+    table = table.merge(fingerprints.reset_index(), on=GROUP_COLUMNS, how='left')
+    return table[BENCHMARK_COLUMNS].sort_values(GROUP_COLUMNS + ['metric']).reset_index(drop=True)
+
+def refresh_benchmarks(ratios, benchmarks=None):
+    """
+    Cập nhật tăng dần: chỉ tính lại các nhóm mới hoặc có dấu vết thay đổi, bỏ các nhóm không còn dữ liệu.
+    Trả về (bảng phân vị, số nhóm đã tính lại).
+    """
+    fingerprints = group_fingerprints(ratios)
+    if benchmarks is None or benchmarks.empty:
+        return compute_benchmarks(ratios, fingerprints), len(fingerprints)
+    saved = benchmarks[GROUP_COLUMNS + ['fingerprint']].drop_duplicates(GROUP_COLUMNS)
+    current = fingerprints.reset_index().merge(saved, on=GROUP_COLUMNS + ['fingerprint'], how='left', indicator=True)
+    changed = current[current['_merge'] == 'left_only'][GROUP_COLUMNS]
+    unchanged = current[current['_merge'] == 'both'][GROUP_COLUMNS]
+
+    kept = benchmarks.merge(unchanged, on=GROUP_COLUMNS)
+    changed_rows = ratios.merge(changed, on=GROUP_COLUMNS)
+    recomputed = compute_benchmarks(changed_rows, fingerprints) if len(changed_rows) else None
+    table = pd.concat([kept, recomputed], ignore_index=True) if recomputed is not None else kept
+    return table[BENCHMARK_COLUMNS].sort_values(GROUP_COLUMNS + ['metric']).reset_index(drop=True), len(changed)
+
+def place_company(benchmarks, ratios, company_code, year, quarter=0):
+    """
+    Vị trí các chỉ số của một công ty trong phân phối ngành của nó: giá trị, các phân vị, số công ty
+    cùng ngành, khoảng phân vị chứa giá trị và phân vị ước lượng (nội suy tuyến tính giữa p10...p90;
+    ngoài khoảng này được chặn về 10 hoặc 90). Trả về None nếu không có số liệu của công ty.
+    """
+    row = ratios[(ratios['company_code'] == company_code) & (ratios['report_date'] == year) &
+                 (ratios['quarter'] == quarter)]
+    if row.empty:
+        return None
+    row = row.iloc[0]
+    values = row[metric_columns(ratios)].astype(float).rename('value').rename_axis('metric').reset_index()
+    peers = benchmarks[(benchmarks['industry'] == row['industry']) & (benchmarks['report_date'] == year) &
+                       (benchmarks['quarter'] == quarter)]
+    placed = values.merge(peers[['metric', 'peer_count'] + PERCENTILE_COLUMNS], on='metric', how='left')
+
+    knots = placed[PERCENTILE_COLUMNS].to_numpy(dtype=float)
+    value = placed['value'].to_numpy(dtype=float)
+    below = (value[:, None] >= knots).sum(axis=1)  # Số phân vị không lớn hơn giá trị
+    lower = np.clip(below - 1, 0, len(PERCENTILES) - 1)
+    upper = np.clip(below, 0, len(PERCENTILES) - 1)
+    rows = np.arange(len(placed))
+    span = knots[rows, upper] - knots[rows, lower]
+    fraction = np.divide(value - knots[rows, lower], span, out=np.zeros_like(value), where=span > 0)
+    steps = np.asarray(PERCENTILES, dtype=float)
+    percentile = steps[lower] + fraction * (steps[upper] - steps[lower])
+    valid = ~np.isnan(value) & ~np.isnan(knots).any(axis=1)
+    placed['percentile'] = np.where(valid, percentile, np.nan)
+
+    bands = ['< p10'] + [f'{a}–{b}' for a, b in zip(PERCENTILE_COLUMNS, PERCENTILE_COLUMNS[1:])] + ['> p90']
+    placed['band'] = np.where(valid, np.asarray(bands, dtype=object)[below], None)
+    return placed
+
+
+# --------------------------------------------------------------------------
+# Lưu, tải và làm mới
+# --------------------------------------------------------------------------
+def save_benchmarks(benchmarks, path, signature):
+    """Lưu bảng phân vị; dấu vết file chỉ số nguồn nằm trong metadata."""
+    table = pa.Table.from_pandas(benchmarks, preserve_index=False)
+    metadata = {METADATA_KEY: json.dumps({'signature': signature}).encode('utf-8')}
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata}), tmp_path)
+    os.replace(tmp_path, path)
+
+def load_benchmarks(path):
+    """Tải bảng phân vị đã lưu cùng dấu vết nguồn; (None, None) nếu chưa có."""
+    if not os.path.exists(path):
+        return None, None
+    table = pq.read_table(path)
+    info = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b'{}'))
+    return table.to_pandas(), info.get('signature')
+
+def get_benchmarks(ratios_path, benchmark_path):
+    """
+    Dùng bảng phân vị đã lưu nếu còn khớp nội dung file chỉ số; nếu không thì làm mới tăng dần
+    các nhóm thay đổi và lưu lại (nếu ghi được).
+    """
+    signature = data_access.source_signature(ratios_path)
+    benchmarks, saved_signature = load_benchmarks(benchmark_path)
+    if benchmarks is not None and saved_signature == signature:
+        return benchmarks
+    benchmarks, _ = refresh_benchmarks(pd.read_parquet(ratios_path), benchmarks)
+    try:
+        save_benchmarks(benchmarks, benchmark_path, signature)
+    except OSError:
+        pass  # Thư mục chỉ đọc (vd: khi deploy): vẫn dùng bảng trong bộ nhớ
+    return benchmarks
+
+
+def main():
+    """Bước build: tạo hoặc làm mới tăng dần bảng phân vị ngành."""
+    parser = argparse.ArgumentParser(description="Tính phân vị chỉ số tài chính theo ngành x năm.")
+    parser.add_argument('--ratios', type=str, default=os.path.join('data', 'financial_ratios.parquet'),
+                        help="File chỉ số do model/financial_ratios.py ghi ra.")
+    parser.add_argument('--output', type=str, default=os.path.join('data', BENCHMARK_FILENAME),
+                        help="Đường dẫn file phân vị.")
+    parser.add_argument('--full', action='store_true', help="Tính lại toàn bộ thay vì chỉ các nhóm thay đổi.")
+    args = parser.parse_args()
+
+    benchmarks = None if args.full else load_benchmarks(args.output)[0]
+    benchmarks, recomputed = refresh_benchmarks(pd.read_parquet(args.ratios), benchmarks)
+    save_benchmarks(benchmarks, args.output, data_access.source_signature(args.ratios))
+    print(f"Đã lưu {len(benchmarks):,} dòng phân vị ({recomputed} nhóm ngành x kỳ được tính lại) vào '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import os
+import sys
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# Cột định danh của file chỉ số dùng chung với model/financial_ratios.py thay vì một bản sao riêng
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model'))
+from financial_ratios import ID_COLUMNS
+
+# --------------------------------------------------------------------------
+# Bộ lọc cổ phiếu theo chỉ số tài chính (Stock Screener)
+# --------------------------------------------------------------------------
+# Dữ liệu là file apps/data/financial_ratios.parquet do model/financial_ratios.py ghi ra (báo cáo năm).
+# Các chỉ số được xếp thành mảng dày chỉ số x công ty x năm, và mỗi chỉ số có một chỉ mục đã sắp xếp
+# (giá trị tăng dần kèm vị trí ô công ty x năm). Một điều kiện ngưỡng như ROE > 15% chỉ là một lần
+# tìm nhị phân (searchsorted) trên chỉ mục rồi đánh dấu các ô từ vị trí tìm được; điều kiện nhiều năm
+# liên tiếp là phép AND trên cửa sổ các năm của mặt nạ. Không có vòng lặp theo dòng, nên một lần lọc
+# toàn thị trường chỉ mất vài mili giây.
+
+COMPANY_COLUMNS = ['company_code', 'exchange', 'company_name', 'industry']
+# Giá trị hiển thị cho thông tin công ty còn trống, thay vì chuỗi 'nan' trong bộ lọc và kết quả
+MISSING_LABELS = {'exchange': 'Không rõ', 'company_name': '', 'industry': 'Không rõ'}
+OPERATORS = ['>', '>=', '<', '<=']
+
+# Điều kiện: metric operator threshold, đúng trong `years` năm liên tiếp tính đến năm lọc
+Condition = namedtuple('Condition', ['metric', 'operator', 'threshold', 'years'], defaults=[1])
+
+
+class ScreenerIndex:
+    """Các chỉ số dạng mảng dày (chỉ số, công ty, năm) cùng chỉ mục đã sắp xếp của từng chỉ số."""
+
+    def __init__(self, companies, years, metrics, values):
+        self.companies = companies.reset_index(drop=True)
+        self.years = years  # Các năm liên tục từ năm nhỏ nhất đến lớn nhất
+        self.metrics = list(metrics)
+        self.values = values  # float64, shape (số chỉ số, số công ty, số năm), NaN nếu không có số liệu
+        self._metric_positions = {metric: i for i, metric in enumerate(self.metrics)}
+        self._sorted = [self._sort(values[i].ravel()) for i in range(len(self.metrics))]
+
+    @staticmethod
+    def _sort(flat):
+        """Chỉ mục của một chỉ số: (giá trị tăng dần, vị trí ô tương ứng), bỏ qua các ô NaN."""
+        positions = np.flatnonzero(~np.isnan(flat))
+        order = np.argsort(flat[positions], kind='stable')
+        return flat[positions][order], positions[order]
+
+    def year_position(self, year):
+        return int(year) - int(self.years[0])
+
+    def metric_values(self, metric, year):
+        """Giá trị của một chỉ số ở một năm cho mọi công ty (view trên mảng)."""
+        return self.values[self._metric_positions[metric], :, self.year_position(year)]
+
+    def condition_mask(self, condition):
+        """Mặt nạ (công ty, năm) của các ô thỏa ngưỡng, tìm bằng searchsorted trên chỉ mục đã sắp xếp."""
+        if condition.operator not in OPERATORS:
+            raise ValueError(f"Toán tử không hợp lệ: {condition.operator}")
+        sorted_values, positions = self._sorted[self._metric_positions[condition.metric]]
+        if condition.operator in ('>', '>='):
+            start = np.searchsorted(sorted_values, condition.threshold, side='right' if condition.operator == '>' else 'left')
+            selected = positions[start:]
+        else:
+            end = np.searchsorted(sorted_values, condition.threshold, side='left' if condition.operator == '<' else 'right')
+            selected = positions[:end]
+        mask = np.zeros(self.values.shape[1] * self.values.shape[2], dtype=bool)
+        mask[selected] = True
+        return mask.reshape(self.values.shape[1:])
+
+    def screen(self, conditions, year, rank_by=None, ascending=False, exchanges=None, industries=None,
+               limit=None):
+        """
+        Các công ty thỏa mọi điều kiện ở năm `year`, kèm giá trị các chỉ số dùng trong điều kiện và
+        chỉ số xếp hạng (của năm đó), sắp theo rank_by (NaN xếp cuối). Danh sách sàn/ngành rỗng = không lọc.
+        """
+        end = self.year_position(year)
+        selected = np.ones(len(self.companies), dtype=bool)
+        for column, values in [('exchange', exchanges), ('industry', industries)]:
+            if values:
+                selected &= self.companies[column].isin(values).to_numpy()
+        for condition in conditions:
+            start = end - int(condition.years) + 1
+            if start < 0 or end >= len(self.years):
+                selected[:] = False  # Không đủ số năm dữ liệu cho điều kiện
+                break
+            selected &= self.condition_mask(condition)[:, start:end + 1].all(axis=1)
+
+        rows = np.flatnonzero(selected)
+        metrics = list(dict.fromkeys([condition.metric for condition in conditions] + ([rank_by] if rank_by else [])))
+        if rank_by:
+            rank_values = self.metric_values(rank_by, year)[rows]
+            order = np.argsort(rank_values if ascending else -rank_values, kind='stable')  # NaN xếp cuối
+            rows = rows[order]
+        if limit:
+            rows = rows[:limit]
+
+        result = self.companies.iloc[rows].reset_index(drop=True)
+        result.insert(0, 'rank', np.arange(1, len(rows) + 1))
+        for metric in metrics:
+            result[metric] = self.metric_values(metric, year)[rows]
+        return result
+
+
+# --------------------------------------------------------------------------
+# Xây dựng chỉ mục từ file chỉ số
+# --------------------------------------------------------------------------
+def build_index(ratios):
+    """Xếp bảng chỉ số (một dòng mỗi công ty x kỳ) thành ScreenerIndex; chỉ dùng các kỳ báo cáo năm."""
+    annual = ratios[(ratios['quarter'] == 0) & ratios['company_code'].notna()]
+    metrics = [column for column in ratios.columns if column not in ID_COLUMNS]
+    company_codes, company_index = np.unique(annual['company_code'].astype(str).to_numpy(), return_inverse=True)
+    first_rows = np.unique(company_index, return_index=True)[1]
+    companies = annual[COMPANY_COLUMNS].iloc[first_rows].astype(object).fillna(MISSING_LABELS) \
+        .astype(str).reset_index(drop=True)
+
+    report_dates = annual['report_date'].to_numpy(dtype=np.int64)
+    years = np.arange(report_dates.min(), report_dates.max() + 1) if len(annual) else np.array([], dtype=np.int64)
+    values = np.full((len(metrics), len(company_codes), len(years)), np.nan)
+    if len(annual):
+        values[:, company_index, report_dates - years[0]] = annual[metrics].to_numpy(dtype=np.float64).T
+    return ScreenerIndex(companies, years, metrics, values)
+
+def load_index(path):
+    """Đọc file chỉ số và xây ScreenerIndex; trả về None nếu file không tồn tại."""
+    if not os.path.exists(path):
+        return None
+    return build_index(pd.read_parquet(path))
@@ -0,0 +1,52 @@
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+import sys
+import streamlit as st
+import data_access
+
+# Cube BCTC dùng chung lớp đọc của pipeline (model/statement_cube.py) thay vì một bản sao riêng
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model'))
+from statement_cube import META_FILENAME, read_cube
+
+# --------------------------------------------------------------------------
+# Bộ nhớ đệm dữ liệu dùng chung cho mọi phiên và mọi trang (Shared Dataset Cache)
+# --------------------------------------------------------------------------
+# st.cache_data pickle rồi sao chép kết quả cho mỗi lần gọi, và mỗi trang định nghĩa hàm cache
+# riêng nên giữ bản sao riêng. Ở đây mỗi file chỉ được đọc một lần cho cả tiến trình thành một
+# pyarrow Table bất biến (st.cache_resource), mọi phiên dùng chung; khóa cache gồm dấu vết nội dung
+# file nên khi pipeline ghi file mới, lần chạy kế tiếp tự đọc lại mà không cần xóa cache.
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _read_table(path, signature):
+    """Đọc file parquet một lần cho mỗi phiên bản nội dung (signature) của file."""
+    return pq.read_table(path)
+
+def load_table(path):
+    """Trả về pyarrow Table dùng chung của file (chỉ đọc), hoặc None nếu file không tồn tại."""
+    if not os.path.exists(path):
+        return None
+    return _read_table(path, data_access.source_signature(path))
+
+def load_frame(path):
+    """
+    Trả về DataFrame chỉ đọc trên Table dùng chung: các cột dùng kiểu ArrowDtype nên
+    không sao chép dữ liệu, chi phí mỗi lần gọi không phụ thuộc số người dùng.
+    Cần chỉnh sửa thì dùng load_table(path).to_pandas() để có bản sao riêng.
+    """
+    table = load_table(path)
+    if table is None:
+        return None
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _open_cube(directory, signature):
+    """Mở cube một lần cho mỗi phiên bản (cube.json được ghi lại sau cùng mỗi lần pipeline chạy)."""
+    return read_cube(directory)
+
+def load_statement_cube(directory):
+    """Trả về statement_cube.StatementCube dùng chung (values là memory-map chỉ đọc), hoặc None nếu chưa có cube."""
+    meta_path = os.path.join(directory, META_FILENAME)
+    if not os.path.exists(meta_path):
+        return None
+    return _open_cube(directory, data_access.source_signature(meta_path))
@@ -0,0 +1,115 @@
+import os
+import gzip
+import json
+import time
+import glob
+import argparse
+import logging
+from io import StringIO
+import numpy as np
+import pandas as pd
+import cafef_parser
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def load_corpus(corpus_dir: str) -> list[tuple[str, str]]:
+    """
+    Loads saved CafeF pages: plain .html/.htm/.chn files, or entries of the
+    pipeline's page cache (.json.gz).
+    """
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, '**', '*'), recursive=True)):
+        if path.endswith('.json.gz'):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                pages.append((path, json.load(f)['html']))
+        elif path.endswith(('.html', '.htm', '.chn')):
+            with open(path, 'r', encoding='utf-8') as f:
+                pages.append((path, f.read()))
+    return pages
+
+
+def parse_with_read_html(html: str, n_periods: int) -> pd.DataFrame:
+    """The previous approach: build every table on the page, keep table 4."""
+    table = pd.read_html(StringIO(html))[4]
+    return table.iloc[:, :n_periods + 1]
+
+
+def parse_with_cafef_parser(html: str, n_periods: int) -> pd.DataFrame | None:
+    parsed = cafef_parser.parse_report_table(html, n_periods)
+    return None if parsed is None else parsed[1]
+
+
+def time_parser(parse, pages: list[tuple[str, str]], n_periods: int, repeat: int) -> float:
+    """Returns the best wall time, in seconds, of parsing the whole corpus."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _, html in pages:
+            try:
+                parse(html, n_periods)
+            except Exception:
+                pass
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check_agreement(pages: list[tuple[str, str]], n_periods: int) -> int:
+    """Counts pages where both parsers disagree on labels or values."""
+    mismatches = 0
+    for path, html in pages:
+        try:
+            legacy = parse_with_read_html(html, n_periods)
+        except Exception:
+            legacy = None
+        fast = parse_with_cafef_parser(html, n_periods)
+        if legacy is None or fast is None:
+            if (legacy is None) != (fast is None):
+                logging.warning(f"Only one parser found a table in '{path}'")
+                mismatches += 1
+            continue
+        legacy_values = legacy.iloc[:, 1:].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        same_labels = legacy.iloc[:, 0].fillna('').astype(str).tolist() == fast['account'].fillna('').tolist()
+        same_values = legacy_values.shape == fast.iloc[:, 1:].shape and np.allclose(
+            legacy_values, fast.iloc[:, 1:].to_numpy(), equal_nan=True)
+        if not (same_labels and same_values):
+            logging.warning(f"Parsers disagree on '{path}'")
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark of the CafeF report parser against pd.read_html on saved pages.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--corpus', type=str, default='output_data/page_cache',
+                        help="Directory of saved pages (.html/.chn files or page cache entries).")
+    parser.add_argument('--periods', type=int, default=4, help="Number of period columns per page.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timing repetitions; the best one is reported.")
+    parser.add_argument('--limit', type=int, help="Only use the first N pages of the corpus.")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus)[:args.limit]
+    if not pages:
+        logging.error(f"No saved pages found in '{args.corpus}'.")
+        return
+    logging.info(f"Loaded {len(pages)} pages from '{args.corpus}'.")
+
+    mismatches = check_agreement(pages, args.periods)
+    logging.info(f"Agreement check: {len(pages) - mismatches}/{len(pages)} pages identical.")
+
+    legacy_time = time_parser(parse_with_read_html, pages, args.periods, args.repeat)
+    fast_time = time_parser(parse_with_cafef_parser, pages, args.periods, args.repeat)
+    for name, elapsed in [('pd.read_html', legacy_time), ('cafef_parser', fast_time)]:
+        logging.info(f"{name:>13}: {elapsed:.3f}s total, {elapsed / len(pages) * 1000:.2f} ms/page, "
+                     f"{len(pages) / elapsed:.0f} pages/s")
+    logging.info(f"Speed-up: {legacy_time / fast_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import re
+from html.parser import HTMLParser
+import numpy as np
+import pandas as pd
+
+# Vị trí (theo thứ tự xuất hiện) của bảng tiêu đề và bảng số liệu trên trang CafeF,
+# trùng với chỉ số pd.read_html(...)[3] và [4] mà pipeline dùng trước đây.
+HEADER_TABLE_ID, HEADER_TABLE_INDEX = 'tblGridData', 3
+DATA_TABLE_ID, DATA_TABLE_INDEX = 'tableContent', 4
+FEED_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE_RE = re.compile(r"[\r\n]+|\s{2,}")
+_NUMBER_RE = re.compile(r"^\(?-?[\d,]*\.?\d+\)?$")
+
+
+def clean_text(text: str) -> str:
+    """Normalizes cell text the same way pd.read_html does."""
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def parse_number(text: str) -> float:
+    """
+    Converts a CafeF cell such as '1,234,567', '-1,234' or '(1,234)' to a
+    float. Empty or non-numeric cells become NaN.
+    """
+    text = text.strip()
+    if not text or not _NUMBER_RE.match(text):
+        return np.nan
+    negative = text.startswith('(') and text.endswith(')')
+    value = float(text.strip('()').replace(',', ''))
+    return -value if negative else value
+
+
+class _ReportTableParser(HTMLParser):
+    """
+    Streams a CafeF report page and keeps only the rows of the header and
+    data tables; every other table on the page is skipped without being
+    materialized.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.table_count = 0
+        self.tables = {}  # (kind, matched_by) -> list of rows
+        self._stack = []  # một phần tử cho mỗi <table> đang mở: khóa lưu trữ hoặc None
+        self._row = None
+        self._cell = None
+
+    def _table_key(self, index: int, table_id: str | None):
+        if table_id == HEADER_TABLE_ID:
+            return ('header', 'id')
+        if table_id == DATA_TABLE_ID:
+            return ('data', 'id')
+        if index == HEADER_TABLE_INDEX:
+            return ('header', 'index')
+        if index == DATA_TABLE_INDEX:
+            return ('data', 'index')
+        return None
+
+    @property
+    def done(self) -> bool:
+        """True once the data table has been read completely."""
+        return ('data', 'id') in self.tables and not self._stack
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            key = self._table_key(self.table_count, dict(attrs).get('id'))
+            self.table_count += 1
+            if key is not None:
+                self.tables[key] = []
+            self._stack.append(key)
+        elif not self._stack or self._stack[-1] is None:
+            return
+        elif tag == 'tr':
+            self._row = []
+        elif tag in ('td', 'th') and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag == 'table':
+            if self._stack and self._stack.pop() is not None:
+                self._row, self._cell = None, None
+        elif not self._stack or self._stack[-1] is None:
+            return
+        elif tag in ('td', 'th') and self._cell is not None:
+            self._row.append(clean_text("".join(self._cell)))
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            if self._row:
+                self.tables[self._stack[-1]].append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def parse_report_table(html: str, n_periods: int) -> tuple[list[str], pd.DataFrame] | None:
+    """
+    Extracts the financial report table from a CafeF page.
+
+    Args:
+        html (str): The raw page.
+        n_periods (int): Number of period columns the page shows.
+
+    Returns:
+        tuple[list[str], pd.DataFrame] | None: The period labels of the header
+        (empty if the header is missing) and a DataFrame with an 'account'
+        label column followed by n_periods float64 columns named 0..n-1.
+        None if the page has no data table.
+    """
+    parser = _ReportTableParser()
+    for start in range(0, len(html), FEED_CHUNK_SIZE):
+        parser.feed(html[start:start + FEED_CHUNK_SIZE])
+        if parser.done:
+            break
+    parser.close()
+
+    rows = parser.tables.get(('data', 'id')) or parser.tables.get(('data', 'index'))
+    if not rows:
+        return None
+    header_rows = parser.tables.get(('header', 'id')) or parser.tables.get(('header', 'index')) or [[]]
+    labels = header_rows[0][1:n_periods + 1]
+
+    accounts = [row[0] for row in rows]
+    values = np.full((len(rows), n_periods), np.nan)
+    for i, row in enumerate(rows):
+        for j, cell in enumerate(row[1:n_periods + 1]):
+            values[i, j] = parse_number(cell)
+
+    table = pd.DataFrame(values)
+    table.insert(0, 'account', pd.Series(accounts, dtype=object).replace('', np.nan))
+    return labels, table
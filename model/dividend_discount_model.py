@@ -0,0 +1,219 @@
+import os
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# CONFIGURATION
+# ==============================================================================
+# Định giá cổ tức chiết khấu (Dividend Discount Model, mô hình Gordon) cho toàn bộ danh sách mã,
+# theo các bước của notebook/DMM_Stock.ipynb:
+#   Giá hợp lý = Cổ tức kỳ vọng / (Chi phí vốn chủ - Tăng trưởng kỳ vọng)
+#   Chi phí vốn chủ (CAPM) = Lãi suất phi rủi ro + Beta x Phần bù rủi ro thị trường
+# Dữ liệu đọc từ file cục bộ (parquet/csv): lịch sử cổ tức và chia tách cổ phiếu của mọi mã
+# (bảng 'actions' của yfinance kèm cột symbol), và bảng beta/giá hiện tại theo mã.
+CONFIG = {
+    "risk_free_rates": [0.03],  # Lợi suất trái phiếu chính phủ 10 năm
+    "market_premiums": [0.08],  # Lợi nhuận thị trường - lãi suất phi rủi ro (notebook: 11% - 3%)
+    "output_filepath": "output_data/dividend_valuation.parquet",
+}
+# Tên cột của yfinance (Ticker.actions) được đổi về tên cột chuẩn
+COLUMN_ALIASES = {
+    'Symbol': 'symbol', 'ticker': 'symbol', 'Date': 'date', 'Dividends': 'dividends',
+    'Stock Splits': 'stock_splits', 'Beta': 'beta', 'Close': 'price', 'close': 'price',
+}
+ACTION_COLUMNS = ['symbol', 'date', 'dividends', 'stock_splits']
+MARKET_COLUMNS = ['symbol', 'beta', 'price']
+SUMMARY_COLUMNS = ['symbol', 'last_year', 'last_dividend', 'median_growth', 'expected_dividend', 'beta', 'price']
+
+
+# ==============================================================================
+# DIVIDEND HISTORY
+# ==============================================================================
+def normalize_actions(actions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Brings a dividend/split history to ACTION_COLUMNS, sorted by symbol and date.
+    A split ratio of 0 means no split on that date, as in yfinance.
+    """
+    if actions.index.name in ('Date', 'date'):
+        actions = actions.reset_index()  # Ticker.actions của yfinance dùng ngày làm index
+    actions = actions.rename(columns=COLUMN_ALIASES)
+    missing = [column for column in ACTION_COLUMNS if column not in actions.columns]
+    if missing:
+        raise ValueError(f"Dividend history is missing columns: {missing}")
+    actions = actions[ACTION_COLUMNS].copy()
+    actions['symbol'] = actions['symbol'].astype(str)
+    actions['date'] = pd.to_datetime(actions['date'], utc=True)
+    actions[['dividends', 'stock_splits']] = actions[['dividends', 'stock_splits']].astype(float).fillna(0.0)
+    return actions.sort_values(['symbol', 'date'], kind='stable').reset_index(drop=True)
+
+def adjust_dividends(actions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the cumulative split factor of each symbol (the running product of
+    its split ratios, 0 counted as 1) and the dividends adjusted by it.
+
+    Args:
+        actions (pd.DataFrame): Output of normalize_actions.
+
+    Returns:
+        pd.DataFrame: The actions with 'split_factor' and 'div_adj' columns.
+    """
+    actions = actions.copy()
+    split_ratio = np.where(actions['stock_splits'].to_numpy() == 0, 1.0, actions['stock_splits'].to_numpy())
+    actions['split_factor'] = pd.Series(split_ratio, index=actions.index).groupby(actions['symbol'].to_numpy()).cumprod()
+    actions['div_adj'] = actions['dividends'] * actions['split_factor']
+    return actions
+
+def yearly_dividends(actions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sums the raw and adjusted dividends of each symbol per calendar year and
+    adds the year-over-year growth of the adjusted dividends. Growth from a
+    year without dividends is undefined (NaN) rather than infinite.
+
+    Returns:
+        pd.DataFrame: symbol, year, dividends, div_adj, growth.
+    """
+    adjusted = adjust_dividends(actions)
+    adjusted['year'] = adjusted['date'].dt.year
+    yearly = adjusted.groupby(['symbol', 'year'], sort=True)[['dividends', 'div_adj']].sum().reset_index()
+    previous = yearly.groupby('symbol')['div_adj'].shift(1)
+    yearly['growth'] = np.divide(yearly['div_adj'] - previous, previous,
+                                 out=np.full(len(yearly), np.nan), where=previous.to_numpy() != 0)
+    return yearly
+
+def dividend_summary(yearly: pd.DataFrame, market: pd.DataFrame | None = None, year: int | None = None) -> pd.DataFrame:
+    """
+    One row per symbol: the dividend of the base year, the median yearly
+    growth and the expected next dividend (base dividend x (1 + growth)).
+
+    Args:
+        yearly (pd.DataFrame): Output of yearly_dividends.
+        market (pd.DataFrame | None): Beta and current price per symbol (MARKET_COLUMNS).
+        year (int | None): Base year for every symbol; by default each symbol's latest year.
+
+    Returns:
+        pd.DataFrame: SUMMARY_COLUMNS.
+    """
+    grouped = yearly.groupby('symbol', sort=True)
+    summary = pd.DataFrame({'median_growth': grouped['growth'].median()})
+    if year is None:
+        last = grouped[['year', 'dividends']].last()
+    else:
+        last = yearly[yearly['year'] == year].set_index('symbol')[['year', 'dividends']]
+    summary = summary.join(last.rename(columns={'year': 'last_year', 'dividends': 'last_dividend'}))
+    summary['last_year'] = summary['last_year'].astype('Int16')  # Trống nếu mã không có cổ tức trong năm gốc
+    summary['expected_dividend'] = summary['last_dividend'] * (1 + summary['median_growth'])
+    summary = summary.rename_axis('symbol').reset_index()
+
+    market = pd.DataFrame(columns=MARKET_COLUMNS) if market is None else market
+    market = market.rename(columns=COLUMN_ALIASES).reindex(columns=MARKET_COLUMNS)
+    market = market.astype({'symbol': str, 'beta': float, 'price': float}).drop_duplicates('symbol', keep='last')
+    summary = summary.merge(market, on='symbol', how='left')
+    return summary[SUMMARY_COLUMNS]
+
+
+# ==============================================================================
+# VALUATION
+# ==============================================================================
+def cost_of_equity(beta: np.ndarray, risk_free_rate: np.ndarray, market_premium: np.ndarray) -> np.ndarray:
+    """CAPM cost of equity; the arguments broadcast against each other."""
+    return risk_free_rate + beta * market_premium
+
+def fair_value(expected_dividend: np.ndarray, growth: np.ndarray, equity_cost: np.ndarray) -> np.ndarray:
+    """
+    Gordon growth fair price, broadcasting like numpy. The model only holds
+    when the cost of equity exceeds growth; other cells are NaN.
+    """
+    spread = equity_cost - growth
+    expected_dividend, spread = np.broadcast_arrays(expected_dividend, spread)
+    return np.divide(expected_dividend, spread, out=np.full(spread.shape, np.nan), where=spread > 0)
+
+def value_universe(summary: pd.DataFrame, risk_free_rates: list[float], market_premiums: list[float]) -> pd.DataFrame:
+    """
+    Values every symbol under every (risk-free rate, market premium)
+    scenario at once: the cost of equity and fair value are computed as one
+    risk-free x premium x symbol array.
+
+    Args:
+        summary (pd.DataFrame): Output of dividend_summary.
+        risk_free_rates (list[float]): Risk-free rates of the scenario grid.
+        market_premiums (list[float]): Market premiums of the scenario grid.
+
+    Returns:
+        pd.DataFrame: One row per scenario and symbol with the summary columns,
+            cost_of_equity, fair_value and upside (fair value / price - 1;
+            positive means undervalued).
+    """
+    rates = np.asarray(risk_free_rates, dtype=float)[:, None, None]
+    premiums = np.asarray(market_premiums, dtype=float)[None, :, None]
+    beta = summary['beta'].to_numpy(dtype=float)[None, None, :]
+    growth = summary['median_growth'].to_numpy(dtype=float)
+    price = summary['price'].to_numpy(dtype=float)
+
+    equity_cost = cost_of_equity(beta, rates, premiums)
+    fair = fair_value(summary['expected_dividend'].to_numpy(dtype=float), growth, equity_cost)
+    upside = np.divide(fair, price, out=np.full(fair.shape, np.nan), where=price > 0) - 1
+
+    n_rates, n_premiums, n_symbols = fair.shape
+    result = summary.iloc[np.tile(np.arange(n_symbols), n_rates * n_premiums)].reset_index(drop=True)
+    result.insert(0, 'risk_free_rate', np.repeat(rates.ravel(), n_premiums * n_symbols))
+    result.insert(1, 'market_premium', np.tile(np.repeat(premiums.ravel(), n_symbols), n_rates))
+    result['cost_of_equity'] = equity_cost.ravel()
+    result['fair_value'] = fair.ravel()
+    result['upside'] = upside.ravel()
+    return result
+
+
+# ==============================================================================
+# FILES
+# ==============================================================================
+def read_table(path: str) -> pd.DataFrame:
+    """Reads a local parquet or csv file."""
+    if path.lower().endswith('.csv'):
+        return pd.read_csv(path)
+    return pd.read_parquet(path)
+
+def write_table(df: pd.DataFrame, path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.lower().endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        df.to_parquet(path, index=False)
+
+
+# ==============================================================================
+# MAIN EXECUTION
+# ==============================================================================
+def main():
+    """Values every symbol of a dividend history file over a grid of CAPM scenarios."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Batch dividend discount model valuation.")
+    parser.add_argument('--actions', required=True,
+                        help="Parquet/csv dividend and split history: symbol, date, dividends, stock_splits "
+                             "(yfinance 'Dividends'/'Stock Splits' names are accepted).")
+    parser.add_argument('--market', help="Parquet/csv with symbol, beta and current price per symbol.")
+    parser.add_argument('--risk-free-rate', type=float, nargs='+', default=CONFIG['risk_free_rates'],
+                        help="One or more risk-free rates, e.g. 0.025 0.03 0.035.")
+    parser.add_argument('--market-premium', type=float, nargs='+', default=CONFIG['market_premiums'],
+                        help="One or more market premiums (market return - risk-free rate).")
+    parser.add_argument('--year', type=int, help="Base dividend year for all symbols (default: each symbol's latest).")
+    parser.add_argument('--output', default=CONFIG['output_filepath'], help="Output parquet or csv file.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    actions = normalize_actions(read_table(args.actions))
+    market = read_table(args.market) if args.market else None
+    summary = dividend_summary(yearly_dividends(actions), market, args.year)
+    result = value_universe(summary, args.risk_free_rate, args.market_premium)
+    write_table(result, args.output)
+    valued = result['fair_value'].notna().groupby(result['symbol']).any().sum()
+    logging.info(f"Valued {valued:,} of {len(summary):,} symbols under "
+                 f"{len(args.risk_free_rate) * len(args.market_premium)} scenarios in "
+                 f"{time.perf_counter() - started:.2f}s; saved {len(result):,} rows to {args.output}.")
+
+if __name__ == "__main__":
+    main()
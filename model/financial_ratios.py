@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import NamedTuple
+from statement_schema import COMPRESSION
+from statement_cube import META_FILENAME, StatementCube, build_cube, load_statements, read_cube
+
+# ==============================================================================
+# RATIO LIBRARY - KHAI BÁO CÁC CHỈ SỐ TÀI CHÍNH
+# ==============================================================================
+class Ratio(NamedTuple):
+    """
+    A financial ratio declared over account codes (the english_format codes
+    of account_mapping.json). Numerator and denominator are linear
+    combinations {account: coefficient}; a missing account counts as 0, but
+    a side with none of its accounts reported leaves the ratio empty.
+    """
+    numerator: dict[str, float]
+    denominator: dict[str, float] | None = None  # None: giá trị của tử số (vd: EPS)
+    average_denominator: bool = False  # Mẫu số bình quân kỳ này và kỳ trước (chỉ tiêu dòng / chỉ tiêu cân đối)
+    growth: bool = False  # Tăng trưởng của tử số so với kỳ trước: x_t / |x_t-1| - 1
+    unit: str = 'x'  # '%' (lưu dạng tỷ lệ, 0.15 = 15%), 'x' (số lần) hoặc 'VND'
+    description: str = ''
+
+RATIOS = {
+    # Khả năng sinh lời
+    'gross_margin': Ratio({'gross_profit': 1}, {'net_rev': 1}, unit='%', description="Gross profit / net revenue"),
+    'operating_margin': Ratio({'net_operating_profit': 1}, {'net_rev': 1}, unit='%',
+                              description="Net operating profit / net revenue"),
+    'net_margin': Ratio({'net_profit': 1}, {'net_rev': 1}, unit='%', description="Net profit after tax / net revenue"),
+    'roe': Ratio({'net_profit_to_parent_shareholders': 1}, {'owners_equity': 1, 'nci': -1}, average_denominator=True,
+                 unit='%', description="Net profit to parent shareholders / average parent equity"),
+    'roa': Ratio({'net_profit': 1}, {'total_assets': 1}, average_denominator=True, unit='%',
+                 description="Net profit after tax / average total assets"),
+    'eps': Ratio({'basic_eps': 1}, unit='VND', description="Basic earnings per share"),
+    # Hiệu quả hoạt động
+    'asset_turnover': Ratio({'net_rev': 1}, {'total_assets': 1}, average_denominator=True,
+                            description="Net revenue / average total assets"),
+    'inventory_turnover': Ratio({'cost_of_sales': 1}, {'inventories': 1}, average_denominator=True,
+                                description="Cost of sales / average inventories"),
+    'receivable_turnover': Ratio({'net_rev': 1}, {'ar_st': 1}, average_denominator=True,
+                                 description="Net revenue / average short-term receivables"),
+    # Thanh khoản
+    'current_ratio': Ratio({'total_asset_st': 1}, {'liabilities_st': 1}, description="Current assets / current liabilities"),
+    'quick_ratio': Ratio({'total_asset_st': 1, 'inventories': -1}, {'liabilities_st': 1},
+                         description="(Current assets - inventories) / current liabilities"),
+    'cash_ratio': Ratio({'cash_and_cash_eq': 1}, {'liabilities_st': 1},
+                        description="Cash and cash equivalents / current liabilities"),
+    # Đòn bẩy
+    'debt_to_equity': Ratio({'debt_st': 1, 'debt_lt': 1}, {'owners_equity': 1},
+                            description="Short- and long-term borrowings / owners' equity"),
+    'liabilities_to_equity': Ratio({'total_liabilities': 1}, {'owners_equity': 1},
+                                   description="Total liabilities / owners' equity"),
+    'liabilities_to_assets': Ratio({'total_liabilities': 1}, {'total_assets': 1}, unit='%',
+                                   description="Total liabilities / total assets"),
+    'equity_multiplier': Ratio({'total_assets': 1}, {'owners_equity': 1}, description="Total assets / owners' equity"),
+    'interest_coverage': Ratio({'profit_before_tax': 1, 'interest_expense': 1}, {'interest_expense': 1},
+                               description="(Profit before tax + interest expense) / interest expense"),
+    # Dòng tiền
+    'ocf_to_net_profit': Ratio({'net_operating_cash_flows': 1}, {'net_profit': 1},
+                               description="Operating cash flow / net profit after tax"),
+    'fcf_margin': Ratio({'net_operating_cash_flows': 1, 'payments_capital_expenditures': 1}, {'net_rev': 1}, unit='%',
+                        description="(Operating cash flow - capital expenditure) / net revenue"),
+    'dividend_payout': Ratio({'payments_dividends': -1}, {'net_profit_to_parent_shareholders': 1}, unit='%',
+                             description="Dividends paid / net profit to parent shareholders"),
+    # Tăng trưởng
+    'revenue_growth': Ratio({'net_rev': 1}, growth=True, unit='%', description="Net revenue growth over the previous period"),
+    'net_profit_growth': Ratio({'net_profit_to_parent_shareholders': 1}, growth=True, unit='%',
+                               description="Growth of net profit to parent shareholders over the previous period"),
+    'asset_growth': Ratio({'total_assets': 1}, growth=True, unit='%', description="Total asset growth over the previous period"),
+}
+
+# Các cột mô tả công ty/kỳ đi kèm mỗi dòng chỉ số
+ID_COLUMNS = ['company_code', 'exchange', 'company_name', 'industry', 'report_date', 'quarter']
+RATIO_METADATA_KEY = b'financial_ratios'
+# Mã chỉ tiêu xuất hiện ở nhiều báo cáo (vd: profit_before_tax ở KQKD và dòng đầu của LCTT gián tiếp)
+# được lấy theo thứ tự ưu tiên này, không phụ thuộc thứ tự category của report_type
+REPORT_TYPE_PRIORITY = ['Income Statement', 'Balance Sheet', 'Cash Flow Statement', 'Direct Cash Flow Statement']
+_DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+
+
+def ratio_accounts(ratios: dict[str, Ratio]) -> list[str]:
+    """Returns the sorted account codes used by the given ratios."""
+    accounts = set()
+    for ratio in ratios.values():
+        accounts.update(ratio.numerator)
+        accounts.update(ratio.denominator or {})
+    return sorted(accounts)
+
+def ratio_schema(ratios: dict[str, Ratio]) -> pa.Schema:
+    """Storage schema of the ratios file: company/period columns, then one float64 column per ratio."""
+    fields = [
+        pa.field('company_code', _DICTIONARY_STRING, nullable=False),
+        pa.field('exchange', _DICTIONARY_STRING),
+        pa.field('company_name', _DICTIONARY_STRING),
+        pa.field('industry', _DICTIONARY_STRING),
+        pa.field('report_date', pa.int16(), nullable=False),
+        pa.field('quarter', pa.int8(), nullable=False),
+    ]
+    return pa.schema(fields + [pa.field(name, pa.float64()) for name in ratios])
+
+
+# ==============================================================================
+# PERIODS
+# ==============================================================================
+def previous_period_index(periods: pd.DataFrame) -> np.ndarray:
+    """
+    Index of the previous period of the same granularity on the period axis
+    (previous year for annual rows, previous quarter for quarterly rows), -1 if absent.
+    """
+    years, quarters = periods['report_date'].to_numpy(), periods['quarter'].to_numpy()
+    previous_years = np.where(quarters > 1, years, years - 1)
+    previous_quarters = np.where(quarters == 0, 0, np.where(quarters > 1, quarters - 1, 4))
+    keys = pd.Index(years * 10 + quarters)
+    return keys.get_indexer(previous_years * 10 + previous_quarters)
+
+
+# ==============================================================================
+# ENGINE - TÍNH TẤT CẢ CHỈ SỐ TRONG MỘT LƯỢT VECTOR HÓA
+# ==============================================================================
+def _coefficients(terms: list[dict[str, float] | None], accounts: list[str]) -> np.ndarray:
+    """Account x ratio coefficient matrix of one side (numerator or denominator)."""
+    matrix = np.zeros((len(accounts), len(terms)))
+    positions = {account: i for i, account in enumerate(accounts)}
+    for j, term in enumerate(terms):
+        for account, coefficient in (term or {}).items():
+            matrix[positions[account], j] = coefficient
+    return matrix
+
+def compute_ratios(values: np.ndarray, periods: pd.DataFrame, accounts: list[str],
+                   ratios: dict[str, Ratio] = RATIOS) -> np.ndarray:
+    """
+    Computes every ratio for every company and period at once: both sides
+    of all ratios are two matrix products of the pivoted array with
+    coefficient matrices, followed by element-wise averaging, growth and
+    division. Division by zero gives NaN.
+
+    Args:
+        values (np.ndarray): Companies x periods x accounts values, NaN where not reported.
+        periods (pd.DataFrame): report_date and quarter of the period axis.
+        accounts (list[str]): Account codes of the account axis.
+        ratios (dict[str, Ratio]): The ratios to compute.
+
+    Returns:
+        np.ndarray: float64 array of shape (companies, periods, ratios), in the order of `ratios`.
+    """
+    specs = list(ratios.values())
+    numerator = _coefficients([ratio.numerator for ratio in specs], accounts)
+    denominator = _coefficients([ratio.denominator for ratio in specs], accounts)
+    has_denominator = np.array([ratio.denominator is not None for ratio in specs])
+    average = np.array([ratio.average_denominator for ratio in specs])
+    growth = np.array([ratio.growth for ratio in specs])
+
+    reported = ~np.isnan(values)
+    values = np.where(reported, values, 0.0)
+    counts = reported.astype(float)
+    num = values @ numerator
+    den = values @ denominator
+    # Một vế không có chỉ tiêu nào được báo cáo thì để trống thay vì coi là 0
+    num[(counts @ (numerator != 0)) == 0] = np.nan
+    den[(counts @ (denominator != 0)) == 0] = np.nan
+    den[:, :, ~has_denominator] = 1.0
+
+    previous = previous_period_index(periods)
+    has_previous = previous >= 0
+    num_previous = np.where(has_previous[None, :, None], num[:, previous, :], np.nan)
+    den_previous = np.where(has_previous[None, :, None], den[:, previous, :], np.nan)
+    # Thiếu kỳ trước thì mẫu số bình quân dùng số cuối kỳ
+    den = np.where(average & ~np.isnan(den_previous), (den + den_previous) / 2, den)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(growth, num / np.abs(num_previous) - 1, num / den)
+    result[~np.isfinite(result)] = np.nan
+    return result
+
+def build_ratio_table(cube: StatementCube, ratios: dict[str, Ratio] = RATIOS) -> pd.DataFrame:
+    """
+    Computes the ratio library over a statement cube (see statement_cube),
+    one row per (company, period) with any account used by the ratios.
+    An account code reported more than once in a period is taken from the
+    first report type in REPORT_TYPE_PRIORITY that has it (e.g.
+    'profit_before_tax' from the income statement, not the cash flow
+    statement), then from its first position in that statement (e.g.
+    'inventories' from the section total, not its first line).
+
+    Returns:
+        pd.DataFrame: ID_COLUMNS followed by one column per ratio.
+    """
+    accounts = ratio_accounts(ratios)
+    values = cube.first_reported(accounts, REPORT_TYPE_PRIORITY)
+    result = compute_ratios(values, cube.periods, accounts, ratios)
+    n_companies, n_periods = result.shape[:2]
+    company_index, period_index = np.nonzero(~np.isnan(values).all(axis=2))
+
+    table = pd.concat([
+        cube.companies.iloc[company_index].reset_index(drop=True),
+        cube.periods.iloc[period_index].reset_index(drop=True),
+    ], axis=1)
+    ratio_values = result[company_index, period_index, :]
+    for j, name in enumerate(ratios):
+        table[name] = ratio_values[:, j]
+    logging.info(f"Computed {len(ratios)} ratios for {n_companies} companies x {n_periods} periods "
+                 f"({len(table):,} company-periods).")
+    return table[ID_COLUMNS + list(ratios)]
+
+
+# ==============================================================================
+# STORAGE
+# ==============================================================================
+def write_ratios(table: pd.DataFrame, path: str, ratios: dict[str, Ratio] = RATIOS) -> None:
+    """
+    Writes the ratio table with ratio_schema, sorted by company and period.
+    Units and descriptions of the ratios are kept in the file metadata (see read_ratio_metadata).
+    """
+    table = table.sort_values(['company_code', 'report_date', 'quarter'], kind='stable')
+    schema = ratio_schema(ratios)
+    metadata = {name: {'unit': ratio.unit, 'description': ratio.description} for name, ratio in ratios.items()}
+    schema = schema.with_metadata({RATIO_METADATA_KEY: json.dumps(metadata).encode('utf-8')})
+    arrow_table = pa.Table.from_pandas(table, preserve_index=False).select(schema.names).cast(schema)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    pq.write_table(arrow_table, path, compression=COMPRESSION)
+
+def read_ratios(path: str) -> pd.DataFrame:
+    """Reads a ratios file: categorical company columns, int16/int8 period columns and float64 ratios."""
+    return pd.read_parquet(path)
+
+def read_ratio_metadata(path: str) -> dict[str, dict]:
+    """Returns {ratio: {'unit', 'description'}} stored in a ratios file."""
+    metadata = pq.read_schema(path).metadata or {}
+    return json.loads(metadata.get(RATIO_METADATA_KEY, b'{}'))
+
+def load_cube(source: str) -> StatementCube:
+    """Opens a cube directory written by statement_cube, or builds the cube from a statement file or dataset."""
+    if os.path.exists(os.path.join(source, META_FILENAME)):
+        return read_cube(source)
+    return build_cube(load_statements(source))
+
+
+# ==============================================================================
+# MAIN EXECUTION
+# ==============================================================================
+def main():
+    """Computes the ratio library over a statement file and writes the ratios parquet."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Compute financial ratios over long-format financial statements.")
+    parser.add_argument('--input', default='../apps/data/Financial_Statement__Full_Company_L10Y.parquet',
+                        help="Statement cube directory (see statement_cube.py), statement parquet file "
+                             "or partitioned dataset directory.")
+    parser.add_argument('--output', default='../apps/data/financial_ratios.parquet', help="Ratios parquet file.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    cube = load_cube(args.input)
+    loaded = time.perf_counter()
+    table = build_ratio_table(cube)
+    computed = time.perf_counter()
+    write_ratios(table, args.output)
+    logging.info(f"Saved {len(table):,} rows to {args.output} (read {loaded - started:.2f}s, "
+                 f"compute {computed - loaded:.2f}s, write {time.perf_counter() - computed:.2f}s).")
+
+if __name__ == "__main__":
+    main()
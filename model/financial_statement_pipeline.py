@@ -1,40 +1,205 @@
 import os
+import re
+import time
 import logging
 import datetime
 import json
 import argparse
+import asyncio
+import importlib
+import threading
+import numpy as np
 import pandas as pd
-from vnstock import Listing
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+from vnstock import Listing, Finance
+import cafef_parser
+from page_cache import PageCache
+from rate_limiter import AdaptiveRateLimiter, backoff_delay
+from scrape_manifest import ScrapeManifest, DeadLetterLog
+from statement_schema import SORT_COLUMNS, apply_schema, read_statements, write_statements
+from statement_dataset import check_partitioning, write_dataset, upsert_dataset, upsert_rows
+from statement_cube import build_cube, write_cube
+from collections.abc import Callable
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from tqdm import tqdm
 
+try:
+    import aiohttp
+except ImportError:  # aiohttp chỉ cần cho --engine async
+    aiohttp = None
+
 # ==============================================================================
 # CONFIGURATION - THAY ĐỔI CÁC THAM SỐ TẠI ĐÂY
 # ==============================================================================
 CONFIG = {
     "start_year": 2015,
     "end_year": 2024,
-    "max_workers": 12,  # Số luồng chạy song song
+    "max_workers": 12,  # Số luồng chạy song song (số request thực tế do rate limiter điều chỉnh)
+    "page_window": 4,  # Số kỳ (năm hoặc quý) hiển thị trên một trang báo cáo CafeF
+    "request_timeout": 30,  # Timeout (giây) cho mỗi request HTTP
+    "async_max_concurrency": 64,  # Số request đồng thời tối đa (--engine async)
+    "async_per_host_limit": 16,  # Số kết nối tối đa tới một host (--engine async)
+    "parse_workers": 4,  # Số tiến trình parse HTML (--engine async)
+    "max_retries": 4,  # Số lần thử lại khi gặp lỗi tạm thời (timeout, 429, 5xx)
+    "backoff_base": 1.0,  # Thời gian chờ cơ sở (giây) cho exponential backoff
+    "backoff_cap": 30.0,  # Thời gian chờ tối đa (giây) giữa hai lần thử
+    "rate_limit": {  # Token bucket + AIMD: tự tăng tốc khi server ổn định, giảm khi chậm/lỗi
+        "rate": 8.0,
+        "min_rate": 0.5,
+        "max_rate": 50.0,
+        "concurrency": 12,
+        "max_concurrency": 64,
+        "target_latency": 3.0,
+        "max_error_rate": 0.1,
+    },
+    "vnstock": {  # Nguồn API có cấu trúc (--source vnstock): mỗi công ty chỉ cần 3 lời gọi thay vì cào nhiều trang HTML
+        "source": "VCI",  # Nguồn dữ liệu của vnstock.Finance (VCI: CTCK Vietcap)
+        "max_workers": 8,  # Số công ty được tải song song
+        "rate_limit": {  # Giới hạn riêng cho nguồn này, độc lập với CafeF
+            "rate": 4.0,
+            "min_rate": 0.5,
+            "max_rate": 20.0,
+            "concurrency": 8,
+            "max_concurrency": 16,
+            "target_latency": 3.0,
+            "max_error_rate": 0.1,
+        },
+    },
     "output_dir": "output_data",
+    "cache_dir": "output_data/page_cache",  # Cache HTML thô của các trang đã tải
+    "cache_ttl_hours": 24,  # Thời gian sống cache cho các kỳ chưa chốt số liệu
+    "closed_after_months": 4,  # Số tháng sau khi kết thúc năm tài chính thì coi như đã chốt số liệu
+    "quarter_closed_after_months": 2,  # Như trên, cho báo cáo quý (hạn công bố BCTC quý là 20-45 ngày)
     "company_list_filename": "company_list.csv",
+    "shard_dir": "output_data/shards",  # Mỗi công ty đã cào xong được ghi ra một shard parquet
+    "manifest_filename": "scrape_manifest.jsonl",
+    "dead_letter_filename": "dead_letter.jsonl",  # Các trang lỗi vĩnh viễn, chạy lại bằng --retry-failed
     "raw_data_filename": "raw_financials_suffix.parquet",
     "final_data_filename": "final_financial_statements_suffix.parquet",
     "final_data_filename_csv": "final_financial_statements_suffix.csv",
-    "mapping_filepath": "account_mapping.json"
+    "dataset_dir": "output_data/financial_statements",  # Bộ dữ liệu phân vùng report_type/report_date[/exchange]
+    "cube_dirname": "statement_cube_suffix",  # Mảng dày công ty x kỳ x chỉ tiêu (memory-map), xem statement_cube.py
+    "mapping_filepath": "account_mapping.json",
+    "unmapped_filename": "unmapped_accounts_suffix.csv",  # Các chỉ tiêu chưa có trong account_mapping.json
+}
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
 }
-financial_statement_schemas = ['company_code', 'exchange', 'company_name', 'industry', 'report_type', 'report_date', 'account', 'value', 'account_vi', 'account_en']
+GRANULARITIES = ['annual', 'quarterly']
+SOURCES = ['cafef', 'vnstock']
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+THROTTLE_STATUS = {429, 503}
+
+# ==============================================================================
+# HTTP SESSION - CONNECTION POOL DÙNG CHUNG CHO TẤT CẢ CÁC LUỒNG
+# ==============================================================================
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def build_http_session(pool_size: int) -> requests.Session:
+    """
+    Builds a keep-alive session whose connection pool holds `pool_size`
+    connections per host, so every worker thread can reuse an open socket.
+    """
+    session = requests.Session()
+    session.headers.update(HTTP_HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_http_session() -> requests.Session:
+    """Returns the process-wide session, creating it on first use."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = build_http_session(CONFIG['max_workers'])
+        return _http_session
+
+_rate_limiters = {}
+
+def get_rate_limiter(source: str = 'cafef') -> AdaptiveRateLimiter:
+    """
+    Returns the process-wide rate limiter of a data source, shared by both
+    engines. Each source is paced independently with its own CONFIG limits.
+    """
+    with _http_session_lock:
+        if source not in _rate_limiters:
+            limits = CONFIG['rate_limit'] if source == 'cafef' else CONFIG[source]['rate_limit']
+            _rate_limiters[source] = AdaptiveRateLimiter(**limits)
+        return _rate_limiters[source]
+
+def is_retryable(status: int | None) -> bool:
+    """Network errors (no status), throttling and 5xx responses are worth retrying."""
+    return status is None or status in RETRYABLE_STATUS
+
+# ==============================================================================
+# KỲ BÁO CÁO (PERIOD MODEL)
+# ==============================================================================
+class Period(NamedTuple):
+    """A reporting period: a fiscal year and a quarter, 0 for the full year."""
+    year: int
+    quarter: int = 0
+
+_QUARTER_LABEL_RE = re.compile(r'(?:Q|Quý)\s*([1-4])\D*?(\d{4})', re.IGNORECASE)
+
+def parse_period_label(label: str, granularity: str) -> Period | None:
+    """
+    Reads the period of a CafeF header cell, e.g. '2024' for an annual page
+    or 'Quý 1-2024' / 'Q1/2024' for a quarterly one. None if unreadable.
+    """
+    if granularity == 'quarterly':
+        match = _QUARTER_LABEL_RE.search(label)
+        return Period(int(match.group(2)), int(match.group(1))) if match else None
+    match = re.search(r'\d{4}', label)
+    return Period(int(match.group())) if match else None
+
+def page_periods(page_year: int, granularity: str) -> list[Period]:
+    """
+    The periods a page is assumed to show when its header cannot be read:
+    the last `page_window` periods up to the end of page_year, oldest first.
+    """
+    window = CONFIG['page_window']
+    if granularity == 'quarterly':
+        last = page_year * 4 + 3  # Q4 của page_year, đánh số quý liên tục
+        return [Period(index // 4, index % 4 + 1) for index in range(last - window + 1, last + 1)]
+    return [Period(year) for year in range(page_year - window + 1, page_year + 1)]
+
+def stamp_fetch_time(table: pd.DataFrame | None, fetched_at: float) -> pd.DataFrame | None:
+    """
+    Adds the time a page was fetched (epoch seconds) as the scraped_at of
+    its rows. Pages served from the cache keep the time of the original
+    download, so a rebuild from old pages does not look newer than it is.
+    """
+    if table is None:
+        return None
+    return table.assign(scraped_at=pd.Timestamp(fetched_at, unit='s', tz='UTC').floor('ms'))
 
 # ==============================================================================
 # LOGIC SCRAPING (CLASS) - PHIÊN BẢN CẬP NHẬT
 # ==============================================================================
 class CafeFScraper:
     """Scrapes financial statements for a single company from cafef.vn."""
-    BASE_URL = "https://s.cafef.vn/bao-cao-tai-chinh/{}/{}/{}/0/0/0/0/bao-cao-tai-chinh-.chn"
+    # Trang năm hiển thị page_window năm; trang quý (biến thể /4/5/0/) hiển thị page_window quý
+    BASE_URLS = {
+        'annual': "https://s.cafef.vn/bao-cao-tai-chinh/{}/{}/{}/0/0/0/0/bao-cao-tai-chinh-.chn",
+        'quarterly': "https://s.cafef.vn/bao-cao-tai-chinh/{}/{}/{}/4/5/0/bao-cao-tai-chinh-.chn",
+    }
     # CHANGED: Added 'cashflowdirect' for completeness
     ALL_REPORT_TYPES = ['bsheet', 'incsta', 'cashflow', 'cashflowdirect']
+    REPORT_NAMES = {'bsheet': 'Balance Sheet',
+                    'incsta': 'Income Statement',
+                    'cashflow': 'Cash Flow Statement',
+                    'cashflowdirect': 'Direct Cash Flow Statement'
+                   }
 
     # CHANGED: __init__ now accepts a list of report types
-    def __init__(self, symbol: str, start_year: int, report_types: list[str]):
+    def __init__(self, symbol: str, start_year: int, report_types: list[str], base_url: str | None = None,
+                 cache: PageCache | None = None, offline: bool = False, granularity: str = 'annual'):
         """
         Initializes the scraper.
 
@@ -43,76 +208,545 @@ class CafeFScraper:
             start_year (int): The starting year for scraping data.
             report_types (list[str]): A list of report types to scrape
                                      (e.g., ['bsheet', 'incsta']).
+            base_url (str | None): Overrides the URL template of BASE_URLS, e.g.
+                                   to point the scraper at a local stub server.
+            cache (PageCache | None): Page cache to read from and write to.
+            offline (bool): Serve pages from the cache only, never the network.
+            granularity (str): 'annual' or 'quarterly' reports.
         """
         self.symbol = symbol.upper()
         self.start_year = start_year
         self.end_year = datetime.datetime.now().year
         # CHANGED: The list of reports to scrape is now passed directly
         self.report_types_to_scrape = report_types
+        self.granularity = granularity
+        self.base_url = base_url or self.BASE_URLS[granularity]
+        self.cache = cache
+        self.offline = offline
+        self.failed_pages = []  # Các trang tải lỗi vĩnh viễn, được ghi vào dead-letter log
+
+    def build_url(self, report_type: str, year: int) -> str:
+        """Returns the CafeF page URL of one report type and year."""
+        return self.base_url.format(self.symbol, report_type, year)
+
+    def plan_fetches(self) -> list[tuple[str, int]]:
+        """
+        Lists the (report_type, page_year) pages needed for this company.
+        Each page shows the `page_window` periods up to page_year (years, or
+        the quarters of one year), so the plan steps back from end_year by the
+        years a page covers until start_year is covered.
+        """
+        years_per_page = max(1, CONFIG['page_window'] // (4 if self.granularity == 'quarterly' else 1))
+        page_years = sorted(range(self.end_year, self.start_year - 1, -years_per_page))
+        return [
+            (report_type, year)
+            for report_type in self.report_types_to_scrape
+            for year in page_years
+        ]
+
+    def read_cached_page(self, report_type: str, year: int) -> tuple[str, float] | None:
+        """
+        Returns the cached page and the time it was fetched if it is still
+        valid. Pages whose last period is closed never expire; newer ones
+        expire after CONFIG['cache_ttl_hours']. Offline runs accept any cached page.
+        """
+        if self.cache is None:
+            return None
+        max_age = None
+        if not self.offline and not is_period_closed(year, quarter=4 if self.granularity == 'quarterly' else 0):
+            max_age = CONFIG['cache_ttl_hours'] * 3600
+        return self.cache.get_entry(self.symbol, report_type, year, self.base_url, max_age=max_age)
+
+    def write_cached_page(self, report_type: str, year: int, html: str) -> None:
+        """Stores a successfully parsed page in the cache."""
+        if self.cache is not None:
+            self.cache.put(self.symbol, report_type, year, self.base_url, html)
+
+    def record_failure(self, report_type: str, year: int, url: str, status: int | None, error) -> None:
+        """
+        Remembers a page that could not be downloaded. A 404 only means the
+        page does not exist, so it is not treated as a failure.
+        """
+        if status == 404:
+            logging.debug(f"Page not found: {url}")
+            return
+        logging.warning(f"Giving up on {url} (status={status}). Error: {error}")
+        self.failed_pages.append({
+            'symbol': self.symbol,
+            'report_type': report_type,
+            'year': year,
+            'url': url,
+            'status': status,
+            'error': str(error),
+            'failed_at': time.time(),
+        })
+
+    def _download_page(self, report_type: str, year: int) -> str | None:
+        """
+        Downloads the raw HTML of a report page through the shared session,
+        paced by the shared rate limiter. Transient failures are retried with
+        jittered exponential backoff; a page that still fails is recorded in
+        failed_pages. Returns the decoded page, or None if the request fails.
+        """
+        url = self.build_url(report_type, year)
+        limiter = get_rate_limiter()
+        error, status = None, None
+        for attempt in range(CONFIG['max_retries'] + 1):
+            if attempt:
+                time.sleep(backoff_delay(attempt - 1, CONFIG['backoff_base'], CONFIG['backoff_cap']))
+            limiter.acquire()
+            started, status = time.monotonic(), None
+            try:
+                response = get_http_session().get(url, timeout=CONFIG['request_timeout'])
+                status = response.status_code
+                response.raise_for_status()
+            except requests.RequestException as e:
+                error = e
+                # 404 (trang không tồn tại) không phải lỗi của server: chỉ lỗi mạng, 429 và 5xx mới làm giảm tốc
+                limiter.release(time.monotonic() - started, ok=not is_retryable(status),
+                                throttled=status in THROTTLE_STATUS)
+                logging.debug(f"Attempt {attempt + 1} failed for {url}. Error: {e}")
+                if not is_retryable(status):
+                    break
+                continue
+            limiter.release(time.monotonic() - started, ok=True)
+            # CafeF trả về UTF-8; tránh requests tự đoán ISO-8859-1 khi header thiếu charset
+            if 'charset' not in response.headers.get('Content-Type', '').lower():
+                response.encoding = 'utf-8'
+            return response.text
+        self.record_failure(report_type, year, url, status, error)
+        return None
+
+    @staticmethod
+    def parse_report_table(html: str, page_year: int, granularity: str = 'annual') -> pd.DataFrame | None:
+        """
+        Extracts the financial report table from a downloaded page, in long
+        format: one row per (account, period) with the columns account,
+        account_seq (occurrence of the label on the page), row_order,
+        report_date (year), quarter and value.
+
+        Periods are read from the page header; if it cannot be read, the
+        window ending at page_year is assumed (see page_periods).
+        """
+        window = CONFIG['page_window']
+        parsed = cafef_parser.parse_report_table(html, window)
+        if parsed is None:
+            return None
+        labels, table = parsed
+        periods = [parse_period_label(label, granularity) for label in labels]
+        if len(periods) != window or not all(periods):
+            periods = page_periods(page_year, granularity)
+
+        # account_seq phân biệt các chỉ tiêu trùng tên trong cùng một bảng
+        n_rows = len(table)
+        values = table.drop(columns='account').to_numpy()
+        return pd.DataFrame({
+            'account': np.tile(table['account'].to_numpy(), window),
+            'account_seq': np.tile(table.groupby('account', dropna=False).cumcount().to_numpy(), window),
+            'row_order': np.tile(np.arange(n_rows), window),
+            'report_date': np.repeat([period.year for period in periods], n_rows),
+            'quarter': np.repeat([period.quarter for period in periods], n_rows),
+            'value': values.T.reshape(-1),
+        })
 
     def _fetch_report_table(self, report_type: str, year: int) -> pd.DataFrame | None:
         """
         Fetches the entire financial report table for a given year.
         Returns the specific DataFrame table, or None if it fails.
         """
-        url = self.BASE_URL.format(self.symbol, report_type, year)
+        url = self.build_url(report_type, year)
+        cached = self.read_cached_page(report_type, year)
+        from_cache = cached is not None
+        html, fetched_at = cached if from_cache else (None, time.time())
+        if not from_cache and not self.offline:
+            html = self._download_page(report_type, year)
+        if html is None:
+            return None
         try:
-            web_data = pd.read_html(url)
-            table = web_data[4]
-            if table.shape[0] > 1 and table.shape[1] > 1:
-                return table
-            return table
+            table = self.parse_report_table(html, year, self.granularity)
         except Exception as e:
-            logging.debug(f"Could not fetch or parse table from {url}. Error: {e}")
+            logging.debug(f"Could not parse table from {url}. Error: {e}")
             return None
+        if not from_cache:
+            self.write_cached_page(report_type, year, html)
+        return stamp_fetch_time(table, fetched_at)
+
+    def assemble_reports(self, tables: dict[tuple[str, int], pd.DataFrame]) -> pd.DataFrame | None:
+        """
+        Combines the parsed page tables (see parse_report_table) stamped with
+        their fetch time (see stamp_fetch_time), keyed by (report_type,
+        page_year), into one long-format DataFrame for the company.
+
+        Overlapping windows are de-duplicated per (account, period); the figure
+        from the latest page wins, since it carries any restatement.
+        """
+        company_reports = []
+        for report_type in self.report_types_to_scrape:
+            pages = [table for (rt, year), table in sorted(tables.items(), key=lambda item: item[0][1])
+                     if rt == report_type]
+            if not pages:
+                logging.debug(f"No data found for {self.symbol} - {report_type} in any year.")
+                continue
+
+            df_long = pd.concat(pages, ignore_index=True)
+            df_long = df_long[df_long['report_date'].between(self.start_year, self.end_year)]
+            df_long = df_long.drop_duplicates(subset=['account', 'account_seq', 'report_date', 'quarter'], keep='last')
+            df_long = df_long.sort_values(by=['report_date', 'quarter', 'row_order'], kind='stable')
+            df_long = df_long[['account', 'report_date', 'quarter', 'value', 'scraped_at']].reset_index(drop=True)
+            df_long['report_type'] = self.REPORT_NAMES.get(report_type)
+            company_reports.append(df_long)
+
+        if not company_reports:
+            return None
+
+        final_df = pd.concat(company_reports, ignore_index=True)
+        final_df['symbol'] = self.symbol
+        return final_df
 
     def scrape_all_reports(self) -> pd.DataFrame | None:
         """
         Scrapes financial reports for the company based on the list of report
         types provided during initialization.
         """
+        tables = {}
+        for report_type, year in self.plan_fetches():
+            table = self._fetch_report_table(report_type, year)
+            if table is not None:
+                tables[(report_type, year)] = table
+        return self.assemble_reports(tables)
+
+# ==============================================================================
+# ASYNC ENGINE - MỖI TRANG BÁO CÁO LÀ MỘT COROUTINE
+# ==============================================================================
+def decode_page(body: bytes, charset: str | None) -> str:
+    """
+    Decodes a downloaded page like requests' Response.text: with the declared
+    charset (UTF-8 if none or unknown), replacing bytes that do not decode.
+    """
+    try:
+        return body.decode(charset or 'utf-8', errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+async def _fetch_page_async(session, limit: asyncio.Semaphore, scraper: CafeFScraper,
+                            report_type: str, year: int) -> str | None:
+    """
+    Downloads one page, holding a slot of the global concurrency limit and
+    pacing through the shared rate limiter, with the same retry policy as
+    CafeFScraper._download_page.
+    """
+    url = scraper.build_url(report_type, year)
+    limiter = get_rate_limiter()
+    error, status = None, None
+    for attempt in range(CONFIG['max_retries'] + 1):
+        if attempt:
+            await asyncio.sleep(backoff_delay(attempt - 1, CONFIG['backoff_base'], CONFIG['backoff_cap']))
+        async with limit:
+            await limiter.acquire_async()
+            started, status, throttled = time.monotonic(), None, False
+            try:
+                async with session.get(url) as response:
+                    status = response.status
+                    response.raise_for_status()
+                    body = await response.read()
+                return decode_page(body, response.charset)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error, throttled = e, status in THROTTLE_STATUS
+                logging.debug(f"Attempt {attempt + 1} failed for {url}. Error: {e!r}")
+                if not is_retryable(status):
+                    break
+            except Exception as e:
+                # Lỗi ngoài dự kiến chỉ làm hỏng trang này (ghi vào dead-letter log), không dừng cả lượt cào
+                error = e
+                logging.warning(f"Unexpected error for {url}: {e!r}")
+                break
+            finally:
+                # 404 (trang không tồn tại) không phải lỗi của server: chỉ lỗi mạng, 429 và 5xx mới làm giảm tốc
+                limiter.release(time.monotonic() - started, ok=error is None or not is_retryable(status),
+                                throttled=throttled)
+    scraper.record_failure(report_type, year, url, status, error)
+    return None
+
+async def _scrape_page_async(session, limit: asyncio.Semaphore, parse_pool: ProcessPoolExecutor,
+                             scraper: CafeFScraper, report_type: str, year: int) -> tuple[str, int, pd.DataFrame | None]:
+    """Fetches one (report_type, year) page and parses it off the event loop."""
+    url = scraper.build_url(report_type, year)
+    cached = await asyncio.to_thread(scraper.read_cached_page, report_type, year)
+    from_cache = cached is not None
+    html, fetched_at = cached if from_cache else (None, time.time())
+    if not from_cache:
+        html = await _fetch_page_async(session, limit, scraper, report_type, year)
+    if html is None:
+        return report_type, year, None
+    try:
+        loop = asyncio.get_running_loop()
+        table = await loop.run_in_executor(parse_pool, CafeFScraper.parse_report_table, html, year, scraper.granularity)
+    except Exception as e:
+        logging.debug(f"Could not parse table from {url}. Error: {e}")
+        return report_type, year, None
+    if not from_cache:
+        await asyncio.to_thread(scraper.write_cached_page, report_type, year, html)
+    return report_type, year, stamp_fetch_time(table, fetched_at)
+
+async def _scrape_company_async(session, limit: asyncio.Semaphore, parse_pool: ProcessPoolExecutor,
+                                scraper: CafeFScraper) -> tuple[CafeFScraper, pd.DataFrame | None]:
+    """Schedules every page of one company concurrently and assembles the result."""
+    pages = await asyncio.gather(*[
+        _scrape_page_async(session, limit, parse_pool, scraper, report_type, year)
+        for report_type, year in scraper.plan_fetches()
+    ])
+    tables = {(report_type, year): table for report_type, year, table in pages if table is not None}
+    return scraper, scraper.assemble_reports(tables)
+
+async def _scrape_all_async(scrapers: list[CafeFScraper], on_result: Callable, max_concurrency: int,
+                            per_host_limit: int, parse_workers: int) -> None:
+    limit = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=per_host_limit)
+    timeout = aiohttp.ClientTimeout(total=CONFIG['request_timeout'])
+    with ProcessPoolExecutor(max_workers=parse_workers) as parse_pool:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HTTP_HEADERS) as session:
+            tasks = [_scrape_company_async(session, limit, parse_pool, scraper) for scraper in scrapers]
+            progress = tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Scraping Financials (Async)")
+            for task in progress:
+                scraper, result_df = await task
+                on_result(scraper, result_df)
+
+def scrape_all_async(scrapers: list[CafeFScraper], on_result: Callable[[CafeFScraper, pd.DataFrame | None], None],
+                     max_concurrency: int | None = None, per_host_limit: int | None = None,
+                     parse_workers: int | None = None) -> None:
+    """
+    Scrapes all companies with asyncio: every (symbol, report_type, year) page
+    is its own coroutine, bounded by a global and a per-host connection limit,
+    while HTML parsing runs in a small process pool.
+
+    Args:
+        scrapers (list[CafeFScraper]): One configured scraper per company.
+        on_result (Callable): Called with (scraper, result_df) as soon as a
+                              company finishes; result_df is None if empty.
+        max_concurrency (int | None): Max requests in flight overall.
+        per_host_limit (int | None): Max open connections to a single host.
+        parse_workers (int | None): Number of processes parsing HTML.
+    """
+    if aiohttp is None:
+        raise RuntimeError("The async engine requires aiohttp: pip install aiohttp")
+    asyncio.run(_scrape_all_async(
+        scrapers,
+        on_result,
+        max_concurrency or CONFIG['async_max_concurrency'],
+        per_host_limit or CONFIG['async_per_host_limit'],
+        parse_workers or CONFIG['parse_workers'],
+    ))
+
+# ==============================================================================
+# VNSTOCK BACKEND - API BCTC CÓ CẤU TRÚC (vnstock.Finance)
+# ==============================================================================
+# vnstock (VCI) trả về mỗi loại báo cáo của một công ty trong một lời gọi, cho mọi kỳ,
+# nên không cần tải/parse HTML. Hai định dạng trả về được hỗ trợ: mỗi dòng một kỳ
+# (cột 'Năm'/'Kỳ' hoặc yearReport/lengthReport, mỗi chỉ tiêu một cột - như notebook
+# BCTC_API_quarterly) và mỗi dòng một chỉ tiêu (cột 'item', mỗi kỳ một cột '2024' / '2024-Q1').
+VNSTOCK_ID_COLUMNS = {'CP', 'Năm', 'Kỳ', 'ticker', 'yearReport', 'lengthReport'}
+_VNSTOCK_PERIOD_RE = re.compile(r'^(\d{4})(?:-Q([1-4]))?$')
+
+def melt_vnstock_report(report: pd.DataFrame, granularity: str) -> pd.DataFrame | None:
+    """
+    Reshapes one vnstock statement into the long format of
+    CafeFScraper.parse_report_table: one row per (account, period) with the
+    columns account, row_order, report_date (year), quarter and value.
+    Periods of the other granularity (e.g. full years in a quarterly
+    report) are dropped.
+    """
+    if 'item' in report.columns:
+        period_columns = [column for column in report.columns if _VNSTOCK_PERIOD_RE.match(str(column))]
+        matches = [_VNSTOCK_PERIOD_RE.match(str(column)) for column in period_columns]
+        accounts = report['item'].to_numpy()
+        years = np.array([int(match.group(1)) for match in matches], dtype=int)
+        quarters = np.array([int(match.group(2) or 0) for match in matches], dtype=int)
+        values = report[period_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float).T
+    else:
+        year_column = 'Năm' if 'Năm' in report.columns else 'yearReport'
+        quarter_column = 'Kỳ' if 'Kỳ' in report.columns else 'lengthReport'
+        if year_column not in report.columns:
+            return None
+        account_columns = [column for column in report.columns if column not in VNSTOCK_ID_COLUMNS]
+        accounts = np.array(account_columns, dtype=object)
+        years = pd.to_numeric(report[year_column], errors='coerce').fillna(0).to_numpy(dtype=int)
+        quarters = pd.to_numeric(report[quarter_column], errors='coerce').fillna(0).to_numpy(dtype=int) \
+            if quarter_column in report.columns else np.zeros(len(report), dtype=int)
+        values = report[account_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    # VCI đánh số kỳ 1-4 cho quý và 5 cho cả năm
+    quarters = np.where((quarters >= 1) & (quarters <= 4), quarters, 0)
+    keep = (quarters > 0) if granularity == 'quarterly' else (quarters == 0)
+    keep &= years > 0
+    years, quarters, values = years[keep], quarters[keep], values[keep]
+    if not len(years) or not len(accounts):
+        return None
+
+    # values: mỗi dòng một kỳ, mỗi cột một chỉ tiêu -> dạng dài theo thứ tự (kỳ, chỉ tiêu)
+    n_accounts = len(accounts)
+    return pd.DataFrame({
+        'account': np.tile(accounts, len(years)),
+        'row_order': np.tile(np.arange(n_accounts), len(years)),
+        'report_date': np.repeat(years, n_accounts),
+        'quarter': np.repeat(quarters, n_accounts),
+        'value': values.reshape(-1),
+    })
+
+def default_finance_client(symbol: str):
+    """Creates the vnstock Finance client of one company (CONFIG['vnstock']['source'])."""
+    return Finance(symbol=symbol, source=CONFIG['vnstock']['source'])
+
+class VnstockFinanceFetcher:
+    """
+    Fetches financial statements for a single company from the vnstock
+    Finance API. A drop-in replacement for CafeFScraper in the pipeline
+    (same scrape_all_reports output, shards and manifest), paced by its own
+    rate limiter (get_rate_limiter('vnstock')).
+    """
+    SOURCE = 'vnstock'
+    # Loại báo cáo -> phương thức của vnstock.Finance; API không có lưu chuyển tiền tệ trực tiếp
+    STATEMENT_METHODS = {'bsheet': 'balance_sheet', 'incsta': 'income_statement', 'cashflow': 'cash_flow'}
+    REPORT_NAMES = CafeFScraper.REPORT_NAMES
+
+    def __init__(self, symbol: str, start_year: int, report_types: list[str], granularity: str = 'annual',
+                 client_factory: Callable[[str], object] | None = None):
+        """
+        Initializes the fetcher.
+
+        Args:
+            symbol (str): The company stock symbol.
+            start_year (int): The starting year for fetching data.
+            report_types (list[str]): Report types to fetch, keys of STATEMENT_METHODS.
+            granularity (str): 'annual' or 'quarterly' reports.
+            client_factory (Callable | None): Builds the Finance client of a symbol;
+                defaults to default_finance_client. Inject a stub to run offline.
+        """
+        self.symbol = symbol.upper()
+        self.start_year = start_year
+        self.end_year = datetime.datetime.now().year
+        self.report_types_to_scrape = [rt for rt in report_types if rt in self.STATEMENT_METHODS]
+        self.granularity = granularity
+        self.client_factory = client_factory or default_finance_client
+        self.failed_pages = []  # Các lời gọi lỗi vĩnh viễn, được ghi vào dead-letter log
+
+    def record_failure(self, report_type: str, call: str, error) -> None:
+        """Remembers an API call that kept failing, in the dead-letter format of CafeFScraper."""
+        logging.warning(f"Giving up on {self.SOURCE} {call} for {self.symbol}. Error: {error}")
+        self.failed_pages.append({
+            'symbol': self.symbol,
+            'report_type': report_type,
+            'year': None,
+            'url': f"{self.SOURCE}:{call}",
+            'status': None,
+            'error': str(error),
+            'failed_at': time.time(),
+        })
+
+    def _call(self, call: str, func: Callable, *args, **kwargs):
+        """
+        Runs one API call paced by the source's rate limiter, retrying with
+        jittered exponential backoff. Returns the result, or raises the last
+        error. A ValueError (unknown symbol, not a stock) is not retried.
+        """
+        limiter = get_rate_limiter(self.SOURCE)
+        for attempt in range(CONFIG['max_retries'] + 1):
+            if attempt:
+                time.sleep(backoff_delay(attempt - 1, CONFIG['backoff_base'], CONFIG['backoff_cap']))
+            limiter.acquire()
+            started = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                limiter.release(time.monotonic() - started, ok=False)
+                logging.debug(f"Attempt {attempt + 1} failed for {self.SOURCE} {call} of {self.symbol}. Error: {e!r}")
+                if isinstance(e, ValueError) or attempt == CONFIG['max_retries']:
+                    raise
+                continue
+            limiter.release(time.monotonic() - started, ok=True)
+            return result
+
+    def scrape_all_reports(self) -> pd.DataFrame | None:
+        """
+        Fetches every requested statement of the company with one client and
+        returns them in the long format of CafeFScraper.scrape_all_reports.
+        """
+        try:
+            client = self._call('Finance', self.client_factory, self.symbol)
+        except Exception as e:
+            for report_type in self.report_types_to_scrape:
+                self.record_failure(report_type, 'Finance', e)
+            return None
+
+        period = 'quarter' if self.granularity == 'quarterly' else 'year'
         company_reports = []
-        report_map = {'bsheet': 'Balance Sheet',
-                      'incsta': 'Income Statement',
-                      'cashflow': 'Cash Flow Statement',
-                      'cashflowdirect': 'Direct Cash Flow Statement'
-                     }
-        
-        # This loop now iterates over the list provided in __init__
         for report_type in self.report_types_to_scrape:
-            yearly_tables = {}
-            for year in range(self.start_year, self.end_year + 1):
-                table = self._fetch_report_table(report_type, year)
-                if table is not None:
-                    yearly_tables[year] = table
-            
-            if not yearly_tables:
-                logging.debug(f"No data found for {self.symbol} - {report_type} in any year.")
+            method = self.STATEMENT_METHODS[report_type]
+            try:
+                report = self._call(method, getattr(client, method), period=period, lang='vi', dropna=False)
+            except Exception as e:
+                self.record_failure(report_type, method, e)
                 continue
-            first_available_table = list(yearly_tables.values())[0]
-            categories = first_available_table.iloc[:, 0]
-
-            yearly_data = {
-                year: table.iloc[:, 4]
-                for year, table in yearly_tables.items()
-            }
-            
-            df_wide = pd.DataFrame(yearly_data)
-            df_wide['account'] = categories
-            df_long = df_wide.melt(id_vars=['account'], var_name='report_date', value_name='value')
-            df_long['report_type'] = report_map.get(report_type)
+            df_long = melt_vnstock_report(report, self.granularity) if report is not None else None
+            if df_long is None:
+                logging.debug(f"No data found for {self.symbol} - {report_type} from {self.SOURCE}.")
+                continue
+            df_long = df_long[df_long['report_date'].between(self.start_year, self.end_year)]
+            df_long = df_long.sort_values(by=['report_date', 'quarter', 'row_order'], kind='stable')
+            df_long = df_long[['account', 'report_date', 'quarter', 'value']].reset_index(drop=True)
+            df_long['report_type'] = self.REPORT_NAMES[report_type]
             company_reports.append(df_long)
-        
+
         if not company_reports:
             return None
-            
+
         final_df = pd.concat(company_reports, ignore_index=True)
         final_df['symbol'] = self.symbol
+        final_df['scraped_at'] = pd.Timestamp.now(tz='UTC').floor('ms')
         return final_df
 
+def load_client_factory(spec: str) -> Callable[[str], object]:
+    """Imports a Finance client factory given as 'module:function', e.g. a local stub."""
+    module_name, _, attribute = spec.partition(':')
+    return getattr(importlib.import_module(module_name), attribute or 'Finance')
+
 # ==============================================================================
 # LOGIC HELPER (FUNCTIONS)
 # ==============================================================================
+def is_period_closed(year: int, today: datetime.date | None = None, quarter: int = 0) -> bool:
+    """
+    A fiscal year is closed once CONFIG['closed_after_months'] have passed
+    since it ended, by which time the audited figures are published; a
+    quarter once CONFIG['quarter_closed_after_months'] have passed.
+    """
+    today = today or datetime.date.today()
+    if quarter:
+        months = 3 * quarter + CONFIG['quarter_closed_after_months']
+    else:
+        months = 12 + CONFIG['closed_after_months']
+    closing_date = datetime.date(year + months // 12, months % 12 + 1, 1)
+    return today >= closing_date
+
+def tag_path(path: str, tag: str) -> str:
+    """
+    Tags an output file or directory name from CONFIG, keeping the '_suffix'
+    placeholder last, e.g. 'final_financial_statements_suffix.parquet' with
+    tag 'quarterly' becomes 'final_financial_statements_quarterly_suffix.parquet'.
+    """
+    root, ext = os.path.splitext(path)
+    if root.endswith('_suffix'):
+        return f"{root[:-len('_suffix')]}_{tag}_suffix{ext}"
+    return f"{root}_{tag}{ext}"
+
+def granularity_path(path: str, granularity: str) -> str:
+    """
+    Tags an output name with the granularity (see tag_path), so quarterly
+    runs never overwrite annual outputs. Annual names are kept as they are.
+    """
+    return path if granularity == 'annual' else tag_path(path, granularity)
+
+def source_path(path: str, source: str) -> str:
+    """Tags an output name with the data source; CafeF names are kept as they are."""
+    return path if source == 'cafef' else tag_path(path, source)
+
 def get_company_listing() -> pd.DataFrame:
     """Fetches a list of companies from HSX and HNX."""
     logging.info("Fetching company list...")
@@ -126,36 +760,218 @@ def get_company_listing() -> pd.DataFrame:
     df_final = pd.merge(df_short, df_industry_names, how='left', on='symbol')
     return df_final[['symbol', 'exchange', 'organ_name', 'industry']].dropna(subset=['symbol'])
 
-def transform_data(raw_df: pd.DataFrame, company_info_df: pd.DataFrame, mapping_dict: dict) -> pd.DataFrame:
-    """Cleans and transforms raw scraped data."""
+def save_company_shards(scraper: CafeFScraper, result_df: pd.DataFrame | None, manifest: ScrapeManifest,
+                        shard_dir: str) -> None:
+    """
+    Flushes one finished company to per-report-type parquet shards and
+    records every scraped report type in the manifest, even empty ones.
+    Report types with failed pages keep their shard but are recorded with
+    no finished periods, so --resume and --retry-failed pick them up again.
+    """
+    periods = list(range(scraper.start_year, scraper.end_year + 1))
+    failed_report_types = {page['report_type'] for page in scraper.failed_pages}
+    for report_type in scraper.report_types_to_scrape:
+        shard_path = None
+        if result_df is not None:
+            report_df = result_df[result_df['report_type'] == CafeFScraper.REPORT_NAMES[report_type]]
+            if not report_df.empty:
+                shard_path = os.path.join(shard_dir, report_type, f"{scraper.symbol}.parquet")
+                os.makedirs(os.path.dirname(shard_path), exist_ok=True)
+                report_df.to_parquet(shard_path, index=False)
+        done_periods = [] if report_type in failed_report_types else periods
+        manifest.mark_done(scraper.symbol, report_type, done_periods, shard_path)
+
+def compile_account_mapping(mapping_dict: dict) -> pd.DataFrame:
+    """
+    Compiles the account mapping JSON once into a lookup table indexed by the
+    Vietnamese label, with categorical 'english' and 'english_format' columns.
+    """
+    lookup = pd.DataFrame.from_dict(mapping_dict, orient='index', columns=['english', 'english_format'])
+    lookup.index.name = 'account_vi'
+    return lookup.astype('category')
+
+def load_account_mapping(path: str) -> pd.DataFrame:
+    """Reads account_mapping.json and compiles it with compile_account_mapping."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return compile_account_mapping(json.load(f))
+
+def _remap_codes(column: pd.Series, codes: np.ndarray) -> pd.Categorical:
+    """Looks up a categorical lookup column by row codes; code -1 (unmapped) gives NaN."""
+    mapped_codes = column.cat.codes.to_numpy()[codes]
+    mapped_codes[codes == -1] = -1
+    return pd.Categorical.from_codes(mapped_codes, categories=column.cat.categories)
+
+def find_unmapped_accounts(df: pd.DataFrame, account_lookup: pd.DataFrame) -> pd.DataFrame:
+    """Counts the rows per (report_type, account_vi) whose label is missing from the mapping."""
+    unmapped = df[~df['account_vi'].isin(account_lookup.index)]
+    counts = unmapped.groupby(['report_type', 'account_vi'], observed=True).size()
+    return counts.rename('row_count').reset_index().sort_values('row_count', ascending=False)
+
+def transform_data(raw_df: pd.DataFrame, company_info_df: pd.DataFrame, account_lookup: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cleans and transforms raw scraped data into the typed storage schema
+    (see statement_schema). account_vi/account_en/account are produced by
+    one categorical code remap against the compiled account lookup
+    (see compile_account_mapping).
+    """
     logging.info("Transforming raw data...")
     df = pd.merge(raw_df, company_info_df, on='symbol', how='left')
     df.rename(columns={'symbol': 'company_code', 'organ_name': 'company_name'}, inplace=True)
     df.dropna(subset=['company_code', 'report_date', 'account'], inplace=True)
-    # df['value'] = pd.to_numeric(df['value'], errors='coerce')
-    df['report_date'] = df['report_date'].astype(str)
-    
+    if 'quarter' in df.columns:
+        df['quarter'] = df['quarter'].fillna(0)  # Shard từ phiên bản cũ (chưa có cột quarter) là báo cáo năm
+
     df['account_vi'] = df['account']
-    df['account_en'] = df['account'].apply(lambda x: mapping_dict.get(x, {}).get('english'))
-    df['account'] = df['account'].apply(lambda x: mapping_dict.get(x, {}).get('english_format'))
+    codes = account_lookup.index.get_indexer(df['account'])
+    df['account_en'] = _remap_codes(account_lookup['english'], codes)
+    df['account'] = _remap_codes(account_lookup['english_format'], codes)
     
-    return df[financial_statement_schemas].sort_values(by=['company_code', 'report_type', 'report_date'])
+    return apply_schema(df).sort_values(by=SORT_COLUMNS, kind='stable')
+
+# ==============================================================================
+# RUN STATE - MỖI LOẠI KỲ BÁO CÁO (NĂM/QUÝ) TRONG MỘT LẦN CHẠY
+# ==============================================================================
+class GranularityRun:
+    """
+    Output paths, manifest and scrapers of one granularity within a
+    pipeline run. Annual and quarterly runs share everything else: company
+    list, account mapping, HTTP session, rate limiter, page cache and the
+    scheduling engine, so both can be fetched in one pass.
+    """
+
+    def __init__(self, granularity: str, output_dir: str, suffix: str, source: str = 'cafef'):
+        """
+        Args:
+            granularity (str): 'annual' or 'quarterly'.
+            output_dir (str): Directory of the pipeline outputs.
+            suffix (str): Report type suffix of the output file names ('' for all types).
+            source (str): Data source; outputs of sources other than CafeF are tagged with it.
+        """
+        self.granularity = granularity
+        self.source = source
+        self.final_data_path = os.path.join(output_dir, self._name('final_data_filename', suffix))
+        self.unmapped_path = os.path.join(output_dir, self._name('unmapped_filename', suffix))
+        self.cube_dir = os.path.join(output_dir, self._name('cube_dirname', suffix))
+        self.shard_dir = self._tag(CONFIG['shard_dir'])
+        self.dataset_dir = self._tag(CONFIG['dataset_dir'])
+        self.manifest = ScrapeManifest(os.path.join(output_dir, self._tag(CONFIG['manifest_filename'])))
+        self.dead_letters = DeadLetterLog(os.path.join(output_dir, self._tag(CONFIG['dead_letter_filename'])))
+        self.start_year = CONFIG['start_year']
+        self.existing_df = None  # Đầu ra hiện có, chỉ dùng ở chế độ --since
+        self.scrapers = []
+
+    def _tag(self, path: str) -> str:
+        return source_path(granularity_path(path, self.granularity), self.source)
+
+    def _name(self, config_key: str, suffix: str) -> str:
+        return self._tag(CONFIG[config_key]).replace('_suffix', f'_{suffix}')
+
+    def on_result(self, scraper: CafeFScraper, result_df: pd.DataFrame | None) -> None:
+        """Flushes one finished company to shards and the dead-letter log."""
+        save_company_shards(scraper, result_df, self.manifest, self.shard_dir)
+        self.dead_letters.append(scraper.failed_pages)
+
+    def write_outputs(self, company_df: pd.DataFrame, account_lookup: pd.DataFrame, symbols: list[str],
+                      report_types: list[str], by_exchange: bool) -> None:
+        """Transforms the collected shards and writes the final file, the partitioned dataset and the cube."""
+        failed_pages = self.dead_letters.load()
+        if failed_pages:
+            logging.warning(f"{len(failed_pages)} {self.granularity} pages failed permanently and were written to "
+                            f"{self.dead_letters.path}. Run again with --retry-failed to fetch them.")
+
+        shard_paths = self.manifest.shard_paths(symbols, report_types)
+        if not shard_paths:
+            logging.warning(f"Scraping finished, but no {self.granularity} data was collected.")
+            return
+
+        raw_df = pd.concat([pd.read_parquet(path) for path in shard_paths], ignore_index=True)
+        final_df = transform_data(raw_df, company_df, account_lookup)
+
+        unmapped_df = find_unmapped_accounts(final_df, account_lookup)
+        if not unmapped_df.empty:
+            unmapped_df.to_csv(self.unmapped_path, index=False)
+            logging.warning(f"{len(unmapped_df)} account labels are missing from {CONFIG['mapping_filepath']}; "
+                            f"see {self.unmapped_path}")
+        if self.existing_df is not None:
+            # Bộ dữ liệu phân vùng chỉ ghi lại các phân vùng có dữ liệu mới; file tổng dùng cùng quy tắc upsert
+            # (dòng có scraped_at mới hơn thắng theo khóa tự nhiên + account_seq) để hai đầu ra luôn khớp nhau
+            upsert_dataset(final_df, self.dataset_dir, by_exchange=by_exchange)
+            final_df, _ = upsert_rows(self.existing_df, final_df)
+        else:
+            write_dataset(final_df, self.dataset_dir, by_exchange=by_exchange)
+
+        write_statements(final_df, self.final_data_path)
+        write_cube(build_cube(final_df), self.cube_dir)
+        logging.info(f"Successfully transformed data and saved to {self.final_data_path}, {self.dataset_dir} "
+                     f"and {self.cube_dir}")
+
+def load_company_list(output_dir: str, reload: bool) -> pd.DataFrame | None:
+    """Fetches the company list (reload) or reads the saved one; None if neither works."""
+    company_list_path = os.path.join(output_dir, CONFIG['company_list_filename'])
+    try:
+        if reload:
+            company_df = get_company_listing()
+            company_df.to_csv(company_list_path, index=False)
+            logging.info(f"Saved company list of {len(company_df)} companies to {company_list_path}")
+        else:
+            company_df = pd.read_csv(company_list_path)
+            logging.info(f"Loaded company list of {len(company_df)} companies to {company_list_path}")
+    except Exception as e:
+        logging.warning(f"Failed to fetch new company list: {e}. Trying to load from existing file.")
+        if not os.path.exists(company_list_path):
+            logging.error("No existing company list found. Exiting.")
+            return None
+        company_df = pd.read_csv(company_list_path)
+        logging.info(f"Loaded {len(company_df)} companies from {company_list_path}")
+    return company_df
 
 # ==============================================================================
 # MAIN EXECUTION
 # ==============================================================================
-def main():
-    """Main pipeline orchestrator."""
+def main(default_granularity: str = 'annual'):
+    """
+    Main pipeline orchestrator.
+
+    Args:
+        default_granularity (str): Granularity scraped when --granularity is not given.
+    """
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     
     # Define the list of all possible report types for argparse
     ALL_REPORTS = ['bsheet', 'incsta', 'cashflow', 'cashflowdirect']
     
-    parser = argparse.ArgumentParser(description="A pipeline to scrape financial data from CafeF.")
+    parser = argparse.ArgumentParser(description="A pipeline to scrape financial data from CafeF or the vnstock API.")
 
     parser.add_argument('--reload', type=int, default=0, help="Reload the companies list to scrape: 1-reload, 0-load.")
     parser.add_argument('--limit', type=int, help="Limit the number of companies to scrape for testing.")
+    parser.add_argument('--granularity', nargs='+', choices=GRANULARITIES, default=[default_granularity],
+                        help="Period granularity to scrape; 'annual quarterly' fetches both in one run, "
+                             "sharing the company list, mapping, connections, cache and workers.")
+    parser.add_argument('--source', choices=SOURCES, default='cafef',
+                        help="Data source: CafeF HTML pages, or the vnstock Finance API (balance sheet, income "
+                             "statement and cash flow only). vnstock outputs are tagged '_vnstock'.")
+    parser.add_argument('--vnstock-client', type=str, default=None, metavar='MODULE:FUNCTION',
+                        help="Finance client factory for --source vnstock, e.g. a local stub for tests "
+                             "(called with the symbol). Defaults to vnstock.Finance with CONFIG['vnstock']['source'].")
     parser.add_argument('--single-thread', action='store_true', help="Run the scraper in a single thread (sequentially).")
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread',
+                        help="Scraping engine for the concurrent mode: a thread pool (one company per thread) "
+                             "or asyncio (one coroutine per page, requires aiohttp).")
+    parser.add_argument('--base-url', type=str, nargs='+', default=None,
+                        help="Override the CafeF URL template, e.g. to scrape from a local stub server. "
+                             "With several granularities, give one template per granularity, in the same order.")
+    parser.add_argument('--offline', action='store_true',
+                        help="Rebuild the output purely from the page cache, without any network access.")
+    parser.add_argument('--no-cache', action='store_true', help="Neither read nor write the page cache.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Resume an interrupted run: skip companies and report types already in the manifest.")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Retry only the pages in the dead-letter log of the previous run, then rebuild the output.")
+    parser.add_argument('--partition-by-exchange', action='store_true',
+                        help="Also partition the output dataset by exchange (below report_type/report_date).")
+    parser.add_argument('--since', nargs='?', type=int, const=0, default=None, metavar='YEAR',
+                        help="Incremental mode: only fetch periods from YEAR onwards and merge them into the "
+                             "existing output. Without YEAR, starts from the latest year already in the output.")
     
     # CHANGED: argparse now accepts multiple values for --report-type and defaults to all
     parser.add_argument('--report-type',
@@ -166,28 +982,35 @@ def main():
                              f"If not specified, all types are scraped: {', '.join(ALL_REPORTS)}.")
 
     args = parser.parse_args()
+    if args.offline and args.no_cache:
+        parser.error("--offline needs the page cache; it cannot be combined with --no-cache.")
+    granularities = list(dict.fromkeys(args.granularity))
+    if args.base_url and len(args.base_url) != len(granularities):
+        parser.error("--base-url needs one URL template per granularity.")
+    base_urls = dict(zip(granularities, args.base_url or [None] * len(granularities)))
+    if args.source == 'vnstock':
+        if args.offline or args.base_url:
+            parser.error("--offline and --base-url only apply to --source cafef.")
+        skipped = [rt for rt in args.report_type if rt not in VnstockFinanceFetcher.STATEMENT_METHODS]
+        args.report_type = [rt for rt in args.report_type if rt in VnstockFinanceFetcher.STATEMENT_METHODS]
+        if skipped:
+            logging.warning(f"{', '.join(skipped)} is not available from vnstock and is skipped.")
+        if not args.report_type:
+            parser.error("None of the requested report types is available from vnstock.")
+    client_factory = load_client_factory(args.vnstock_client) if args.vnstock_client else None
     
     output_dir = CONFIG['output_dir']
     os.makedirs(output_dir, exist_ok=True)
+    page_cache = None if args.no_cache else PageCache(CONFIG['cache_dir'])
 
     # --- Step 1: Get Company List ---
-    company_list_path = os.path.join(output_dir, CONFIG['company_list_filename'])
-    try:
-        if args.reload == 1:
-            company_df = get_company_listing()
-            company_df.to_csv(company_list_path, index=False)
-            logging.info(f"Saved company list of {len(company_df)} companies to {company_list_path}")
-        else:
-            company_df = pd.read_csv(company_list_path)
-            logging.info(f"Loaded company list of {len(company_df)} companies to {company_list_path}")
-    except Exception as e:
-        logging.warning(f"Failed to fetch new company list: {e}. Trying to load from existing file.")
-        if os.path.exists(company_list_path):
-            company_df = pd.read_csv(company_list_path)
-            logging.info(f"Loaded {len(company_df)} companies from {company_list_path}")
-        else:
-            logging.error("No existing company list found. Exiting.")
-            return
+    company_df = load_company_list(output_dir, reload=args.reload == 1 and not args.offline)
+    if company_df is None:
+        return
+
+    suffix = args.report_type[0] if len(args.report_type) == 1 else ""
+    runs = {granularity: GranularityRun(granularity, output_dir, suffix, source=args.source)
+            for granularity in granularities}
 
     # --- Step 2: Scrape Data ---
     symbols_to_scrape = company_df['symbol'].tolist()
@@ -195,55 +1018,98 @@ def main():
         symbols_to_scrape = symbols_to_scrape[:args.limit]
         logging.info(f"Scraping limited to {args.limit} companies.")
 
-    all_results = []
-    
     # The report types to scrape are now in args.report_type (which is a list)
-    logging.info(f"Target report types: {', '.join(args.report_type)}")
+    logging.info(f"Target report types: {', '.join(args.report_type)}; granularity: {', '.join(granularities)}")
+    for granularity, run in runs.items():
+        try:
+            # Kiểm tra cách phân vùng của bộ dữ liệu hiện có trước khi cào, không phải sau khi cào xong
+            check_partitioning(run.dataset_dir, args.partition_by_exchange)
+        except ValueError as e:
+            logging.error(f"{e} Run with{'out' if args.partition_by_exchange else ''} --partition-by-exchange "
+                          f"or use a new dataset directory. Exiting.")
+            return
+        if args.since is not None:
+            if os.path.exists(run.final_data_path):
+                run.existing_df = read_statements(run.final_data_path)
+            if args.since:
+                run.start_year = args.since
+            elif run.existing_df is not None:
+                # Năm mới nhất có thể chưa đủ số liệu nên được cào lại
+                run.start_year = int(run.existing_df['report_date'].max())
+            else:
+                logging.error(f"--since without a year needs an existing output at {run.final_data_path}. Exiting.")
+                return
+            logging.info(f"Incremental mode ({granularity}): fetching periods from {run.start_year} onwards.")
+
+        symbols = symbols_to_scrape
+        resume = args.resume
+        if args.retry_failed:
+            failed_symbols = {page['symbol'] for page in run.dead_letters.load()}
+            logging.info(f"Retrying failed {granularity} pages of {len(failed_symbols)} companies.")
+            symbols = [symbol for symbol in symbols_to_scrape if symbol in failed_symbols]
+            run.dead_letters.clear()
+            resume = True
+        if not resume:
+            run.manifest.clear()
+            run.dead_letters.clear()
+
+        periods = list(range(run.start_year, datetime.datetime.now().year + 1))
+        if args.source == 'vnstock':
+            def make_scraper(symbol, report_types):
+                return VnstockFinanceFetcher(symbol, run.start_year, report_types=report_types,
+                                             granularity=granularity, client_factory=client_factory)
+        else:
+            def make_scraper(symbol, report_types):
+                return CafeFScraper(symbol, run.start_year, report_types=report_types,
+                                    base_url=base_urls[granularity],
+                                    cache=page_cache, offline=args.offline, granularity=granularity)
+        run.scrapers = [
+            make_scraper(symbol, report_types)
+            for symbol in symbols
+            if (report_types := run.manifest.pending_report_types(symbol, args.report_type, periods))
+        ]
+        if resume:
+            logging.info(f"Resuming ({granularity}): {len(symbols) - len(run.scrapers)} companies already done, "
+                         f"{len(run.scrapers)} left.")
+
+    if args.retry_failed and not any(run.scrapers for run in runs.values()):
+        logging.info("The dead-letter log is empty; nothing to retry.")
+        return
+
+    # Các công ty của mọi loại kỳ được lập lịch chung trên cùng engine, session và rate limiter
+    scrapers = [scraper for run in runs.values() for scraper in run.scrapers]
+
+    def on_result(scraper: CafeFScraper, result_df: pd.DataFrame | None) -> None:
+        runs[scraper.granularity].on_result(scraper, result_df)
+
+    if args.offline:
+        logging.info(f"Running offline from the page cache in {CONFIG['cache_dir']}.")
     
     if args.single_thread:
         logging.info("Running in single-thread mode.")
-        # symbols_to_scrape = ['SSI']
-        for symbol in tqdm(symbols_to_scrape, desc="Scraping Financials (Single-Thread)"):
-            # logging.info(f"Running in single-thread on {symbol}")
-            # CHANGED: Pass the list args.resport_type to the scraper
-            scraper = CafeFScraper(symbol, CONFIG['start_year'], report_types=args.report_type)
-            result_df = scraper.scrape_all_reports()
-            if result_df is not None:
-                all_results.append(result_df)
+        for scraper in tqdm(scrapers, desc="Scraping Financials (Single-Thread)"):
+            on_result(scraper, scraper.scrape_all_reports())
+    elif args.engine == 'async' and not args.offline and args.source == 'cafef':
+        logging.info(f"Running in async mode with up to {CONFIG['async_max_concurrency']} requests in flight.")
+        scrape_all_async(scrapers, on_result)
     else:
-        logging.info(f"Running in multi-thread mode with {CONFIG['max_workers']} workers.")
-        with ThreadPoolExecutor(max_workers=CONFIG['max_workers']) as executor:
-            future_to_symbol = {
-                # CHANGED: Pass the list args.report_type to the scraper
-                executor.submit(CafeFScraper(symbol, CONFIG['start_year'], report_types=args.report_type).scrape_all_reports): symbol
-                for symbol in symbols_to_scrape
+        # vnstock là thư viện đồng bộ nên luôn chạy bằng thread pool, với số luồng riêng
+        max_workers = CONFIG['vnstock']['max_workers'] if args.source == 'vnstock' else CONFIG['max_workers']
+        logging.info(f"Running in multi-thread mode with {max_workers} workers.")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_scraper = {
+                executor.submit(scraper.scrape_all_reports): scraper
+                for scraper in scrapers
             }
-            progress = tqdm(as_completed(future_to_symbol), total=len(symbols_to_scrape), desc="Scraping Financials")
+            progress = tqdm(as_completed(future_to_scraper), total=len(scrapers), desc="Scraping Financials")
             for future in progress:
-                result_df = future.result()
-                if result_df is not None:
-                    all_results.append(result_df)
-    
-    if not all_results:
-        logging.warning("Scraping finished, but no data was collected.")
-        return
+                on_result(future_to_scraper[future], future.result())
 
-    raw_df = pd.concat(all_results, ignore_index=True)
     # --- Step 3: Transform Data ---
-    with open(CONFIG['mapping_filepath'], 'r', encoding='utf-8') as f:
-        account_map = json.load(f)
-        
-    final_df = transform_data(raw_df, company_df, account_map)
-
-    suffix = args.report_type[0] if len(args.report_type) == 1 else ""
-    final_data_path = os.path.join(output_dir, CONFIG['final_data_filename'].replace('_suffix', f'_{suffix}'))
-    final_csv_data_path = os.path.join(output_dir, CONFIG['final_data_filename_csv'].replace('_suffix', f'_{suffix}'))
-    
-    final_df.to_parquet(final_data_path, index=False)
-    # final_df.to_csv(final_csv_data_path, sep="\t", index=False)
-    
-    logging.info(f"Successfully transformed data and saved to {final_data_path} and {final_csv_data_path}")
+    account_lookup = load_account_mapping(CONFIG['mapping_filepath'])
+    for run in runs.values():
+        run.write_outputs(company_df, account_lookup, symbols_to_scrape, args.report_type, args.partition_by_exchange)
     logging.info("Pipeline finished.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
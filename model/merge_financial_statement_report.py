@@ -1,9 +1,18 @@
 import os
+import time
 import argparse
 import logging
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import glob
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from tqdm import tqdm
+from statement_schema import STATEMENT_COLUMNS, STATEMENT_SCHEMA, ROW_GROUP_SIZE, COMPRESSION, conform_table, read_statements
+from statement_dataset import upsert_dataset
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,74 +20,281 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
-def merge_files(input_dir: str, output_file: str, file_type: str = 'parquet'):
+DEFAULT_PATTERN = 'final_financial_statements_*'
+BATCH_SIZE = 64 * 1024
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def read_input_schema(path: str, file_type: str) -> tuple[pa.Schema, int | None]:
+    """Returns the schema of an input file and its row count (None for CSV), without reading its data."""
+    if file_type == 'parquet':
+        metadata = pq.ParquetFile(path).metadata
+        return metadata.schema.to_arrow_schema(), metadata.num_rows
+    # Với CSV, chỉ khối đầu tiên được đọc để suy ra kiểu dữ liệu
+    with pacsv.open_csv(path, parse_options=pacsv.ParseOptions(delimiter='\t')) as reader:
+        return reader.schema, None
+
+def iter_input_batches(path: str, file_type: str, batch_size: int = BATCH_SIZE, use_threads: bool = True):
+    """Yields the record batches of an input file one at a time."""
+    if file_type == 'parquet':
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_size, use_threads=use_threads)
+    else:
+        yield from pacsv.open_csv(path, read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE, use_threads=use_threads),
+                                  parse_options=pacsv.ParseOptions(delimiter='\t'),
+                                  # Ô trống là giá trị thiếu, giống pd.read_csv
+                                  convert_options=pacsv.ConvertOptions(strings_can_be_null=True))
+
+def unify_input_schemas(schemas: list[pa.Schema]) -> pa.Schema:
+    """
+    Decides the output schema before any data is read. Financial statement
+    files (old string-typed ones included) are merged into STATEMENT_SCHEMA;
+    anything else into the union of the input schemas. Files written before
+    the quarter and scraped_at columns existed still count as statement
+    files: conform_table fills those columns in.
+    """
+    required = set(STATEMENT_COLUMNS) - {'quarter', 'scraped_at'}
+    if all(required <= set(schema.names) for schema in schemas):
+        return STATEMENT_SCHEMA
+    return pa.unify_schemas(schemas, promote_options='permissive')
+
+def conform_batch(batch: pa.RecordBatch, schema: pa.Schema) -> pa.Table:
+    """Casts a batch to the output schema; columns it lacks are filled with nulls."""
+    if schema.equals(STATEMENT_SCHEMA):
+        return conform_table(batch)
+    table = pa.Table.from_batches([batch])
+    columns = [
+        table.column(field.name) if field.name in table.column_names else pa.nulls(table.num_rows, type=field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def decode_file(path: str, file_type: str, schema: pa.Schema) -> pa.Table:
     """
-    Finds all files of a specific type in a directory, merges them into a
-    single pandas DataFrame, and saves the result to a new file.
+    Process pool task: decodes a whole input file into one table with the
+    output schema. Arrow tables are sent back to the parent as IPC buffers,
+    which is much cheaper than pickling DataFrames.
+    """
+    # Mỗi tiến trình chỉ dùng một luồng để N tiến trình không tranh nhau N×số nhân CPU
+    tables = [conform_batch(batch, schema) for batch in iter_input_batches(path, file_type, use_threads=False)]
+    return pa.concat_tables(tables) if tables else schema.empty_table()
+
+def spool_file(path: str, file_type: str, schema: pa.Schema, spool_path: str) -> None:
+    """
+    Streams an input file, batch by batch, into an Arrow IPC file with the
+    output schema. Raises if the input cannot be read to the end.
+    """
+    with pa.OSFile(spool_path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in iter_input_batches(path, file_type):
+            writer.write_table(conform_batch(batch, schema))
+
+def iter_input_tables(paths: list[str], file_type: str, schema: pa.Schema, workers: int = 1):
+    """
+    Yields (path, table) pairs with the output schema, always in the order
+    of paths.
+
+    With one worker, each file is streamed batch by batch into a temporary
+    spool file and replayed only once it was read to the end. With more,
+    whole files are decoded in a process pool with at most 2 x workers files
+    in flight. Either way a file that fails to read is logged and skipped
+    entirely, so the output does not depend on the number of workers.
+    """
+    if workers <= 1:
+        with tempfile.TemporaryDirectory(prefix='merge_spool_') as spool_dir:
+            spool_path = os.path.join(spool_dir, 'input.arrow')
+            for path in paths:
+                try:
+                    spool_file(path, file_type, schema, spool_path)
+                except Exception as e:
+                    logging.error(f"Lỗi khi đọc file '{path}': {e}")
+                    continue # Bỏ qua file lỗi và tiếp tục
+                # Mỗi lần chỉ đọc lại một batch từ spool, bộ nhớ vẫn bị chặn như khi đọc trực tiếp
+                with pa.OSFile(spool_path) as source:
+                    reader = pa.ipc.open_file(source)
+                    for i in range(reader.num_record_batches):
+                        yield path, pa.Table.from_batches([reader.get_batch(i)])
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        queued_paths = iter(paths)
+        pending = deque()
+        for path in queued_paths:
+            pending.append((path, executor.submit(decode_file, path, file_type, schema)))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(queued_paths, None)
+            if next_path is not None:
+                pending.append((next_path, executor.submit(decode_file, next_path, file_type, schema)))
+            try:
+                table = future.result()
+            except Exception as e:
+                logging.error(f"Lỗi khi đọc file '{path}': {e}")
+                continue # Bỏ qua file lỗi và tiếp tục
+            yield path, table
+
+def open_writer(output_file: str, output_format: str, schema: pa.Schema):
+    """
+    Opens an incremental writer with write_table/close: tab-separated CSV
+    for output_format '.csv', parquet otherwise. Returns it with the schema
+    the tables passed to it must have.
+    """
+    if output_format == '.csv':
+        plain_schema = pa.schema([
+            pa.field(field.name, field.type.value_type) if pa.types.is_dictionary(field.type) else field
+            for field in schema
+        ])
+        return pacsv.CSVWriter(output_file, plain_schema, write_options=pacsv.WriteOptions(delimiter='\t')), plain_schema
+    return pq.ParquetWriter(output_file, schema, compression=COMPRESSION), schema
+
+def merge_files(input_dir: str, output_file: str, file_type: str = 'parquet', pattern: str = DEFAULT_PATTERN,
+                row_group_size: int = ROW_GROUP_SIZE, workers: int = 1):
+    """
+    Merges the files matching a pattern in a directory into a single file,
+    streaming them batch by batch: memory stays bounded by one row group
+    regardless of how many files or rows are merged. With several workers,
+    input files are decoded in parallel processes instead and memory is
+    bounded by the 2 x workers files in flight; the output order is the same.
 
     Args:
         input_dir (str): The path to the directory containing the files to merge.
-        output_file (str): The path where the merged file will be saved.
+        output_file (str): The path where the merged file will be saved (.parquet, .csv or .xlsx).
         file_type (str): The type of files to merge ('parquet' or 'csv').
+        pattern (str): Glob pattern of the input file names, without extension.
+        row_group_size (int): Number of rows buffered per output row group.
+        workers (int): Number of processes decoding input files.
     """
     if not os.path.isdir(input_dir):
         logging.error(f"Thư mục đầu vào không tồn tại: '{input_dir}'")
         return
 
-    search_pattern = os.path.join(input_dir, f'*.{file_type}')
-    file_list = glob.glob(search_pattern)
+    search_pattern = os.path.join(input_dir, f'{pattern}.{file_type}')
+    file_list = sorted(glob.glob(search_pattern))
 
     if not file_list:
-        logging.warning(f"Không tìm thấy file nào có định dạng '.{file_type}' trong thư mục '{input_dir}'")
+        logging.warning(f"Không tìm thấy file nào khớp '{pattern}.{file_type}' trong thư mục '{input_dir}'")
         return
-    logging.info(f"Tìm thấy {len(file_list)} file '.{file_type}' để hợp nhất.")
+    logging.info(f"Tìm thấy {len(file_list)} file '{pattern}.{file_type}' để hợp nhất.")
 
-    list_of_dfs = []
-    for f in tqdm(file_list, desc=f"Đang đọc file .{file_type}"):
+    # --- Bước 1: Đọc schema của tất cả file đầu vào trước khi đọc dữ liệu ---
+    inputs = []
+    for f in file_list:
         try:
-            if file_type == 'parquet':
-                df = pd.read_parquet(f)
-            elif file_type == 'csv':
-                # Giả sử file CSV được phân cách bằng tab, dựa trên script trước
-                df = pd.read_csv(f, sep='\t')
-            else:
-                logging.error(f"Loại file không được hỗ trợ: {file_type}")
-                return
-            list_of_dfs.append(df)
+            schema, num_rows = read_input_schema(f, file_type)
+            inputs.append((f, schema, num_rows))
         except Exception as e:
             logging.error(f"Lỗi khi đọc file '{f}': {e}")
             continue # Bỏ qua file lỗi và tiếp tục
 
-    if not list_of_dfs:
+    if not inputs:
         logging.error("Không đọc được file nào thành công. Dừng quá trình.")
         return
-
-    logging.info("Đang hợp nhất dữ liệu...")
-    merged_df = pd.concat(list_of_dfs, ignore_index=True)
-    logging.info(f"Hợp nhất hoàn tất. DataFrame cuối cùng có {merged_df.shape[0]} dòng và {merged_df.shape[1]} cột.")
+    try:
+        output_schema = unify_input_schemas([schema for _, schema, _ in inputs])
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        logging.error(f"Các file đầu vào có schema không tương thích: {e}")
+        return
 
     output_format = os.path.splitext(output_file)[1].lower()
-    
+    if output_format not in ('.parquet', '.csv', '.xlsx'):
+        logging.error("Định dạng file đầu ra không được hỗ trợ. Vui lòng sử dụng '.parquet', '.csv', hoặc '.xlsx'.")
+        output_file = os.path.splitext(output_file)[0] + '.parquet'
+        output_format = '.parquet'
+        logging.warning(f"Lưu file dưới dạng Parquet mặc định tại: {output_file}")
+
     output_dir_path = os.path.dirname(output_file)
     if output_dir_path:
         os.makedirs(output_dir_path, exist_ok=True)
-        
-    logging.info(f"Đang lưu file đã hợp nhất vào '{output_file}'...")
+
+    # Excel không ghi được từng phần: hợp nhất ra parquet tạm rồi chuyển đổi ở cuối
+    stream_path = output_file + '.parquet' if output_format == '.xlsx' else output_file
+    tmp_path = f"{stream_path}.{os.getpid()}.tmp"
+
+    # --- Bước 2: Đọc từng batch, ghi từng row group ---
+    known_rows = [num_rows for _, _, num_rows in inputs]
+    total_rows = sum(known_rows) if None not in known_rows else None
+    logging.info(f"Đang hợp nhất dữ liệu vào '{output_file}' với {workers} tiến trình đọc...")
+    start = time.perf_counter()
+    rows_written = 0
+    writer, write_schema = open_writer(tmp_path, output_format, output_schema)
+    buffer, buffered_rows = [], 0
+    f = None
     try:
-        if output_format == '.parquet':
-            merged_df.to_parquet(output_file, index=False)
-        elif output_format == '.csv':
-            merged_df.to_csv(output_file, index=False, sep='\t')
-        elif output_format == '.xlsx':
-             merged_df.to_excel(output_file, index=False)
-        else:
-            logging.error("Định dạng file đầu ra không được hỗ trợ. Vui lòng sử dụng '.parquet', '.csv', hoặc '.xlsx'.")
-            default_output_path = os.path.splitext(output_file)[0] + '.parquet'
-            logging.warning(f"Lưu file dưới dạng Parquet mặc định tại: {default_output_path}")
-            merged_df.to_parquet(default_output_path, index=False)
-        logging.info(f"Đã lưu thành công file tại '{output_file}'")
+        with tqdm(total=total_rows, unit='rows', unit_scale=True, desc="Đang hợp nhất") as progress:
+            for f, table in iter_input_tables([path for path, _, _ in inputs], file_type, output_schema, workers):
+                buffer.append(table)
+                buffered_rows += table.num_rows
+                progress.update(table.num_rows)
+                if buffered_rows >= row_group_size:
+                    # Ghi các row group đủ kích thước, phần dư giữ lại cho lần ghi sau
+                    merged = pa.concat_tables(buffer).cast(write_schema)
+                    full_rows = merged.num_rows // row_group_size * row_group_size
+                    for offset in range(0, full_rows, row_group_size):
+                        writer.write_table(merged.slice(offset, row_group_size))
+                    rows_written += full_rows
+                    buffer, buffered_rows = [merged.slice(full_rows)], merged.num_rows - full_rows
+            if buffer:
+                writer.write_table(pa.concat_tables(buffer).cast(write_schema))
+                rows_written += buffered_rows
+        writer.close()
     except Exception as e:
-        logging.error(f"Lỗi khi lưu file đầu ra: {e}")
+        writer.close()
+        os.remove(tmp_path)
+        logging.error(f"Lỗi khi hợp nhất file '{f}': {e}. Không có file đầu ra nào được ghi.")
+        return
+    os.replace(tmp_path, stream_path)
+
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(stream_path) / 1e6
+    logging.info(f"Hợp nhất hoàn tất: {rows_written:,} dòng, {len(output_schema)} cột, {size_mb:.1f}MB "
+                 f"trong {elapsed:.2f}s ({rows_written / max(elapsed, 1e-9):,.0f} dòng/s).")
+
+    if output_format == '.xlsx':
+        try:
+            pd.read_parquet(stream_path).to_excel(output_file, index=False)
+        except Exception as e:
+            logging.error(f"Lỗi khi lưu file đầu ra: {e}")
+            return
+        finally:
+            os.remove(stream_path)
+    logging.info(f"Đã lưu thành công file tại '{output_file}'")
+
+def upsert_files(input_dir: str, dataset_dir: str, pattern: str = DEFAULT_PATTERN, by_exchange: bool = False):
+    """
+    Upserts the statement parquet files matching a pattern into a
+    partitioned dataset instead of concatenating them: rows are matched on
+    their natural key, the newest scrape wins, and only the partitions the
+    inputs touch are rewritten (see statement_dataset.upsert_dataset).
+
+    Args:
+        input_dir (str): The path to the directory containing the files to merge.
+        dataset_dir (str): Root directory of the target dataset; created if missing.
+        pattern (str): Glob pattern of the input file names, without extension.
+        by_exchange (bool): Whether the dataset is also partitioned by exchange.
+    """
+    file_list = sorted(glob.glob(os.path.join(input_dir, f'{pattern}.parquet')))
+    if not file_list:
+        logging.warning(f"Không tìm thấy file nào khớp '{pattern}.parquet' trong thư mục '{input_dir}'")
+        return
+    logging.info(f"Tìm thấy {len(file_list)} file để upsert vào '{dataset_dir}'.")
+
+    start = time.perf_counter()
+    totals = {'partitions': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0}
+    # Mỗi lần chỉ giữ một file đầu vào và một phân vùng trong bộ nhớ
+    for f in tqdm(file_list, desc="Đang upsert"):
+        try:
+            stats = upsert_dataset(read_statements(f), dataset_dir, by_exchange=by_exchange)
+        except Exception as e:
+            logging.error(f"Lỗi khi upsert file '{f}': {e}")
+            continue # Bỏ qua file lỗi và tiếp tục
+        for name, count in stats.items():
+            totals[name] += count
+
+    elapsed = time.perf_counter() - start
+    rows = totals['inserted'] + totals['updated']
+    logging.info(f"Upsert hoàn tất trong {elapsed:.2f}s: {totals['partitions']} phân vùng được ghi lại, "
+                 f"{totals['inserted']:,} dòng mới, {totals['updated']:,} dòng cập nhật, "
+                 f"{totals['unchanged']:,} dòng giữ nguyên ({rows / max(elapsed, 1e-9):,.0f} dòng/s).")
 
 
 def main():
@@ -106,9 +322,46 @@ def main():
         choices=['parquet', 'csv'],
         help="Loại file cần tìm và hợp nhất trong thư mục đầu vào."
     )
+    parser.add_argument(
+        '--pattern',
+        type=str,
+        default=DEFAULT_PATTERN,
+        help="Mẫu tên file (không gồm đuôi) cần hợp nhất, để không lẫn các file phụ khác trong thư mục."
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="Số tiến trình đọc/giải mã file đầu vào song song (hữu ích với file CSV lớn)."
+    )
+    parser.add_argument(
+        '--mode',
+        type=str,
+        default='concat',
+        choices=['concat', 'upsert'],
+        help="concat: nối các file thành --output-file. upsert: cập nhật bộ dữ liệu phân vùng --dataset-dir "
+             "theo khóa tự nhiên (bản cào mới nhất được giữ), chỉ ghi lại các phân vùng bị ảnh hưởng."
+    )
+    parser.add_argument(
+        '--dataset-dir',
+        type=str,
+        default='merged_data/financial_statements',
+        help="Thư mục bộ dữ liệu phân vùng dùng cho --mode upsert."
+    )
+    parser.add_argument(
+        '--partition-by-exchange',
+        action='store_true',
+        help="Với --mode upsert: bộ dữ liệu được phân vùng thêm theo sàn."
+    )
 
     args = parser.parse_args()
-    merge_files(args.input_dir, args.output_file, args.file_type)
+    if args.mode == 'upsert':
+        if args.file_type != 'parquet':
+            parser.error("--mode upsert chỉ hỗ trợ file parquet.")
+        upsert_files(args.input_dir, args.dataset_dir, args.pattern, args.partition_by_exchange)
+    else:
+        merge_files(args.input_dir, args.output_file, args.file_type, args.pattern, workers=args.workers)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
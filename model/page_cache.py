@@ -0,0 +1,78 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+
+
+class PageCache:
+    """
+    On-disk cache of raw report pages.
+
+    Each entry is addressed by a hash of (symbol, report_type, period,
+    url_template) and stored as a gzip-compressed JSON document holding the
+    page HTML and the time it was fetched.
+    """
+
+    def __init__(self, cache_dir: str):
+        """
+        Args:
+            cache_dir (str): Root directory of the cache; created on demand.
+        """
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def make_key(symbol: str, report_type: str, period, url_template: str) -> str:
+        """Returns the content address of one page."""
+        raw = "|".join([symbol.upper(), report_type, str(period), url_template])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def get(self, symbol: str, report_type: str, period, url_template: str,
+            max_age: float | None = None) -> str | None:
+        """
+        Returns the cached HTML of a page, or None on a miss.
+
+        Args:
+            max_age (float | None): Maximum entry age in seconds. None means
+                                    the entry never expires.
+        """
+        entry = self.get_entry(symbol, report_type, period, url_template, max_age=max_age)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, symbol: str, report_type: str, period, url_template: str,
+                  max_age: float | None = None) -> tuple[str, float] | None:
+        """Like get, but returns the HTML together with the time (epoch seconds) it was fetched."""
+        path = self._path(self.make_key(symbol, report_type, period, url_template))
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.debug(f"Ignoring unreadable cache entry {path}. Error: {e}")
+            return None
+        if max_age is not None and time.time() - entry['fetched_at'] > max_age:
+            return None
+        return entry['html'], entry['fetched_at']
+
+    def put(self, symbol: str, report_type: str, period, url_template: str, html: str) -> None:
+        """Stores a page, replacing any previous entry atomically."""
+        path = self._path(self.make_key(symbol, report_type, period, url_template))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            'symbol': symbol.upper(),
+            'report_type': report_type,
+            'period': str(period),
+            'url_template': url_template,
+            'fetched_at': time.time(),
+            'html': html,
+        }
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
@@ -0,0 +1,123 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+
+
+class AdaptiveRateLimiter:
+    """
+    Token-bucket rate limiter with an AIMD-controlled concurrency limit.
+
+    Every request takes a token (refilled at `rate` per second) and a
+    concurrency slot. Outcomes are evaluated in windows of `window` requests:
+    a healthy window (low error rate, average latency under target) raises
+    rate and concurrency additively; an unhealthy one, or any throttling
+    response, halves them. Usable from threads (`acquire`) and from asyncio
+    (`acquire_async`).
+    """
+
+    def __init__(self, rate: float, concurrency: int, min_rate: float = 0.5, max_rate: float = 50.0,
+                 min_concurrency: int = 1, max_concurrency: int = 64, target_latency: float = 3.0,
+                 max_error_rate: float = 0.1, window: int = 20, rate_step: float = 1.0):
+        """
+        Args:
+            rate (float): Initial requests per second.
+            concurrency (int): Initial number of requests allowed in flight.
+            min_rate, max_rate (float): Bounds of the adaptive rate.
+            min_concurrency, max_concurrency (int): Bounds of the adaptive concurrency.
+            target_latency (float): Average latency (seconds) above which the host is considered slow.
+            max_error_rate (float): Error share of a window above which the host is considered unhealthy.
+            window (int): Number of outcomes per evaluation.
+            rate_step (float): Additive rate increase after a healthy window.
+        """
+        self.rate = rate
+        self.concurrency = concurrency
+        self.min_rate, self.max_rate = min_rate, max_rate
+        self.min_concurrency, self.max_concurrency = min_concurrency, max_concurrency
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.rate_step = rate_step
+
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._latencies = []
+        self._errors = 0
+        self._last_decrease = 0.0
+
+    def try_acquire(self) -> float:
+        """
+        Takes a token and a slot if both are available.
+        Returns 0 on success, otherwise the number of seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            burst = max(1.0, self.rate)
+            self._tokens = min(burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self._in_flight >= self.concurrency:
+                return 0.05
+            if self._tokens < 1.0:
+                return (1.0 - self._tokens) / self.rate
+            self._tokens -= 1.0
+            self._in_flight += 1
+            return 0.0
+
+    def acquire(self) -> None:
+        """Blocks the calling thread until a request may be sent."""
+        while (wait := self.try_acquire()) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """Waits, without blocking the event loop, until a request may be sent."""
+        while (wait := self.try_acquire()) > 0:
+            await asyncio.sleep(wait)
+
+    def release(self, latency: float, ok: bool, throttled: bool = False) -> None:
+        """
+        Returns the slot taken by `acquire` and records the request outcome.
+
+        Args:
+            latency (float): Wall time of the request in seconds.
+            ok (bool): Whether the request succeeded.
+            throttled (bool): Whether the server explicitly asked to slow down (429/503).
+        """
+        with self._lock:
+            self._in_flight -= 1
+            self._latencies.append(latency)
+            self._errors += 0 if ok else 1
+            if throttled:
+                self._decrease("throttled by server")
+            elif len(self._latencies) >= self.window:
+                error_rate = self._errors / len(self._latencies)
+                avg_latency = sum(self._latencies) / len(self._latencies)
+                if error_rate > self.max_error_rate:
+                    self._decrease(f"error rate {error_rate:.0%}")
+                elif avg_latency > self.target_latency:
+                    self._decrease(f"average latency {avg_latency:.2f}s")
+                else:
+                    self.rate = min(self.max_rate, self.rate + self.rate_step)
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                    self._reset_window()
+
+    def _decrease(self, reason: str) -> None:
+        # Giảm tối đa một lần mỗi target_latency giây để một loạt lỗi không kéo tốc độ về mức tối thiểu
+        now = time.monotonic()
+        if now - self._last_decrease >= self.target_latency:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+            self._last_decrease = now
+            logging.debug(f"Backing off ({reason}): rate={self.rate:.1f}/s, concurrency={self.concurrency}")
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self._latencies = []
+        self._errors = 0
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (0-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
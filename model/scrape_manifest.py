@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import logging
+import threading
+
+
+class ScrapeManifest:
+    """
+    Records which (symbol, report_type) pairs a scraping run has finished,
+    for which periods, and where their shard was written.
+
+    The manifest is an append-only JSON Lines log: every finished pair adds
+    one line, so progress survives a crash at any point and an interrupted
+    run can be resumed. Later lines override earlier ones on load.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Location of the manifest file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, start=1):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Dòng cuối có thể bị ghi dở nếu tiến trình bị dừng đột ngột
+                    logging.warning(f"Skipping malformed line {line_no} of manifest {self.path}")
+                    continue
+                self._entries.setdefault(entry['symbol'], {})[entry['report_type']] = entry
+
+    def is_done(self, symbol: str, report_type: str, periods: list) -> bool:
+        """True if every requested period of this report type is already done."""
+        with self._lock:
+            entry = self._entries.get(symbol, {}).get(report_type)
+        return entry is not None and set(map(str, periods)) <= set(entry['periods'])
+
+    def pending_report_types(self, symbol: str, report_types: list[str], periods: list) -> list[str]:
+        """Filters report_types down to those not yet done for the symbol."""
+        return [rt for rt in report_types if not self.is_done(symbol, rt, periods)]
+
+    def mark_done(self, symbol: str, report_type: str, periods: list, shard_path: str | None) -> None:
+        """Records a finished (symbol, report_type) and appends it to the log."""
+        entry = {
+            'symbol': symbol,
+            'report_type': report_type,
+            'periods': sorted(map(str, periods)),
+            'shard': shard_path,
+            'updated_at': time.time(),
+        }
+        with self._lock:
+            self._entries.setdefault(symbol, {})[report_type] = entry
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def shard_paths(self, symbols: list[str], report_types: list[str]) -> list[str]:
+        """Returns the existing shards of the given symbols and report types."""
+        with self._lock:
+            paths = [
+                self._entries.get(symbol, {}).get(rt, {}).get('shard')
+                for symbol in symbols
+                for rt in report_types
+            ]
+        return [path for path in paths if path and os.path.exists(path)]
+
+    def clear(self) -> None:
+        """Forgets all finished work, e.g. at the start of a fresh run."""
+        with self._lock:
+            self._entries = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class DeadLetterLog:
+    """
+    Append-only JSON Lines log of pages that failed permanently (retries
+    exhausted or a non-retryable HTTP error), so they can be retried later.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, entries: list[dict]) -> None:
+        if not entries:
+            return
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def load(self) -> list[dict]:
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries
+
+    def clear(self) -> None:
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from statement_dataset import read_dataset
+
+# ==============================================================================
+# CUBE LAYOUT
+# ==============================================================================
+# Dạng "rộng" của BCTC: mảng float64 đặc công ty x kỳ x chỉ tiêu (NaN nếu không có số liệu),
+# lưu dạng .npy để đọc bằng memory-map, kèm 3 file chỉ mục (sidecar) cho 3 trục:
+#   values.npy        mảng (n_companies, n_periods, n_accounts), thứ tự C: một công ty nằm liền một khối
+#   companies.parquet company_code, exchange, company_name, industry (dòng i = công ty i)
+#   periods.parquet   report_date, quarter, tăng dần
+#   accounts.parquet  report_type, account, occurrence, account_vi, account_en
+#   cube.json         kích thước và thời điểm tạo; được ghi sau cùng nên đánh dấu một bản ghi hoàn chỉnh
+# Một mã chỉ tiêu có thể lặp lại trong cùng báo cáo (vd: 'inventories' cho cả mục IV và dòng 1,
+# 'inv_property_cost' dưới từng loại TSCĐ); mỗi lần xuất hiện là một vị trí riêng trên trục chỉ tiêu
+# (occurrence = 0, 1, ...), nên không có dòng nào bị gộp hay làm hỏng phép pivot.
+VALUES_FILENAME = 'values.npy'
+COMPANIES_FILENAME = 'companies.parquet'
+PERIODS_FILENAME = 'periods.parquet'
+ACCOUNTS_FILENAME = 'accounts.parquet'
+META_FILENAME = 'cube.json'
+COMPANY_COLUMNS = ['company_code', 'exchange', 'company_name', 'industry']
+ACCOUNT_COLUMNS = ['report_type', 'account', 'occurrence', 'account_vi', 'account_en']
+CUBE_INPUT_COLUMNS = COMPANY_COLUMNS + ['report_type', 'report_date', 'quarter', 'account', 'value',
+                                       'account_vi', 'account_en']
+
+
+class StatementCube:
+    """
+    Dense company x period x account statement values and their axis labels.
+    `values` is a read-only memory map when read with read_cube, so slices
+    are views into the file and cost nothing until touched. Axis positions
+    are looked up in dictionaries built once, so a company or account slice
+    takes microseconds.
+    """
+
+    def __init__(self, values: np.ndarray, companies: pd.DataFrame, periods: pd.DataFrame, accounts: pd.DataFrame):
+        """
+        Args:
+            values (np.ndarray): float64 array of shape (companies, periods, accounts), NaN where not reported.
+            companies (pd.DataFrame): COMPANY_COLUMNS, row i describing values[i].
+            periods (pd.DataFrame): report_date and quarter, ascending.
+            accounts (pd.DataFrame): ACCOUNT_COLUMNS, grouped by report type in statement order.
+        """
+        self.values = values
+        self.companies = companies
+        self.periods = periods
+        self.accounts = accounts
+        self._company_positions = {code: i for i, code in enumerate(companies['company_code'])}
+        self._account_positions = {}
+        keys = zip(accounts['report_type'], accounts['account'], accounts['occurrence'])
+        for i, (report_type, account, occurrence) in enumerate(keys):
+            self._account_positions[(report_type, account, int(occurrence))] = i
+            # Không chỉ rõ loại báo cáo: lấy loại báo cáo đầu tiên có mã này
+            self._account_positions.setdefault((None, account, int(occurrence)), i)
+
+    def company_index(self, company_code: str) -> int:
+        """Position of a company on the company axis; KeyError if absent."""
+        return self._company_positions[company_code]
+
+    def account_index(self, account: str, report_type: str | None = None, occurrence: int = 0) -> int:
+        """
+        Position of an account code on the account axis; the first report
+        type that has it unless report_type is given. KeyError if absent.
+        """
+        return self._account_positions[(report_type, account, occurrence)]
+
+    def company(self, company_code: str) -> pd.DataFrame:
+        """Periods x accounts values of one company (a view of one contiguous block of the cube)."""
+        return pd.DataFrame(self.values[self.company_index(company_code)], index=self._period_labels(),
+                            columns=self._account_labels(), copy=False)
+
+    def account(self, account: str, report_type: str | None = None, occurrence: int = 0) -> pd.DataFrame:
+        """Companies x periods values of one account, e.g. cube.account('net_rev')."""
+        return pd.DataFrame(self.values[:, :, self.account_index(account, report_type, occurrence)],
+                            index=pd.Index(self.companies['company_code'], name='company_code'),
+                            columns=self._period_labels(), copy=False)
+
+    def first_reported(self, accounts: list[str], report_types: list[str] | None = None) -> np.ndarray:
+        """
+        Companies x periods x accounts values of the given account codes.
+        A code reported more than once is taken from its first position in
+        report_types priority order, then statement order: e.g.
+        'profit_before_tax' from the income statement rather than the cash
+        flow statement, and 'inventories' from the section total, or its
+        first line where the total is missing. Report types not in
+        report_types come last, in account-axis order. Codes absent from
+        the cube give NaN.
+
+        Args:
+            accounts (list[str]): Account codes to select.
+            report_types (list[str] | None): Report types in priority order.
+
+        Returns:
+            np.ndarray: float64 array of shape (n_companies, n_periods, len(accounts)).
+        """
+        priority = {report_type: rank for rank, report_type in enumerate(report_types or [])}
+        ranks = [priority.get(report_type, len(priority)) for report_type in self.accounts['report_type']]
+        positions = {}
+        for i in sorted(range(len(ranks)), key=lambda i: (ranks[i], i)):
+            positions.setdefault(self.accounts['account'].iat[i], []).append(i)
+        selected = np.full(self.values.shape[:2] + (len(accounts),), np.nan)
+        for j, account in enumerate(accounts):
+            for i in positions.get(account, []):
+                missing = np.isnan(selected[:, :, j])
+                selected[:, :, j][missing] = self.values[:, :, i][missing]
+        return selected
+
+    def _period_labels(self) -> pd.MultiIndex:
+        return pd.MultiIndex.from_frame(self.periods)
+
+    def _account_labels(self) -> pd.MultiIndex:
+        return pd.MultiIndex.from_frame(self.accounts[['report_type', 'account', 'occurrence']])
+
+
+# ==============================================================================
+# BUILD - DẠNG DÀI -> CUBE
+# ==============================================================================
+def _factorize(column) -> tuple[np.ndarray, pd.Index]:
+    codes, labels = pd.factorize(column, sort=True)
+    return codes, pd.Index(labels)
+
+def _category_codes(column: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Integer codes (-1 for missing) and categories of a column, without materialising its strings."""
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype('category')
+    return column.cat.codes.to_numpy().astype(np.int64), column.cat.categories
+
+def _take_labels(column: pd.Series, rows: np.ndarray) -> list:
+    """The column values of a few rows as Python strings (None if missing)."""
+    codes, categories = _category_codes(column)
+    return [categories[code] if code >= 0 else None for code in codes[rows]]
+
+def build_cube(df: pd.DataFrame) -> StatementCube:
+    """
+    Pivots long-format statements once into a dense cube. Rows without an
+    account code (labels missing from account_mapping.json) are left out.
+    Works on integer codes only: strings are only looked up for the axis labels.
+
+    Args:
+        df (pd.DataFrame): Statement rows with at least CUBE_INPUT_COLUMNS, in
+            file order (so repeated account codes keep their statement order).
+    """
+    df = df[df['account'].notna()]
+    company_codes, company_labels = _factorize(df['company_code'])
+    period_keys = df['report_date'].to_numpy(dtype=np.int64) * 10 + df['quarter'].to_numpy(dtype=np.int64)
+    period_codes, period_labels = _factorize(period_keys)
+    report_type_codes, report_types = _category_codes(df['report_type'])
+    account_category_codes, account_categories = _category_codes(df['account'])
+    # Mã chỉ tiêu trong account_mapping.json có thể có khoảng trắng thừa (vd: 'interest_expense ')
+    name_codes, account_names = pd.factorize(account_categories.astype(str).str.strip())
+    account_name_codes = name_codes[account_category_codes]
+
+    # Lần xuất hiện thứ mấy của mã chỉ tiêu trong cùng (công ty, báo cáo, kỳ)
+    n_report_types, n_names = len(report_types), len(account_names)
+    cell_keys = ((company_codes * len(period_labels) + period_codes) * n_report_types
+                 + report_type_codes) * n_names + account_name_codes
+    occurrence = pd.Series(cell_keys).groupby(cell_keys, sort=False).cumcount().to_numpy()
+
+    # Trục chỉ tiêu theo loại báo cáo, trong mỗi loại theo thứ tự xuất hiện (thứ tự trên BCTC)
+    n_occurrences = int(occurrence.max()) + 1 if len(occurrence) else 1
+    account_keys = (report_type_codes * n_names + account_name_codes) * n_occurrences + occurrence
+    account_codes, axis_keys = pd.factorize(account_keys)
+    axis_report_types = axis_keys // n_occurrences // n_names
+    order = np.argsort(axis_report_types, kind='stable')
+    axis_keys = axis_keys[order]
+    account_codes = np.argsort(order)[account_codes]
+    first_rows = pd.Series(np.arange(len(df))).groupby(account_codes).first().to_numpy()
+    accounts = pd.DataFrame({
+        'report_type': report_types[axis_keys // n_occurrences // n_names].astype(str),
+        'account': account_names[(axis_keys // n_occurrences) % n_names].astype(str),
+        'occurrence': (axis_keys % n_occurrences).astype(np.int16),
+        'account_vi': _take_labels(df['account_vi'], first_rows),
+        'account_en': _take_labels(df['account_en'], first_rows),
+    })
+
+    shape = (len(company_labels), len(period_labels), len(accounts))
+    values = np.full(shape, np.nan)
+    values[company_codes, period_codes, account_codes] = df['value'].to_numpy(dtype=float)
+
+    first_company_rows = pd.Series(np.arange(len(df))).groupby(company_codes).first().to_numpy()
+    companies = pd.DataFrame({column: _take_labels(df[column], first_company_rows) for column in COMPANY_COLUMNS})
+    periods = pd.DataFrame({'report_date': (period_labels.to_numpy() // 10).astype(np.int16),
+                            'quarter': (period_labels.to_numpy() % 10).astype(np.int8)})
+    return StatementCube(values, companies, periods, accounts)
+
+
+# ==============================================================================
+# STORAGE
+# ==============================================================================
+def _replace(path: str, write) -> None:
+    """Writes a cube file next to its final path, then swaps it in (open memory maps keep the old file)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def write_cube(cube: StatementCube, directory: str) -> None:
+    """
+    Writes the cube to a directory: values.npy plus the three axis sidecars,
+    and cube.json last so readers never pick up a half-written cube.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    def write_values(path):
+        with open(path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(cube.values, dtype=np.float64))
+
+    _replace(os.path.join(directory, VALUES_FILENAME), write_values)
+    for filename, frame in [(COMPANIES_FILENAME, cube.companies), (PERIODS_FILENAME, cube.periods),
+                            (ACCOUNTS_FILENAME, cube.accounts)]:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        _replace(os.path.join(directory, filename), lambda path: pq.write_table(table, path))
+    meta = {'shape': list(cube.values.shape), 'created_at': time.time()}
+
+    def write_meta(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    _replace(os.path.join(directory, META_FILENAME), write_meta)
+
+def read_cube(directory: str, mmap: bool = True) -> StatementCube:
+    """
+    Reads a cube written by write_cube. With mmap (the default) the values
+    are memory-mapped read-only: opening is instant and only the pages of
+    the slices actually used are read from disk.
+    """
+    values = np.load(os.path.join(directory, VALUES_FILENAME), mmap_mode='r' if mmap else None)
+    return StatementCube(
+        values,
+        pd.read_parquet(os.path.join(directory, COMPANIES_FILENAME)),
+        pd.read_parquet(os.path.join(directory, PERIODS_FILENAME)),
+        pd.read_parquet(os.path.join(directory, ACCOUNTS_FILENAME)),
+    )
+
+def load_statements(source: str) -> pd.DataFrame:
+    """Reads the columns needed for the cube from a statement parquet file or partitioned dataset."""
+    if os.path.isdir(source):
+        return read_dataset(source, columns=CUBE_INPUT_COLUMNS)
+    return pd.read_parquet(source, columns=CUBE_INPUT_COLUMNS)
+
+
+# ==============================================================================
+# MAIN EXECUTION
+# ==============================================================================
+def main():
+    """Builds the dense statement cube from a statement file or dataset."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Write long-format financial statements as a dense, memory-mappable cube.")
+    parser.add_argument('--input', default='../apps/data/Financial_Statement__Full_Company_L10Y.parquet',
+                        help="Statement parquet file or partitioned dataset directory.")
+    parser.add_argument('--output', default='../apps/data/statement_cube', help="Cube directory.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    cube = build_cube(load_statements(args.input))
+    write_cube(cube, args.output)
+    n_companies, n_periods, n_accounts = cube.values.shape
+    logging.info(f"Saved a {n_companies} companies x {n_periods} periods x {n_accounts} accounts cube "
+                 f"({cube.values.nbytes / 1e6:.1f}MB) to {args.output} in {time.perf_counter() - started:.2f}s.")
+
+if __name__ == "__main__":
+    main()
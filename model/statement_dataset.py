@@ -0,0 +1,257 @@
+import os
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from statement_schema import STATEMENT_SCHEMA, SORT_COLUMNS, COMPRESSION, apply_schema
+
+# ==============================================================================
+# DATASET LAYOUT
+# ==============================================================================
+# Bộ dữ liệu được chia thư mục kiểu Hive: report_type=.../report_date=.../[exchange=...]/part-0.parquet
+# Bộ lọc theo loại báo cáo/năm/sàn loại bỏ cả thư mục; bộ lọc theo mã CK, ngành
+# loại bỏ row group nhờ min/max thống kê (dữ liệu trong mỗi phân vùng được sắp theo mã CK).
+PARTITION_COLUMNS = ['report_type', 'report_date']
+EXCHANGE_PARTITION = 'exchange'
+# Thư mục của các dòng có giá trị phân vùng trống (vd: mã CK chưa có sàn): exchange=__HIVE_DEFAULT_PARTITION__
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+# Row group nhỏ để đọc một mã CK chỉ chạm vài chục KB mỗi phân vùng
+DATASET_ROW_GROUP_SIZE = 8 * 1024
+
+# Trong file, các cột chuỗi được ghi dạng string thường: Parquet tự mã hóa dictionary theo
+# từng row group với đúng các giá trị xuất hiện, thay vì lặp lại cả từ điển ở mỗi row group.
+DATASET_SCHEMA = pa.schema([
+    pa.field(field.name, pa.string(), nullable=field.nullable) if pa.types.is_dictionary(field.type) else field
+    for field in STATEMENT_SCHEMA
+])
+
+
+def partition_columns(by_exchange: bool = False) -> list[str]:
+    """Returns the partition columns of the dataset, outermost first."""
+    return PARTITION_COLUMNS + ([EXCHANGE_PARTITION] if by_exchange else [])
+
+def dataset_partitioning(columns: list[str]) -> ds.Partitioning:
+    """The Hive partitioning of the dataset over the given partition columns."""
+    return ds.HivePartitioning(pa.schema([DATASET_SCHEMA.field(column) for column in columns]),
+                               null_fallback=NULL_PARTITION)
+
+def detect_partition_columns(root: str) -> list[str]:
+    """Reads the partition columns of an existing dataset from its directory names."""
+    columns = []
+    path = root
+    while True:
+        subdirs = sorted(name for name in os.listdir(path)
+                         if '=' in name and os.path.isdir(os.path.join(path, name)))
+        if not subdirs:
+            return columns
+        columns.append(subdirs[0].split('=', 1)[0])
+        path = os.path.join(path, subdirs[0])
+
+def check_partitioning(root: str, by_exchange: bool = False) -> list[str]:
+    """
+    Returns the partition columns of an existing dataset ([] if there is
+    none yet). Raises ValueError if they differ from the requested layout,
+    so callers can check before doing any work.
+    """
+    existing_columns = detect_partition_columns(root) if os.path.isdir(root) else []
+    columns = partition_columns(by_exchange)
+    if existing_columns and existing_columns != columns:
+        raise ValueError(f"Dataset {root} is partitioned by {existing_columns}, not {columns}.")
+    return existing_columns
+
+
+# ==============================================================================
+# WRITER
+# ==============================================================================
+def write_dataset(df: pd.DataFrame, root: str, by_exchange: bool = False,
+                  row_group_size: int = DATASET_ROW_GROUP_SIZE) -> None:
+    """
+    Writes financial statements as a Hive-partitioned parquet dataset.
+
+    Only the partitions present in df are replaced; every other partition
+    of an existing dataset is left untouched, so runs over a single report
+    type or a few years can share one dataset.
+
+    Args:
+        df (pd.DataFrame): The rows to write.
+        root (str): Root directory of the dataset.
+        by_exchange (bool): Also partition by exchange below report_type/report_date.
+        row_group_size (int): Maximum number of rows per row group.
+    """
+    columns = partition_columns(by_exchange)
+    check_partitioning(root, by_exchange)
+
+    df = apply_schema(df).sort_values(by=columns + SORT_COLUMNS, kind='stable')
+    table = pa.Table.from_pandas(df, preserve_index=False).cast(DATASET_SCHEMA)
+    ds.write_dataset(
+        table, root,
+        format='parquet',
+        partitioning=dataset_partitioning(columns),
+        basename_template='part-{i}.parquet',
+        existing_data_behavior='delete_matching',
+        max_rows_per_group=row_group_size,
+        min_rows_per_group=min(row_group_size, 1024),
+        file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSION),
+    )
+    logging.debug(f"Wrote {len(df):,} rows to dataset {root} partitioned by {'/'.join(columns)}.")
+
+
+# ==============================================================================
+# READER
+# ==============================================================================
+def open_dataset(source: str) -> ds.Dataset:
+    """
+    Opens a partitioned dataset directory, or a single statement parquet
+    file, with the dataset schema.
+    """
+    if os.path.isdir(source):
+        return ds.dataset(source, format='parquet', schema=DATASET_SCHEMA,
+                          partitioning=dataset_partitioning(detect_partition_columns(source)))
+    return ds.dataset(source, format='parquet', schema=DATASET_SCHEMA)
+
+def build_filter(report_types: list[str] | None = None, year_range: tuple[int, int] | None = None,
+                 exchanges: list[str] | None = None, industries: list[str] | None = None,
+                 companies: list[str] | None = None, quarters: list[int] | None = None) -> ds.Expression | None:
+    """
+    Builds a dataset filter expression. Empty or None arguments do not filter.
+
+    Args:
+        year_range (tuple[int, int] | None): Inclusive (first, last) report year.
+    """
+    conditions = []
+    for column, values in [('report_type', report_types), ('exchange', exchanges), ('industry', industries),
+                           ('company_code', companies), ('quarter', quarters)]:
+        if values:
+            conditions.append(pc.field(column).isin(list(values)))
+    if year_range is not None:
+        conditions.append((pc.field('report_date') >= year_range[0]) & (pc.field('report_date') <= year_range[1]))
+    if not conditions:
+        return None
+    expression = conditions[0]
+    for condition in conditions[1:]:
+        expression = expression & condition
+    return expression
+
+def read_dataset(source: str, columns: list[str] | None = None, **filters) -> pd.DataFrame:
+    """
+    Reads financial statements with the filters pushed down to partition
+    and row-group pruning, so only the matching fragments are read.
+
+    Args:
+        source (str): A dataset directory or a single statement parquet file.
+        columns (list[str] | None): Columns to read; all by default.
+        **filters: Keyword arguments of build_filter.
+
+    Returns:
+        pd.DataFrame: The matching rows, with the statement schema dtypes.
+    """
+    table = open_dataset(source).to_table(columns=columns, filter=build_filter(**filters))
+    # Trả lại kiểu dictionary (category) cho các cột chuỗi như trong STATEMENT_SCHEMA
+    table = table.cast(pa.schema([STATEMENT_SCHEMA.field(name) for name in table.column_names]))
+    return table.to_pandas()
+
+
+# ==============================================================================
+# UPSERT
+# ==============================================================================
+# Khóa tự nhiên của một dòng. account_vi được dùng thay cho account vì account trống với các
+# chỉ tiêu chưa ánh xạ và nhiều nhãn khác nhau có thể ánh xạ về cùng một account. Một nhãn còn
+# có thể lặp lại trong cùng báo cáo (vd: "- Nguyên giá" dưới TSCĐ hữu hình, thuê tài chính, vô hình),
+# nên thứ tự xuất hiện của nhãn (account_seq) cũng là một phần của khóa.
+NATURAL_KEY = ['company_code', 'report_type', 'report_date', 'quarter', 'account_vi']
+
+
+def _partition_filter(partition: dict) -> ds.Expression:
+    """Selects exactly one partition; a null value selects its NULL_PARTITION directory."""
+    expression = None
+    for column, value in partition.items():
+        condition = pc.field(column).is_null() if pd.isna(value) else pc.field(column) == value
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def upsert_rows(existing_df: pd.DataFrame, incoming_df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """
+    Upserts incoming rows into existing ones. Rows are matched on NATURAL_KEY
+    plus the label's occurrence within its report; of two matching rows the
+    one with the newer scraped_at wins, the incoming one on a tie (e.g. when
+    neither has a timestamp). An updated row keeps the position of the row
+    it replaces, so statements stay in their original line order.
+
+    Returns:
+        tuple[pd.DataFrame, dict]: The merged rows and the number of
+        'inserted', 'updated' and 'unchanged' rows.
+    """
+    combined = pd.concat([apply_schema(existing_df).assign(_source=0),
+                          apply_schema(incoming_df).assign(_source=1)], ignore_index=True)
+    combined['account_seq'] = combined.groupby(NATURAL_KEY + ['_source'], dropna=False, observed=True).cumcount()
+    key = NATURAL_KEY + ['account_seq']
+    combined['_row'] = np.arange(len(combined))
+    combined['_position'] = combined.groupby(key, dropna=False, observed=True)['_row'].transform('min')
+    matched = combined.duplicated(subset=key, keep=False)
+
+    winners = combined.sort_values(by=['scraped_at', '_source'], na_position='first', kind='stable')
+    winners = winners.drop_duplicates(subset=key, keep='last').sort_values(by='_position')
+    from_incoming = winners['_source'] == 1
+    counts = {
+        'inserted': int((from_incoming & ~matched[winners.index]).sum()),
+        'updated': int((from_incoming & matched[winners.index]).sum()),
+        'unchanged': int((~from_incoming).sum()),
+    }
+    return apply_schema(winners), counts
+
+def upsert_dataset(incoming_df: pd.DataFrame, root: str, by_exchange: bool = False) -> dict:
+    """
+    Upserts rows into a partitioned dataset (see upsert_rows). Only the
+    partitions the incoming rows fall into are read and rewritten, one at a
+    time, so the cost is proportional to the new data, not the history.
+
+    Args:
+        incoming_df (pd.DataFrame): The new rows.
+        root (str): Root directory of the dataset; created if missing.
+        by_exchange (bool): Whether the dataset is also partitioned by exchange.
+
+    Returns:
+        dict: Number of rewritten 'partitions' and 'inserted', 'updated' and 'unchanged' rows.
+    """
+    columns = partition_columns(by_exchange)
+    existing_columns = check_partitioning(root, by_exchange)
+
+    stats = {'partitions': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0}
+    # dropna=False: các dòng không có sàn được upsert vào phân vùng NULL_PARTITION thay vì bị bỏ qua
+    for values, partition_df in apply_schema(incoming_df).groupby(columns, dropna=False, observed=True):
+        if existing_columns:
+            table = open_dataset(root).to_table(filter=_partition_filter(dict(zip(columns, values))))
+            existing_df = table.cast(STATEMENT_SCHEMA).to_pandas()
+        else:
+            existing_df = partition_df.iloc[0:0]
+        merged_df, counts = upsert_rows(existing_df, partition_df)
+        write_dataset(merged_df, root, by_exchange=by_exchange)
+        existing_columns = columns
+        stats['partitions'] += 1
+        for name, count in counts.items():
+            stats[name] += count
+    logging.info(f"Upserted into {root}: {stats['partitions']} partitions rewritten, {stats['inserted']:,} rows "
+                 f"inserted, {stats['updated']:,} updated, {stats['unchanged']:,} unchanged.")
+    return stats
+
+
+# ==============================================================================
+# MAIN EXECUTION
+# ==============================================================================
+def main():
+    """Converts a statement parquet file into a partitioned dataset."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Write a financial statement parquet file as a Hive-partitioned dataset.")
+    parser.add_argument('input', help="Statement parquet file.")
+    parser.add_argument('output', help="Root directory of the dataset.")
+    parser.add_argument('--by-exchange', action='store_true', help="Also partition by exchange.")
+    args = parser.parse_args()
+
+    write_dataset(pq.read_table(args.input).to_pandas(), args.output, by_exchange=args.by_exchange)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ==============================================================================
+# SCHEMA
+# ==============================================================================
+# Các cột chuỗi lặp lại nhiều lần (mã CK, ngành, chỉ tiêu...) được lưu dạng dictionary:
+# mỗi giá trị chỉ lưu một lần, từng dòng chỉ giữ một mã số nguyên.
+CATEGORY_COLUMNS = ['company_code', 'exchange', 'company_name', 'industry', 'report_type',
+                    'account', 'account_vi', 'account_en']
+STATEMENT_COLUMNS = ['company_code', 'exchange', 'company_name', 'industry', 'report_type',
+                     'report_date', 'quarter', 'account', 'value', 'account_vi', 'account_en', 'scraped_at']
+SORT_COLUMNS = ['company_code', 'report_type', 'report_date', 'quarter']
+
+_DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+STATEMENT_SCHEMA = pa.schema([
+    pa.field('company_code', _DICTIONARY_STRING, nullable=False),
+    pa.field('exchange', _DICTIONARY_STRING),
+    pa.field('company_name', _DICTIONARY_STRING),
+    pa.field('industry', _DICTIONARY_STRING),
+    pa.field('report_type', _DICTIONARY_STRING, nullable=False),
+    pa.field('report_date', pa.int16(), nullable=False),  # Năm tài chính
+    pa.field('quarter', pa.int8(), nullable=False),       # 1-4 cho báo cáo quý, 0 cho báo cáo năm
+    pa.field('account', _DICTIONARY_STRING),
+    pa.field('value', pa.float64()),
+    pa.field('account_vi', _DICTIONARY_STRING),
+    pa.field('account_en', _DICTIONARY_STRING),
+    pa.field('scraped_at', pa.timestamp('ms', tz='UTC')),  # Thời điểm cào; trống với dữ liệu cũ
+])
+
+# Khoảng 512k dòng mỗi row group: file nhỏ hơn ~10% so với 128k nhưng vẫn đủ nhỏ
+# để đọc theo bộ lọc mà không phải giải nén cả file.
+ROW_GROUP_SIZE = 512 * 1024
+COMPRESSION = 'zstd'
+
+
+# ==============================================================================
+# HELPERS
+# ==============================================================================
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Casts a financial statement DataFrame to the storage schema: categorical
+    string columns, an int16 report_date year, an int8 quarter (0 = annual,
+    added if missing), a float64 value and a UTC scraped_at timestamp (NaT
+    if missing). Also upgrades files written before the schema existed,
+    where every column but value is a string.
+
+    Args:
+        df (pd.DataFrame): Rows with at least the STATEMENT_COLUMNS except 'quarter' and 'scraped_at'.
+
+    Returns:
+        pd.DataFrame: A copy with exactly STATEMENT_COLUMNS, in order.
+    """
+    df = df.copy()
+    if 'quarter' not in df.columns:
+        df['quarter'] = 0
+    if 'scraped_at' not in df.columns:
+        df['scraped_at'] = pd.NaT
+    df['report_date'] = pd.to_numeric(df['report_date'], errors='raise').astype('int16')
+    df['quarter'] = pd.to_numeric(df['quarter'], errors='raise').astype('int8')
+    df['value'] = pd.to_numeric(df['value'], errors='coerce').astype('float64')
+    df['scraped_at'] = pd.to_datetime(df['scraped_at'], utc=True).astype('datetime64[ms, UTC]')
+    for column in CATEGORY_COLUMNS:
+        if not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df[STATEMENT_COLUMNS]
+
+def conform_table(table: pa.Table) -> pa.Table:
+    """
+    Arrow counterpart of apply_schema, for streaming: casts a table (or a
+    batch read from a statement file, old or new) to STATEMENT_SCHEMA,
+    adding the quarter column as 0 (annual) and scraped_at as null when
+    they are missing.
+    """
+    if isinstance(table, pa.RecordBatch):
+        table = pa.Table.from_batches([table])
+    if 'quarter' not in table.column_names:
+        table = table.append_column('quarter', pa.array(np.zeros(table.num_rows, dtype=np.int8)))
+    if 'scraped_at' not in table.column_names:
+        table = table.append_column('scraped_at', pa.nulls(table.num_rows, STATEMENT_SCHEMA.field('scraped_at').type))
+    return table.select(STATEMENT_SCHEMA.names).cast(STATEMENT_SCHEMA)
+
+def write_statements(df: pd.DataFrame, path: str, row_group_size: int = ROW_GROUP_SIZE) -> None:
+    """
+    Writes financial statements to parquet with STATEMENT_SCHEMA, sorted by
+    company, report type and period so that dictionary codes form long runs.
+
+    Args:
+        df (pd.DataFrame): The rows to write.
+        path (str): Output parquet path.
+        row_group_size (int): Maximum number of rows per row group.
+    """
+    df = apply_schema(df).sort_values(by=SORT_COLUMNS, kind='stable')
+    table = pa.Table.from_pandas(df, schema=STATEMENT_SCHEMA, preserve_index=False)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    pq.write_table(table, path, row_group_size=row_group_size, compression=COMPRESSION)
+
+def read_statements(path: str) -> pd.DataFrame:
+    """
+    Reads a financial statement parquet file with the schema dtypes. Files
+    written before the schema existed are upgraded on the fly.
+    """
+    return apply_schema(pd.read_parquet(path))
+
+
+# ==============================================================================
+# MAIN EXECUTION
+# ==============================================================================
+def main():
+    """Rewrites existing statement parquet files with the typed schema."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Convert financial statement parquet files to the typed storage schema.")
+    parser.add_argument('paths', nargs='+', help="Parquet files to convert.")
+    parser.add_argument('--output-dir', type=str, default=None,
+                        help="Write the converted files here instead of replacing them in place.")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        legacy_df = pd.read_parquet(path)
+        legacy_size, legacy_memory = os.path.getsize(path), legacy_df.memory_usage(deep=True).sum()
+        output_path = os.path.join(args.output_dir, os.path.basename(path)) if args.output_dir else path
+
+        write_statements(legacy_df, output_path)
+        typed_df = pd.read_parquet(output_path)
+        typed_size, typed_memory = os.path.getsize(output_path), typed_df.memory_usage(deep=True).sum()
+        logging.info(f"{path} -> {output_path}: {len(typed_df):,} rows, "
+                     f"file {legacy_size / 1e6:.1f}MB -> {typed_size / 1e6:.1f}MB, "
+                     f"memory {legacy_memory / 1e6:.1f}MB -> {typed_memory / 1e6:.1f}MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dividend_discount_model import (normalize_actions, adjust_dividends, yearly_dividends, dividend_summary,
+                                     value_universe)
+
+
+def yfinance_actions() -> pd.DataFrame:
+    """Ticker.actions-style history of three symbols: AAA splits 2:1 in 2021, BBB doubles its dividend each year."""
+    return pd.DataFrame({
+        'Symbol': ['AAA'] * 4 + ['BBB'] * 2 + ['CCC'],
+        'Date': ['2020-06-01', '2021-06-01', '2021-09-01', '2022-06-01', '2020-05-01', '2021-05-01', '2022-07-01'],
+        'Dividends': [1000.0, 1000.0, 0.0, 600.0, 100.0, 200.0, 500.0],
+        'Stock Splits': [0.0, 0.0, 2.0, 0.0, 0.0, 0.0, 0.0],
+    }).set_index('Date')
+
+
+def market() -> pd.DataFrame:
+    return pd.DataFrame({'symbol': ['AAA', 'BBB', 'CCC'], 'beta': [1.0, 1.0, 1.0], 'price': [50000.0, 1000.0, 8000.0]})
+
+
+def test_normalize_actions_requires_history_columns():
+    with pytest.raises(ValueError):
+        normalize_actions(pd.DataFrame({'symbol': ['AAA'], 'date': ['2020-01-01'], 'dividends': [1.0]}))
+
+
+def test_adjust_dividends_by_cumulative_split_factor():
+    adjusted = adjust_dividends(normalize_actions(yfinance_actions()))
+    aaa = adjusted[adjusted['symbol'] == 'AAA']
+    assert aaa['split_factor'].tolist() == [1.0, 1.0, 2.0, 2.0]
+    assert aaa['div_adj'].tolist() == [1000.0, 1000.0, 0.0, 1200.0]
+    assert (adjusted.loc[adjusted['symbol'] != 'AAA', 'split_factor'] == 1.0).all()
+
+
+def test_yearly_dividends_growth():
+    yearly = yearly_dividends(normalize_actions(yfinance_actions())).set_index(['symbol', 'year'])
+    assert yearly.loc[('AAA', 2022), 'dividends'] == 600.0
+    assert yearly.loc[('AAA', 2022), 'div_adj'] == 1200.0
+    assert yearly.loc[('AAA', 2021), 'growth'] == pytest.approx(0.0)
+    assert yearly.loc[('AAA', 2022), 'growth'] == pytest.approx(0.2)
+    assert np.isnan(yearly.loc[('AAA', 2020), 'growth'])
+
+
+def test_value_universe_known_values():
+    summary = dividend_summary(yearly_dividends(normalize_actions(yfinance_actions())), market())
+    result = value_universe(summary, [0.03], [0.08]).set_index('symbol')
+
+    # AAA: median growth (0 + 0.2) / 2 = 0.1, expected dividend 600 x 1.1 = 660, cost of equity 0.03 + 1 x 0.08
+    assert result.loc['AAA', 'expected_dividend'] == pytest.approx(660.0)
+    assert result.loc['AAA', 'cost_of_equity'] == pytest.approx(0.11)
+    assert result.loc['AAA', 'fair_value'] == pytest.approx(660.0 / (0.11 - 0.1))
+    assert result.loc['AAA', 'upside'] == pytest.approx(66000.0 / 50000.0 - 1)
+    # BBB: growth 1.0 >= cost of equity, the Gordon model does not hold
+    assert result.loc['BBB', 'median_growth'] == pytest.approx(1.0)
+    assert np.isnan(result.loc['BBB', 'fair_value'])
+    assert np.isnan(result.loc['BBB', 'upside'])
+    # CCC: a single year of dividends has no growth history
+    assert np.isnan(result.loc['CCC', 'median_growth'])
+    assert np.isnan(result.loc['CCC', 'fair_value'])
+
+
+def test_value_universe_scenario_grid_and_missing_base_year():
+    summary = dividend_summary(yearly_dividends(normalize_actions(yfinance_actions())), market(), year=2022)
+    result = value_universe(summary, [0.025, 0.03], [0.06, 0.08, 0.09])
+
+    assert len(result) == 2 * 3 * len(summary)
+    aaa = result[result['symbol'] == 'AAA']
+    spread = (aaa['risk_free_rate'] + aaa['market_premium'] - 0.1).to_numpy()
+    # Các kịch bản có chi phí vốn thấp hơn tăng trưởng 0.1 (0.025 + 0.06, 0.03 + 0.06) không định giá được
+    assert (spread < 0).sum() == 2
+    expected = np.where(spread > 0, 660.0 / np.abs(spread), np.nan)
+    np.testing.assert_allclose(aaa['fair_value'].to_numpy(), expected)
+    # BBB paid no dividend in 2022, the base year
+    bbb = result[result['symbol'] == 'BBB']
+    assert bbb['last_year'].isna().all()
+    assert bbb['fair_value'].isna().all()
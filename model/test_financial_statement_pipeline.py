@@ -0,0 +1,211 @@
+import time
+import asyncio
+import aiohttp
+import aiohttp.web
+from aiohttp.test_utils import TestServer
+import pandas as pd
+import pytest
+import financial_statement_pipeline as pipeline
+from financial_statement_pipeline import CafeFScraper
+from page_cache import PageCache
+
+
+def report_page(years: list[int], accounts: dict[str, list[float]]) -> str:
+    """A minimal CafeF report page: the header table and the data table, found by id."""
+    header = ''.join(f'<td>{year}</td>' for year in years)
+    rows = ''.join(f'<tr><td>{account}</td>' + ''.join(f'<td>{value:,.0f}</td>' for value in values) + '</tr>'
+                   for account, values in accounts.items())
+    return (f'<html><body><table id="tblGridData"><tr><td></td>{header}</tr></table>'
+            f'<table id="tableContent">{rows}</table></body></html>')
+
+
+def test_cached_pages_keep_their_fetch_time(tmp_path, monkeypatch):
+    cache = PageCache(str(tmp_path))
+    scraper = CafeFScraper('AAA', start_year=2021, report_types=['bsheet'], cache=cache, offline=True)
+    fetched_at = pd.Timestamp('2024-03-01', tz='UTC')
+    monkeypatch.setattr(time, 'time', lambda: fetched_at.timestamp())
+    for report_type, year in scraper.plan_fetches():
+        html = report_page(list(range(year - 3, year + 1)), {'1. Tiền': [1, 2, 3, 4]})
+        cache.put('AAA', report_type, year, scraper.base_url, html)
+    monkeypatch.undo()
+
+    df = scraper.scrape_all_reports()
+
+    assert len(df) > 0
+    assert (df['scraped_at'] == fetched_at).all()
+
+
+def stub_cafef_app() -> aiohttp.web.Application:
+    """
+    A local stand-in for s.cafef.vn serving saved report pages. The symbol
+    picks the behaviour: OK serves the page, GONE answers 404, DOWN 500,
+    BUSY 503 once then the page, and BADCS the page with bytes that are not
+    valid in its declared UTF-8 charset.
+    """
+    busy_calls = []
+
+    async def report(request):
+        symbol, year = request.match_info['symbol'], int(request.match_info['year'])
+        html = report_page(list(range(year - 3, year + 1)), {'1. Tiền': [1, 2, 3, 4], '2. Hàng tồn kho': [5, 6, 7, 8]})
+        if symbol == 'GONE':
+            return aiohttp.web.Response(status=404)
+        if symbol == 'DOWN':
+            return aiohttp.web.Response(status=500)
+        if symbol == 'BUSY' and not busy_calls:
+            busy_calls.append(request.path)
+            return aiohttp.web.Response(status=503)
+        body = html.encode('utf-8')
+        if symbol == 'BADCS':
+            body = body.replace('Tiền'.encode('utf-8'), b'Ti\xea\xecn')  # Mã hóa một byte, không phải UTF-8
+        return aiohttp.web.Response(body=body, content_type='text/html', charset='utf-8')
+
+    app = aiohttp.web.Application()
+    app.router.add_get('/bao-cao-tai-chinh/{symbol}/{report_type}/{year}', report)
+    return app
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """A fresh CafeF rate limiter and no backoff sleeps."""
+    monkeypatch.setattr(pipeline, '_rate_limiters', {})
+    monkeypatch.setitem(pipeline.CONFIG, 'backoff_base', 0.0)
+    return pipeline.get_rate_limiter()
+
+
+def run_with_stub_server(test):
+    """Runs test(base_url) against a local stub CafeF server."""
+    async def run():
+        server = TestServer(stub_cafef_app())
+        await server.start_server()
+        try:
+            return await test(f'http://{server.host}:{server.port}/bao-cao-tai-chinh/{{}}/{{}}/{{}}')
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+def fetch_async(symbol: str) -> tuple[str | None, CafeFScraper]:
+    """Fetches one page of symbol from the stub server with the async engine."""
+    async def fetch(base_url):
+        scraper = CafeFScraper(symbol, start_year=2021, report_types=['bsheet'], base_url=base_url)
+        async with aiohttp.ClientSession(headers=pipeline.HTTP_HEADERS) as session:
+            html = await pipeline._fetch_page_async(session, asyncio.Semaphore(4), scraper, 'bsheet', 2024)
+        return html, scraper
+    return run_with_stub_server(fetch)
+
+
+def test_fetch_page_async_returns_page(limiter):
+    html, scraper = fetch_async('OK')
+    assert '1. Tiền' in html
+    assert scraper.failed_pages == []
+    assert limiter._in_flight == 0
+
+
+def test_fetch_page_async_404_is_not_a_failure(limiter):
+    rate, concurrency = limiter.rate, limiter.concurrency
+    html, scraper = fetch_async('GONE')
+    assert html is None
+    assert scraper.failed_pages == []
+    assert (limiter.rate, limiter.concurrency, limiter._errors, limiter._in_flight) == (rate, concurrency, 0, 0)
+
+
+def test_fetch_page_async_retries_throttling(limiter):
+    rate = limiter.rate
+    html, scraper = fetch_async('BUSY')
+    assert '1. Tiền' in html
+    assert limiter.rate < rate  # 503 yêu cầu giảm tốc
+    assert scraper.failed_pages == []
+
+
+def test_fetch_page_async_gives_up_after_retries(limiter):
+    html, scraper = fetch_async('DOWN')
+    assert html is None
+    assert [(page['year'], page['status']) for page in scraper.failed_pages] == [(2024, 500)]
+    assert limiter._in_flight == 0
+
+
+def test_fetch_page_async_replaces_undecodable_bytes(limiter):
+    html, scraper = fetch_async('BADCS')
+    assert '\ufffd' in html and '2. Hàng tồn kho' in html
+    assert scraper.failed_pages == []
+    assert limiter._in_flight == 0
+
+
+def test_scrape_all_async_against_stub_server(limiter, monkeypatch):
+    monkeypatch.setitem(pipeline.CONFIG, 'max_retries', 1)
+    results = {}
+
+    async def scrape(base_url):
+        scrapers = [CafeFScraper(symbol, start_year=2021, report_types=['bsheet'], base_url=base_url)
+                    for symbol in ['OK', 'GONE', 'BADCS']]
+        # scrape_all_async gọi asyncio.run; ở đây chạy nó trong luồng riêng vì vòng lặp của server đang chạy
+        await asyncio.to_thread(pipeline.scrape_all_async, scrapers,
+                                lambda scraper, df: results.update({scraper.symbol: df}),
+                                max_concurrency=4, per_host_limit=2, parse_workers=1)
+    run_with_stub_server(scrape)
+
+    assert results['GONE'] is None
+    ok = results['OK']
+    assert set(ok['account']) == {'1. Tiền', '2. Hàng tồn kho'}
+    assert sorted(ok['report_date'].unique()) == list(range(2021, pipeline.datetime.datetime.now().year + 1))
+    assert set(results['BADCS']['account']) >= {'2. Hàng tồn kho'}
+
+
+def test_melt_vnstock_report_period_rows():
+    """One row per period with one column per account, as vnstock VCI returns (Kỳ 5 is the full year)."""
+    report = pd.DataFrame({
+        'CP': ['AAA'] * 3, 'Năm': [2023, 2024, 2024], 'Kỳ': [5, 1, 5],
+        'Tiền': [10.0, 11.0, 12.0], 'Hàng tồn kho': ['20', None, '22'],
+    })
+    annual = pipeline.melt_vnstock_report(report, 'annual')
+    assert annual[['account', 'report_date', 'quarter']].values.tolist() == [
+        ['Tiền', 2023, 0], ['Hàng tồn kho', 2023, 0], ['Tiền', 2024, 0], ['Hàng tồn kho', 2024, 0]]
+    assert annual['value'].tolist() == [10.0, 20.0, 12.0, 22.0]
+    assert annual['row_order'].tolist() == [0, 1, 0, 1]
+
+    quarterly = pipeline.melt_vnstock_report(report, 'quarterly')
+    assert quarterly[['account', 'report_date', 'quarter']].values.tolist() == [
+        ['Tiền', 2024, 1], ['Hàng tồn kho', 2024, 1]]
+    assert quarterly['value'].isna().tolist() == [False, True]
+
+
+def test_melt_vnstock_report_item_rows():
+    """One row per account with one column per period ('2024' or '2024-Q1')."""
+    report = pd.DataFrame({'item': ['Tiền', 'Vay ngắn hạn'], '2023': [1.0, 2.0], '2024': [3.0, 4.0],
+                           '2024-Q1': [5.0, 6.0]})
+    annual = pipeline.melt_vnstock_report(report, 'annual')
+    assert annual[['account', 'report_date', 'quarter', 'value']].values.tolist() == [
+        ['Tiền', 2023, 0, 1.0], ['Vay ngắn hạn', 2023, 0, 2.0], ['Tiền', 2024, 0, 3.0], ['Vay ngắn hạn', 2024, 0, 4.0]]
+    quarterly = pipeline.melt_vnstock_report(report, 'quarterly')
+    assert quarterly[['report_date', 'quarter', 'value']].values.tolist() == [[2024, 1, 5.0], [2024, 1, 6.0]]
+
+
+def test_melt_vnstock_report_without_periods():
+    assert pipeline.melt_vnstock_report(pd.DataFrame({'CP': ['AAA'], 'Tiền': [1.0]}), 'annual') is None
+    report = pd.DataFrame({'CP': ['AAA'], 'Năm': [2024], 'Kỳ': [1], 'Tiền': [1.0]})
+    assert pipeline.melt_vnstock_report(report, 'annual') is None
+
+
+class StubFinance:
+    """A vnstock Finance stand-in: every statement is the same annual report, income_statement fails."""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+
+    def balance_sheet(self, period, lang, dropna):
+        return pd.DataFrame({'CP': [self.symbol] * 2, 'Năm': [2023, 2024], 'Kỳ': [5, 5], 'Tiền': [1.0, 2.0]})
+
+    def income_statement(self, period, lang, dropna):
+        raise ValueError("not a stock")
+
+
+def test_vnstock_fetcher_with_stub_client(monkeypatch):
+    monkeypatch.setattr(pipeline, '_rate_limiters', {})
+    fetcher = pipeline.VnstockFinanceFetcher('aaa', start_year=2024, report_types=['bsheet', 'incsta'],
+                                             client_factory=StubFinance)
+    df = fetcher.scrape_all_reports()
+
+    assert df[['symbol', 'report_type', 'account', 'report_date', 'value']].values.tolist() == [
+        ['AAA', 'Balance Sheet', 'Tiền', 2024, 2.0]]
+    assert df['scraped_at'].notna().all()
+    assert [page['url'] for page in fetcher.failed_pages] == ['vnstock:income_statement']
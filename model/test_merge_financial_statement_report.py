@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+import pyarrow as pa
+import pyarrow.parquet as pq
+from merge_financial_statement_report import merge_files
+from statement_schema import STATEMENT_SCHEMA, write_statements
+
+LEGACY_COLUMNS = ['company_code', 'exchange', 'company_name', 'industry', 'report_type', 'report_date',
+                  'account', 'value', 'account_vi', 'account_en']
+
+
+def legacy_statements(company_code: str, n_rows: int = 4) -> pd.DataFrame:
+    """Rows as written before the typed schema: every column but value is a plain string, no quarter/scraped_at."""
+    return pd.DataFrame({
+        'company_code': company_code, 'exchange': 'HSX', 'company_name': f'{company_code} co', 'industry': 'Thực phẩm',
+        'report_type': 'Balance Sheet', 'report_date': [str(2015 + i) for i in range(n_rows)],
+        'account': 'cash', 'value': [float(i) for i in range(n_rows)], 'account_vi': '1. Tiền', 'account_en': 'Cash',
+    })[LEGACY_COLUMNS]
+
+
+def test_merge_legacy_and_typed_files(tmp_path):
+    legacy = legacy_statements('AAA')
+    pq.write_table(pa.Table.from_pandas(legacy, preserve_index=False),
+                   tmp_path / 'final_financial_statements_bsheet.parquet')
+    typed = legacy_statements('VNM').assign(quarter=0, scraped_at=pd.Timestamp('2025-01-01', tz='UTC'))
+    write_statements(typed, str(tmp_path / 'final_financial_statements_incsta.parquet'))
+
+    output = tmp_path / 'merged.parquet'
+    merge_files(str(tmp_path), str(output))
+
+    merged = pq.read_table(output)
+    assert merged.schema.equals(STATEMENT_SCHEMA)
+    df = merged.to_pandas()
+    assert len(df) == len(legacy) + len(typed)
+    legacy_rows = df[df['company_code'] == 'AAA']
+    assert (legacy_rows['quarter'] == 0).all()
+    assert legacy_rows['scraped_at'].isna().all()
+    assert legacy_rows['report_date'].tolist() == [2015, 2016, 2017, 2018]
+    assert df.loc[df['company_code'] == 'VNM', 'scraped_at'].notna().all()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_merge_skips_unreadable_file(tmp_path, workers):
+    good = legacy_statements('AAA')
+    good.to_csv(tmp_path / 'final_financial_statements_bsheet.csv', sep='\t', index=False)
+    # Header và các dòng đầu hợp lệ (schema đọc được), một dòng thừa cột ở cuối file làm lỗi khi đọc dữ liệu
+    bad = legacy_statements('BAD', n_rows=20000)
+    bad.to_csv(tmp_path / 'final_financial_statements_incsta.csv', sep='\t', index=False)
+    with open(tmp_path / 'final_financial_statements_incsta.csv', 'a', encoding='utf-8') as f:
+        f.write('\t'.join(['x'] * (len(LEGACY_COLUMNS) + 1)) + '\n')
+
+    output = tmp_path / 'merged.parquet'
+    merge_files(str(tmp_path), str(output), file_type='csv', workers=workers)
+
+    merged = pq.read_table(output).to_pandas()
+    assert merged['company_code'].astype(str).tolist() == ['AAA'] * len(good)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_merge_skips_file_truncated_mid_stream(tmp_path, monkeypatch, workers):
+    # Khối CSV nhỏ để file lỗi được đọc thành nhiều batch trước khi gặp dòng bị cắt
+    monkeypatch.setattr('merge_financial_statement_report.CSV_BLOCK_SIZE', 64 * 1024)
+    good = legacy_statements('AAA')
+    good.to_csv(tmp_path / 'final_financial_statements_bsheet.csv', sep='\t', index=False)
+    truncated = tmp_path / 'final_financial_statements_incsta.csv'
+    legacy_statements('BAD', n_rows=20000).to_csv(truncated, sep='\t', index=False)
+    with open(truncated, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 40)
+
+    output = tmp_path / 'merged.parquet'
+    merge_files(str(tmp_path), str(output), file_type='csv', workers=workers)
+
+    merged = pq.read_table(output).to_pandas()
+    assert merged['company_code'].astype(str).tolist() == ['AAA'] * len(good)
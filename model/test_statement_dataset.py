@@ -0,0 +1,23 @@
+import pandas as pd
+from statement_dataset import upsert_dataset, read_dataset
+
+
+def statements(value: float, scraped_at: str) -> pd.DataFrame:
+    return pd.DataFrame({
+        'company_code': ['AAA', 'BBB'], 'exchange': ['HSX', None], 'company_name': ['AAA co', 'BBB co'],
+        'industry': 'Thực phẩm', 'report_type': 'Balance Sheet', 'report_date': 2020, 'quarter': 0,
+        'account': 'cash', 'value': value, 'account_vi': '1. Tiền', 'account_en': 'Cash',
+        'scraped_at': pd.Timestamp(scraped_at, tz='UTC'),
+    })
+
+
+def test_upsert_keeps_rows_without_exchange(tmp_path):
+    root = str(tmp_path / 'dataset')
+    upsert_dataset(statements(1.0, '2025-01-01'), root, by_exchange=True)
+    stats = upsert_dataset(statements(2.0, '2025-02-01'), root, by_exchange=True)
+
+    assert stats['updated'] == 2
+    df = read_dataset(root).sort_values('company_code')
+    assert df['company_code'].astype(str).tolist() == ['AAA', 'BBB']
+    assert df['exchange'].isna().tolist() == [False, True]
+    assert df['value'].tolist() == [2.0, 2.0]